@@ -319,6 +319,19 @@ C_OPTIM = 'optimization'  # category of rtc and fbc: optimization; parent class
 C_RL = 'rl'  # category of fbc: reinforcement learning
 C_POI = 'poi'  # subcategory of mpc and optim: PyOptInterface package
 C_LINOPY = 'linopy'  # subcategory of mpc and optim: Linopy package
+C_GUROBI = 'gurobi'  # solver of poi and linopy: Gurobi (commercial)
+C_HIGHS = 'highs'  # solver of poi and linopy: HiGHS (open-source)
+
+# VARIABLE ROLES
+# Note: Role of the variables of the optimization controllers (see VariableRoles)
+VR_POWER = 'power'  # energy flow of a plant (positive: into the main meter)
+VR_MARKET = 'market'  # energy flow of a market (positive: bought)
+VR_COSTS = 'costs'  # costs of a market
+VR_REVENUE = 'revenue'  # revenue of a market
+VR_SOC = 'soc'  # state of charge of a storage
+VR_MODE = 'mode'  # binary mode flag (e.g. charging or discharging)
+VR_TARGET = 'target'  # target of a plant or market (rtc)
+VR_DEVIATION = 'deviation'  # deviation from the target (rtc)
 
 # MARKET TRADING STRATEGIES
 MTS_ZI = 'zi'
@@ -76,6 +76,57 @@ class Agent:
 
         return self.agent.execute()
 
+    def prepare(self, batch=None) -> AgentDB:
+        """
+        Executes the given `Agent` up to its controllers (see `MpcBatch`).
+
+        Parameters:
+            batch : MpcBatch, optional
+                Batch that solves the mpc controller of the agent together with other agents.
+
+        Returns:
+            AgentDB: The `AgentDB` whose setpoints are set once the batch is solved.
+
+        """
+
+        return self.agent.prepare(batch=batch)
+
+    def finish(self) -> AgentDB:
+        """
+        Finishes the execution of the given `Agent` after its controllers were solved.
+
+        Returns:
+            AgentDB: The resulting `AgentDB` after executing the `Agent`.
+
+        """
+
+        return self.agent.finish()
+
+    @staticmethod
+    def execute_all(agents: list, batch=None) -> list:
+        """
+        Executes the given agents one after another or, if a batch is given, solves their mpc controllers together.
+
+        Parameters:
+            agents : list
+                The `Agent` instances to execute.
+            batch : MpcBatch, optional
+                Batch that solves the mpc controllers of the agents as one problem. All agents are executed up to their
+                controllers first, then the batch is solved and afterward the agents are finished.
+
+        Returns:
+            list: The resulting `AgentDB` of each agent (in the order of the agents).
+
+        """
+        if batch is None:
+            return [agent.execute() for agent in agents]
+
+        for agent in agents:
+            agent.prepare(batch=batch)
+        batch.solve()
+
+        return [agent.finish() for agent in agents]
+
 
 class AgentFactory:
     """
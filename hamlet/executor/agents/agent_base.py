@@ -37,6 +37,15 @@ class AgentBase:
 
     def execute(self):
         """Executes the agent"""
+        # Apply grid commands, get forecasts and set controllers
+        self.prepare()
+
+        # Create bids and offers based on trading strategy
+        return self.finish()
+
+    def prepare(self, batch=None):
+        """Executes the agent up to its controllers. If a batch is given, the mpc controller of the agent is only
+        solved when the batch is solved (see MpcBatch)"""
         # Apply grid commands
         self.apply_grid_commands()
 
@@ -44,8 +53,12 @@ class AgentBase:
         self.get_forecasts()
 
         # Set controllers
-        self.set_controllers()
+        self.set_controllers(batch=batch)
 
+        return self.agent
+
+    def finish(self):
+        """Finishes the execution of the agent after its controllers (and the batch) were solved"""
         # Create bids and offers based on trading strategy
         self.create_bids_offers()
 
@@ -63,7 +76,7 @@ class AgentBase:
 
         return self.agent
 
-    def set_controllers(self):
+    def set_controllers(self, batch=None):
         """Sets the controller for the agent"""
 
         # Get the required data
@@ -75,12 +88,17 @@ class AgentBase:
             if params['method'] is None:
                 continue
 
+            # Only the fbc can be batched and only if no controller depends on its setpoints afterward
+            kwargs = {}
+            if batch is not None and controller == c.C_FBC and controller == list(controllers)[-1]:
+                kwargs['batch'] = batch
+
             # Get the controller
             controller = Controller(controller_type=controller, **params).create_instance()
 
             # Run the controller
             self.agent = controller.run(agent=self.agent, timetable=self.timetable, market=self.market,
-                                        grid_commands=self.grid_commands)
+                                        grid_commands=self.grid_commands, **kwargs)
 
         return self.agent
 
@@ -22,7 +22,8 @@ C_ENERGY_CUMSUM = 'energy_cumsum'
 
 class ElectricityMarket(MarketBase):
 
-    def __init__(self, market: MarketDB, tasks: dict, database: Database):
+    def __init__(self, market: MarketDB, tasks: dict, database: Database, bids_offers: pl.DataFrame = None,
+                 grid_fees: dict = None):
 
         # Call the super class
         super().__init__()
@@ -33,14 +34,19 @@ class ElectricityMarket(MarketBase):
         # Tasklist
         self.tasks = tasks
 
-        # Database
+        # Database (can be None if the bids and offers and the grid fees are given, e.g. in a worker process)
         self.database = database
 
         # Get bids and offers
-        self.bids_offers = self.database.get_bids_offers(region=self.tasks[c.TC_REGION],
-                                                         market_type=self.tasks[c.TC_MARKET],
-                                                         market_name=self.tasks[c.TC_NAME],
-                                                         timestep=self.tasks[c.TC_TIMESTEP])
+        if bids_offers is None:
+            bids_offers = self.database.get_bids_offers(region=self.tasks[c.TC_REGION],
+                                                        market_type=self.tasks[c.TC_MARKET],
+                                                        market_name=self.tasks[c.TC_NAME],
+                                                        timestep=self.tasks[c.TC_TIMESTEP])
+        self.bids_offers = bids_offers
+
+        # Variable grid fees of the agents in the format {agent_id: {column: value}} (obtained from the database if None)
+        self.grid_fees = grid_fees
 
         # Get the tables from the market database and clear them
         self.bids_cleared = self.market.bids_cleared.clear()
@@ -772,17 +778,17 @@ class ElectricityMarket(MarketBase):
         ])
 
         # Replace price with agent forecast for variable grid fees
-        for agent_id in grid.select(c.TC_ID_AGENT).unique().to_series().to_list():
-            # get agent database
-            agent_db = self.database.get_agent_data(region=self.tasks[c.TC_REGION], agent_id=agent_id)
-            agent_retailer_data = agent_db.forecaster.train_data[f'{self.market.market_name}_{c.TT_RETAIL}'][c.K_TARGET]
-
+        agent_ids = grid.select(c.TC_ID_AGENT).unique().to_series().to_list()
+        grid_fees = self.grid_fees
+        if grid_fees is None:
+            grid_fees = self.get_grid_fees(database=self.database, tasks=self.tasks,
+                                           market_name=self.market.market_name, agent_ids=agent_ids)
+        for agent_id in agent_ids:
             # iterate through different trade type and different power flow direction
             for column_name in [[c.TT_RETAIL, c.PF_IN, c.TC_PRICE_PU_IN],[c.TT_RETAIL, c.PF_OUT, c.TC_PRICE_PU_OUT],
                                 [c.TT_MARKET, c.PF_IN, c.TC_PRICE_PU_IN],[c.TT_MARKET, c.PF_OUT, c.TC_PRICE_PU_OUT]]:
                 # get grid fee value from forecaster
-                grid_fee = agent_retailer_data.filter(pl.col(c.TC_TIMESTAMP) == self.tasks[c.TC_TIMESTEP]).select(
-                    pl.col(f'{c.TT_GRID}_{column_name[0]}_{column_name[1]}')).item()
+                grid_fee = grid_fees[agent_id][f'{c.TT_GRID}_{column_name[0]}_{column_name[1]}']
                 # write to grid transaction df
                 grid = grid.with_columns(
                     # Energy pu prices
@@ -841,6 +847,33 @@ class ElectricityMarket(MarketBase):
 
         return grid, levies
 
+    @staticmethod
+    def get_grid_fees(database: Database, tasks: dict, market_name: str, agent_ids: list) -> dict:
+        """Gets the variable grid fees of the given agents for the timestep of the tasks from their forecasters
+
+        Returns:
+            dict: grid fees in the format {agent_id: {column: value}}
+        """
+        return {agent_id: ElectricityMarket.get_agent_grid_fees(
+                    agent_db=database.get_agent_data(region=tasks[c.TC_REGION], agent_id=agent_id),
+                    tasks=tasks, market_name=market_name)
+                for agent_id in agent_ids}
+
+    @staticmethod
+    def get_agent_grid_fees(agent_db, tasks: dict, market_name: str) -> dict:
+        """Gets the variable grid fees of the agent for the timestep of the tasks from its forecaster
+
+        Returns:
+            dict: grid fees in the format {column: value}
+        """
+        columns = [f'{c.TT_GRID}_{trade_type}_{power_flow}'
+                   for trade_type in (c.TT_RETAIL, c.TT_MARKET) for power_flow in (c.PF_IN, c.PF_OUT)]
+
+        agent_retailer_data = agent_db.forecaster.train_data[f'{market_name}_{c.TT_RETAIL}'][c.K_TARGET]
+        fees = agent_retailer_data.filter(pl.col(c.TC_TIMESTAMP) == tasks[c.TC_TIMESTEP]).select(columns)
+
+        return {column: fees.get_column(column).item() for column in columns}
+
     def __method_pda(self, bids, offers, pricing_method):
         """Clears the market with the periodic double auction method"""
 
@@ -57,7 +57,7 @@ class Market:
         self.data = copy(data)
 
         # Create a new market instance
-        self.market = MarketFactory.create_market(data=self.data, tasks=tasks, database=database)
+        self.market = MarketFactory.create_market(data=self.data, tasks=tasks, database=database, **kwargs)
 
     def execute(self) -> MarketDB:
         """
@@ -92,7 +92,7 @@ class MarketFactory:
 
     Methods
     -------
-    create_market(data: MarketDB, tasks: dict, database: Database) -> Market
+    create_market(data: MarketDB, tasks: dict, database: Database, **kwargs) -> Market
         Creates and returns an instance of the Market class based on the market type extracted from the tasks dictionary.
 
     """
@@ -104,7 +104,7 @@ class MarketFactory:
     }
 
     @staticmethod
-    def create_market(data: MarketDB, tasks: dict, database: Database):
+    def create_market(data: MarketDB, tasks: dict, database: Database, **kwargs):
         """
         Parameters
         ----------
@@ -117,6 +117,9 @@ class MarketFactory:
         database: Database
             An instance of the Database class, representing the database to be used.
 
+        **kwargs
+            Additional keyword arguments passed to the market (e.g. the bids and offers of an electricity market).
+
         Returns
         -------
         Market
@@ -124,4 +127,4 @@ class MarketFactory:
 
         """
         market_type = tasks[c.TC_MARKET]  # extract market type by selecting the market type in tasks
-        return MarketFactory.MARKET_MAPPING[market_type](data, tasks, database)
+        return MarketFactory.MARKET_MAPPING[market_type](data, tasks, database, **kwargs)
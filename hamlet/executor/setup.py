@@ -12,7 +12,6 @@ from tqdm import tqdm
 
 pl.enable_string_cache(True)
 from hamlet import functions as f
-from copy import deepcopy
 # from numba import njit, jit
 from datetime import datetime
 from hamlet.executor.utilities.database.database import Database
@@ -21,6 +20,8 @@ import hamlet.constants as c
 from hamlet.executor.utilities.tasks_execution.agent_task_executioner import AgentTaskExecutioner
 from hamlet.executor.utilities.tasks_execution.market_task_executioner import MarketTaskExecutioner
 from hamlet.executor.grids.grid import Grid
+from hamlet.executor.utilities.forecasts.refit_scheduler import REFIT_SCHEDULER
+from hamlet.executor.utilities.controller.fbc.mpc.model_registry import MODEL_REGISTRY
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -28,7 +29,11 @@ warnings.filterwarnings("ignore")
 
 class Executor:
 
-    def __init__(self, path, name: str = None, num_workers: int = None, overwrite_sim: bool = True):
+    def __init__(self, path, name: str = None, num_workers: int = None, overwrite_sim: bool = True,
+                 sticky_workers: bool = False, transport: str = 'files', parallel_regions: bool = False,
+                 market_workers: int = 1, fast_forward: int = 0, agent_store: bool = False,
+                 lazy_agents: bool = False, append_results: bool = False, global_forecast_models: bool = False,
+                 batch_mpc: bool = False):
         # Progress bar
         self.pbar = tqdm()
 
@@ -49,14 +54,36 @@ class Executor:
         self.type = None  # set in self.__prepare_scenario()
 
         # Database containing all information
-        self.database = Database(self.path_scenario)
+        # Note: With the agent store, the tables of all agents of a region are kept and saved together. Lazy agents
+        #  only load their tables from the files when they are needed. With append_results, saving the database before
+        #  each parallel execution only appends the changed rows of the agent tables (compacted at the cleanup). With
+        #  global forecast models, the plants of the same type in a region share one ML model (rfr, cnn, rnn) as long
+        #  as the forecasters of the region are in one process (workers that create their own forecasters fall back to
+        #  one model per plant).
+        self.database = Database(self.path_scenario, agent_store=agent_store, lazy_agents=lazy_agents,
+                                 append_results=append_results, global_forecast_models=global_forecast_models)
 
         # Scenario structure
         self.structure = {}
 
         # Initialize task executioners
-        self.agent_task_executioner = AgentTaskExecutioner(self.database, num_workers)
-        self.market_task_executioner = MarketTaskExecutioner(self.database, 1)  # use 1 worker only
+        # Note: With sticky workers, each worker keeps its agents in memory for the whole simulation. Otherwise, the
+        #  transport defines if the data is exchanged with the workers via files or shared memory.
+        #  The fast-forward mode always keeps the agents resident. With batch_mpc, the poi mpc controllers of the
+        #  agents of a region that are executed in the same process are solved as one problem and the rule-based fbc
+        #  controllers are computed together (serial execution and sticky workers; the other workers execute one agent
+        #  per task).
+        self.agent_task_executioner = AgentTaskExecutioner(self.database, num_workers,
+                                                           sticky=sticky_workers or fast_forward > 0,
+                                                           transport=transport, batch_mpc=batch_mpc)
+        # Note: The markets only receive the data of the timestep they clear. None uses all available processors.
+        self.market_task_executioner = MarketTaskExecutioner(self.database, market_workers)
+
+        # Executes the agents of all regions of a timestamp together instead of one region after another
+        self.parallel_regions = parallel_regions
+
+        # Number of timestamps that are executed at once if the agents are not coupled by markets or grids (0: off)
+        self.fast_forward = fast_forward
 
         # Overwrites the results folder if it already exists
         self.overwrite = overwrite_sim
@@ -93,6 +120,13 @@ class Executor:
         self.agent_task_executioner.set_results_path(self.path_results)
         self.market_task_executioner.set_results_path(self.path_results)
 
+        # Execute blocks of timestamps at once if the agents only trade with the retailer and no grid is calculated
+        if self.__can_fast_forward():
+            self.__execute_fast_forward()
+            self.agent_task_executioner.close_pool()
+            self.market_task_executioner.close_pool()
+            return
+
         for timestamp in self.timetable.partition_by('timestamp'):
             # Wait for the timestamp to be reached if the simulation is to be carried out in real-time
             if self.type == 'rts':
@@ -102,31 +136,36 @@ class Executor:
             grid_ok = False  # init variable, grid is not simulated yet
             num_iteration = 0  # init number of iteration, max. 10
 
-            # get initial database at timestamp, in case this ts need to be overwritten
-            initial_db = deepcopy(self.database)
+            # get checkpoint of the database at timestamp, in case this ts need to be overwritten
+            checkpoint = self.database.create_checkpoint()
 
             while not grid_ok:  # iterate until grid is working
                 num_iteration += 1
+                self.agent_task_executioner.set_iteration(num_iteration)
 
                 # get current timestamp as string item for progress bar
                 timestamp_str = str(timestamp.select(c.TC_TIMESTAMP).sample(n=1).item())
 
-                # Iterate over timestamp by region_tasks
-                for region_tasks in timestamp.partition_by(c.TC_REGION):
-                    # get current region_tasks as string item for progress bar
-                    region_name = str(region_tasks.select(c.TC_REGION).sample(n=1).item())
+                if self.parallel_regions:
+                    # Execute all regions together (they are independent until the grid calculation)
+                    self.__execute_regions(timestamp=timestamp, timestamp_str=timestamp_str)
+                else:
+                    # Iterate over timestamp by region_tasks
+                    for region_tasks in timestamp.partition_by(c.TC_REGION):
+                        # get current region_tasks as string item for progress bar
+                        region_name = str(region_tasks.select(c.TC_REGION).sample(n=1).item())
 
-                    # update progress bar description
-                    self.pbar.set_description(
-                        'Executing timestamp ' + timestamp_str + ' for region_tasks ' + region_name)
+                        # update progress bar description
+                        self.pbar.set_description(
+                            'Executing timestamp ' + timestamp_str + ' for region_tasks ' + region_name)
 
-                    # Execute agent and market tasks
-                    self.agent_task_executioner.execute(region_tasks)
-                    self.market_task_executioner.execute(region_tasks)
+                        # Execute agent and market tasks
+                        self.agent_task_executioner.execute(region_tasks)
+                        self.market_task_executioner.execute(region_tasks)
 
                 # Calculate the grids for the current timestamp (calculated together as they are connected)
                 self.pbar.set_description('Executing timestamp ' + timestamp_str + ' for grid')
-                grid_ok = self.__execute_grids(tasklist=timestamp, initial_db=initial_db, num_iteration=num_iteration)
+                grid_ok = self.__execute_grids(tasklist=timestamp, checkpoint=checkpoint, num_iteration=num_iteration)
 
             self.pbar.update(1)
 
@@ -140,6 +179,11 @@ class Executor:
 
         self.database.concat_market_files()
 
+        # Stop the background refits of the forecast models of this process
+        REFIT_SCHEDULER.clear()
+        # Drop the resident mpc models of this process
+        MODEL_REGISTRY.clear()
+
         self.pbar.set_description('Simulation finished')
 
     def pause(self):
@@ -150,7 +194,51 @@ class Executor:
         """Resumes the simulation"""
         raise NotImplementedError("Resume functionality not implemented yet")
 
-    def __execute_grids(self, tasklist: pl.DataFrame, initial_db: Database, num_iteration: int) -> (bool, dict):
+    def __execute_regions(self, timestamp: pl.DataFrame, timestamp_str: str):
+        """Executes the agent tasks of all regions together and afterward the market tasks of all regions."""
+        region_tasks_list = timestamp.partition_by(c.TC_REGION)
+
+        # Execute agent tasks of all regions in one go
+        self.pbar.set_description('Executing timestamp ' + timestamp_str + ' for all regions')
+        self.agent_task_executioner.execute_regions(region_tasks_list)
+
+        # Execute market tasks of all regions in one go (the markets of each region only depend on its agents)
+        self.market_task_executioner.execute_regions(region_tasks_list)
+
+    def __can_fast_forward(self) -> bool:
+        """Checks if the agents can be executed through several timestamps at once.
+
+        This is the case if all markets are electricity markets without clearing (the agents only trade with the
+        retailer) and no grid is calculated that could send restriction commands to the agents.
+        """
+        if not self.fast_forward or self.type == 'rts':
+            return False
+
+        # All markets need to be electricity markets with the clearing method 'none'
+        markets = self.timetable.select(c.TC_MARKET, c.TC_CLEARING_METHOD).unique()
+        if not markets.filter((pl.col(c.TC_MARKET) != c.MT_ELECTRICITY)
+                              | (pl.col(c.TC_CLEARING_METHOD) != c.MCM_NONE)).is_empty():
+            return False
+
+        # No grid is calculated
+        return not self.database.get_grid_data()
+
+    def __execute_fast_forward(self):
+        """Executes the agents through blocks of timestamps and posts the market results of each timestamp."""
+        timestamps = self.timetable.partition_by('timestamp')
+
+        for idx in range(0, len(timestamps), self.fast_forward):
+            block = timestamps[idx:idx + self.fast_forward]
+
+            # update progress bar description
+            timestamp_str = str(block[0].select(pl.first(c.TC_TIMESTAMP)).item())
+            self.pbar.set_description('Executing ' + str(len(block)) + ' timestamps from ' + timestamp_str)
+
+            self.agent_task_executioner.execute_block(block)
+
+            self.pbar.update(len(block))
+
+    def __execute_grids(self, tasklist: pl.DataFrame, checkpoint: dict, num_iteration: int) -> (bool, dict):
         """Execute grids for the given tasklist."""
         # Only electricity grids is implemented now
         grid_results = {}
@@ -175,7 +263,7 @@ class Executor:
 
         # if grid status is not ok, delete all simulated data for this ts, this ts needs to be simulated again
         if not grid_ok:
-            self.database = deepcopy(initial_db)
+            self.database.restore_checkpoint(checkpoint)
 
         # write grid results to database
         for grid_type, grid_db in grid_results.items():
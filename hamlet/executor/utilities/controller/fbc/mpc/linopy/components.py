@@ -21,6 +21,7 @@ class LinopyComps:
         self.fcast = forecasts
         self.timesteps = kwargs['timesteps']
         self.info = kwargs
+        self.roles = kwargs['roles']  # index of the variables of the controller
 
     def define_variables(self, model, **kwargs):
         raise NotImplementedError()
@@ -45,12 +46,17 @@ class LinopyComps:
             return f'{name}_{component_type}_{energy_type}_{direction}'
         return f'{name}_{component_type}_{energy_type}'
 
+    def _register(self, name: str, role: str, comp_type: str = None, energy_type: str = None, direction: str = None):
+        """Registers the variable of the component with its role (see VariableRoles)"""
+        self.roles.add(name, role, self.name, comp_type=comp_type, energy_type=energy_type, direction=direction)
+
     def define_electricity_variable(self, model: linopy.Model, comp_type: str, lower, upper, direction: str = None,
                                     integer=False):
         """Creates the electricity variable for the component. The direction is either in or out."""
 
-        # Set the name of the variable
+        # Set the name of the variable and register it
         name = self._create_variable_name(self.name, comp_type, c.ET_ELECTRICITY, direction)
+        self._register(name, c.VR_POWER, comp_type, c.ET_ELECTRICITY, direction)
 
         # Define the variable
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, coords=[self.timesteps], integer=integer)
@@ -61,8 +67,9 @@ class LinopyComps:
                              integer=False):
         """Creates the heat variable for the component. The direction is either in or out."""
 
-        # Set the name of the variable
+        # Set the name of the variable and register it
         name = self._create_variable_name(self.name, comp_type, c.ET_HEAT, direction)
+        self._register(name, c.VR_POWER, comp_type, c.ET_HEAT, direction)
 
         # Define the variable
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, coords=[self.timesteps], integer=integer)
@@ -73,8 +80,9 @@ class LinopyComps:
                              integer=False):
         """Creates the cooling variable for the component. The direction is either in or out."""
 
-        # Set the name of the variable
+        # Set the name of the variable and register it
         name = self._create_variable_name(self.name, comp_type, c.ET_COOLING, direction)
+        self._register(name, c.VR_POWER, comp_type, c.ET_COOLING, direction)
 
         # Define the variable
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, coords=[self.timesteps], integer=integer)
@@ -85,8 +93,9 @@ class LinopyComps:
                            integer=False):
         """Creates the hydrogen variable for the component. The direction is either in or out."""
 
-        # Set the name of the variable
+        # Set the name of the variable and register it
         name = self._create_variable_name(self.name, comp_type, c.ET_H2, direction)
+        self._register(name, c.VR_POWER, comp_type, c.ET_H2, direction)
 
         # Define the variable
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, coords=[self.timesteps], integer=integer)
@@ -97,8 +106,9 @@ class LinopyComps:
                                 integer=False):
         """Creates the state-of-charge variable for the component."""
 
-        # Set the name
+        # Set the name and register the variable
         name = f'{self.name}_{comp_type}_soc'
+        self._register(name, c.VR_SOC, comp_type)
 
         # Define the variable
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, coords=[self.timesteps], integer=integer)
@@ -109,8 +119,9 @@ class LinopyComps:
         """Creates the mode flag variable for the component. This is used to decide whether the component is charging
         or discharging."""
 
-        # Set the name
+        # Set the name and register the variable
         name = f'{self.name}_{comp_type}_mode'
+        self._register(name, c.VR_MODE, comp_type)
 
         # Define the variable
         self.add_variable_to_model(model, name=name, coords=[self.timesteps], binary=True)
@@ -165,6 +176,14 @@ class Market(LinopyComps):
         self.add_variable_to_model(model, name=f'{self.name}_costs', lower=0, upper=np.inf, coords=[self.timesteps])
         self.add_variable_to_model(model, name=f'{self.name}_revenue', lower=0, upper=np.inf, coords=[self.timesteps])
 
+        # Register the variables
+        for direction in (c.PF_OUT, c.PF_IN):
+            self._register(f'{self.name}_{self.comp_type}_{direction}', c.VR_MARKET, energy_type=self.comp_type,
+                           direction=direction)
+        self._register(f'{self.name}_mode', c.VR_MODE)
+        self._register(f'{self.name}_costs', c.VR_COSTS)
+        self._register(f'{self.name}_revenue', c.VR_REVENUE)
+
         return model
 
     def define_constraints(self, model):
@@ -7,9 +7,8 @@ __email__ = "markus.doepfert@tum.de"
 import os
 import sys
 
-from linopy.io import read_netcdf
-
 from hamlet.executor.utilities.controller.fbc.mpc.linopy.components import *
+from hamlet.executor.utilities.controller.fbc.mpc.model_registry import MODEL_REGISTRY
 from hamlet.executor.utilities.controller.fbc.mpc.mpc_base import MpcBase
 
 # Define all the available plants for this controller
@@ -32,27 +31,12 @@ AVAILABLE_PLANTS = {
 
 class Linopy(MpcBase):
     def __init__(self, **kwargs):
-        self.loaded_model = False
-        self.model_path = f"{kwargs['agent'].agent_save}/linopy_mpc.nc"
         super().__init__(**kwargs)
         self.ems = self.ems[c.C_OPTIM]
-        # Save first model to file to load later
-        self.save_model()
 
     def get_model(self, **kwargs):
-        # Check for existing saved models
-        if os.path.exists(self.model_path):
-            # Load model
-            model = read_netcdf(self.model_path)
-            self.loaded_model = True
-        else:
-            # Create a new model
-            model = Model(force_dim_names=True)
-        return model
-
-    def save_model(self):
-        if not os.path.exists(self.model_path):
-            self.model.to_netcdf(self.model_path)
+        # Create a new model (it stays resident and is only updated at the following timestamps)
+        return Model(force_dim_names=True)
 
     def get_available_plants(self):
         return AVAILABLE_PLANTS
@@ -86,58 +70,17 @@ class Linopy(MpcBase):
         return self.model
 
     def add_balance_constraints(self):
-        # If model was loaded, no changes required for these constraints
-        if self.loaded_model:
+        # If the model is resident, no changes required for these constraints
+        if self.resident:
             return
         # Initialize the balance equations for each energy type by creating a zero variable for each energy type
         balance_equations = {energy_type: self.model.add_variables(name=f'balance_{energy_type}',
                                                                    lower=0, upper=0, integer=True)
                              for energy_type in self.energy_types}
-        # Loop through each energy type
+        # Add the plant and market variables of each energy type to its balance equation (see VariableRoles)
         for energy_type in self.energy_types:
-            # Loop through each variable and add it to the balance equation accordingly
-            for variable_name, variable in self.model.variables.items():
-                # Add the variable as generation if it is a market variable for the current energy type
-                if ((variable_name.startswith(tuple(self.market_objects)))
-                        and (energy_type in variable_name)
-                        and (variable_name.endswith(f'_{c.PF_IN}') or variable_name.endswith(f'_{c.PF_OUT}'))):
-                    balance_equations[energy_type] += variable
-                # Add the variable if it is a plant variable
-                elif (variable_name.startswith(tuple(self.plant_objects))) \
-                        and (variable_name.endswith(f'_{energy_type}')
-                             or variable_name.endswith(f'_{energy_type}_{c.PF_IN}')
-                             or variable_name.endswith(f'_{energy_type}_{c.PF_OUT}')):
-                    # Get the component name by splitting the variable name at the underscore
-                    component_name = variable_name.split('_', 1)[0]
-
-                    # Get the component type by comparing the ID with the plant names
-                    component_type = [vals['type'] for plant, vals in self.plants.items()
-                                      if plant == component_name][0]
-
-                    # If the component type is in the mapping for the current energy type and the variable is for
-                    # the energy type, add the variable to the balance equation
-                    if (energy_type in self.mapping[component_type].keys()) and (energy_type in variable_name):
-                        # Get the operation mode for the component and energy type
-                        component_energy_mode = self.mapping[component_type][energy_type]
-
-                        # Add the variable to the balance equation
-                        # Note: All components are modeled positively meaning that positive flows flow into the
-                        #  main meter while negative flows flow out of the main meter. The components are modeled
-                        #  accordingly
-                        if component_energy_mode == c.OM_GENERATION:
-                            balance_equations[energy_type] += variable
-                        elif component_energy_mode == c.OM_LOAD:
-                            balance_equations[energy_type] += variable
-                        elif component_energy_mode == c.OM_STORAGE:
-                            balance_equations[energy_type] += variable
-                        else:
-                            raise ValueError(f"Unsupported operation mode: {component_energy_mode}")
-                    else:
-                        # The component type is not in the mapping for the current energy type
-                        pass
-                else:
-                    # The variable is not a market or plant variable
-                    pass
+            for variable_name in self.roles.get_balance(energy_type):
+                balance_equations[energy_type] += self.model.variables[variable_name]
 
         # Add the constraints for each energy type
         for energy_type, equation in balance_equations.items():
@@ -151,20 +94,11 @@ class Linopy(MpcBase):
         # Initialize the objective function as zero
         objective = []
 
-        # Loop through the model's variables to identify the balancing variables
-        for variable_name, variable in self.model.variables.items():
-            # Only consider the cost and revenue components of the markets
-            if variable_name.startswith(tuple(self.market_names)):
-                if variable_name.endswith('_costs'):
-                    # Add the variable to the objective function
-                    objective.append(variable)
-                elif variable_name.endswith('_revenue'):
-                    # Subtract the variable from the objective function
-                    objective.append(-1 * variable)
-                else:
-                    pass
-            else:
-                pass
+        # Add the costs and subtract the revenue of the markets
+        for variable_name in self.roles.get(c.VR_COSTS):
+            objective.append(self.model.variables[variable_name])
+        for variable_name in self.roles.get(c.VR_REVENUE):
+            objective.append(-1 * self.model.variables[variable_name])
 
         # Set the objective function to the model with the minimize direction
         self.model.add_objective(sum(objective), overwrite=True)
@@ -173,18 +107,16 @@ class Linopy(MpcBase):
 
     def run(self):
 
-        # Solve the optimization problem
-        solver = self.ems.get('solver')
-        match solver:
-            case 'gurobi':
-                sys.stdout = open(os.devnull, 'w')  # deactivate printing from linopy
-                solver_options = {'OutputFlag': 0, 'LogToConsole': 0}
-                if self.ems.get('time_limit') is not None:
-                    solver_options.update({'TimeLimit': self.ems['time_limit'] / 60})
-                status = self.model.solve(solver_name='gurobi', **solver_options)
-                sys.stdout = sys.__stdout__  # re-activate printing
-            case _:
-                raise ValueError(f"Unsupported solver: {solver}")
+        # Start from the solution of the last timestamp (if enabled and supported by the solver)
+        warmstart_fn = None
+        if self.solver.warm_start and self.model.status == 'ok':
+            warmstart_fn = self.solver.write_linopy_start(self.model, f"{self.agent.agent_save}/linopy_mpc_start.mst")
+
+        # Solve the optimization problem with the options of the solver backend
+        sys.stdout = open(os.devnull, 'w')  # deactivate printing from linopy
+        status = self.model.solve(solver_name=self.solver.name, warmstart_fn=warmstart_fn,
+                                  **self.solver.get_linopy_options())
+        sys.stdout = sys.__stdout__  # re-activate printing
 
         # Check if the solution is optimal
         if status[0] != 'ok':
@@ -199,6 +131,9 @@ class Linopy(MpcBase):
                 print(con)
             print(self.model.objective)
 
+            # The model is built again the next time
+            MODEL_REGISTRY.drop(self.model_key)
+
             raise ValueError(f"Optimization failed: {status}")
 
         # Process the solution into control commands and return
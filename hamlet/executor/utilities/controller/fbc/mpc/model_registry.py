@@ -0,0 +1,80 @@
+__author__ = "MarkusDoepfert"
+__credits__ = "HodaHamdy"
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+from collections import OrderedDict
+
+
+class ModelRegistry:
+    """
+    Optimization models of the mpc controllers that stay resident in the process that executes the agents.
+
+    The structure of the mpc model of an agent (variables, constraints and objective) only depends on its plants, its
+    markets and the number of timesteps. The model is therefore built once and kept in the process. At the following
+    timestamps the controller updates the bounds, coefficients and right-hand sides of the resident model (forecasts,
+    socs, prices) instead of building it again. If the structure changes (e.g. fewer timesteps at the end of the
+    simulation), the model is built again.
+
+    The models are kept per process and are not pickled. If an agent is executed in another process, its model is
+    built there again. There is one model per controller and agent, so the registry holds the models of the agents
+    that are executed in the process, i.e. the resident agents of a sticky worker or all agents if they are executed
+    serially. The registry is therefore not limited by default as the agents are executed in a fixed cycle and a
+    smaller limit would drop each model right before it is needed again. If a limit is given, the least recently used
+    models are dropped first if the registry is full.
+
+    Attributes:
+        max_entries: maximum number of resident models (None for no limit).
+        entries: resident models in the format {key: (signature, model)}.
+
+    """
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key: tuple, signature: tuple):
+        """
+        Get the resident model of the given key.
+
+        Args:
+            key: key of the model, e.g. controller and agent.
+            signature: structure the model needs to have.
+
+        Returns:
+            model: the resident model (None if there is none or its structure differs).
+
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        # a model with a different structure cannot be updated
+        if entry[0] != signature:
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: tuple, signature: tuple, model):
+        """Keep the model of the given key resident for the following timestamps"""
+        self.entries[key] = (signature, model)
+        self.entries.move_to_end(key)
+
+        # drop the least recently used models if the registry is full
+        while self.max_entries is not None and len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def drop(self, key: tuple):
+        """Drop the model of the given key (e.g. because its solve failed)"""
+        self.entries.pop(key, None)
+
+    def clear(self):
+        """Drop all resident models"""
+        self.entries = OrderedDict()
+
+
+# mpc models of all agents of this process
+MODEL_REGISTRY = ModelRegistry()
@@ -4,17 +4,28 @@ __license__ = ""
 __maintainer__ = "MarkusDoepfert"
 __email__ = "markus.doepfert@tum.de"
 
+import hamlet.constants as c
 from hamlet.executor.utilities.controller.fbc.fbc_base import FbcBase
+from hamlet.executor.utilities.controller.fbc.mpc.model_registry import MODEL_REGISTRY
+from hamlet.executor.utilities.controller.solvers import get_solver
+from hamlet.executor.utilities.controller.variable_roles import VariableRoles
 
 
 class MpcBase(FbcBase):
+    # Whether the controller can be solved together with the controllers of other agents (see MpcBatch)
+    batchable = False
+
     def __init__(self, **kwargs):
         # Call the super class
         super().__init__(**kwargs)
-        # Create the model
-        self.model = self.get_model(**kwargs)
+        # Get the solver backend
+        self.solver = get_solver(self.ems[c.C_CONTROLLER][c.C_FBC][c.C_OPTIM])
+        self.signature = self.get_signature()
         self.ems = self.ems['controller']['fbc']
 
+        # Create the index of the variables that the components register when they define them
+        self.roles = VariableRoles(self.mapping)
+
         # Create the market objects
         self.market_class = self.get_market_class()
         self.market_objects = {}
@@ -24,11 +35,43 @@ class MpcBase(FbcBase):
         self.plant_objects = {}
         self.create_plants()
 
+        # The model of a batched controller is defined and solved together with the other agents of the batch
+        self.batch = kwargs.get('batch') if self.batchable else None
+        self.model_key = (type(self).__name__, self.agent.agent_save)
+        self.model = None
+        self.resident = False
+        if self.batch is not None:
+            return
+
+        # Get the resident model of the agent or create a new one
+        # Note: The resident model has the same structure and is only updated by the definitions below.
+        self.model = MODEL_REGISTRY.get(self.model_key, self.signature)
+        self.resident = self.model is not None
+        if not self.resident:
+            self.model = self.get_model(**kwargs)
+
         # Define the model
+        self.define_model()
+
+        # Keep the model resident for the following timestamps
+        MODEL_REGISTRY.put(self.model_key, self.signature, self.model)
+
+    def define_model(self):
+        """Defines the variables, constraints and objective of the model"""
         self.define_variables()
         self.define_constraints()
         self.define_objective()
 
+    @property
+    def batch_group(self) -> str:
+        """Controllers of a batch with the same group are solved in one shared model (see MpcBatch)"""
+        return self.solver.name
+
+    def get_signature(self) -> tuple:
+        """Get the structure of the model (plants, markets, number of timesteps and solver) that the resident model must
+        have"""
+        return repr(self.plants), tuple(self.markets.items()), len(self.timesteps), self.dt, self.solver.name
+
     def create_markets(self):
         """"""
 
@@ -38,7 +81,8 @@ class MpcBase(FbcBase):
             self.market_objects[f'{market}'] = self.market_class(name=market,
                                                                  forecasts=self.forecasts,
                                                                  timesteps=self.timesteps,
-                                                                 delta=self.dt)
+                                                                 delta=self.dt,
+                                                                 roles=self.roles)
 
         return self.market_objects
 
@@ -68,7 +112,8 @@ class MpcBase(FbcBase):
                                                          socs=socs,
                                                          delta=self.dt,
                                                          timesteps=self.timesteps,
-                                                         markets=self.markets)
+                                                         markets=self.markets,
+                                                         roles=self.roles)
 
         return self.plant_objects
 
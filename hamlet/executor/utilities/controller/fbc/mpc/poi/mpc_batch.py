@@ -0,0 +1,93 @@
+__author__ = "HodaHamdy"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import numpy as np
+import pyoptinterface as poi
+
+import hamlet.constants as c
+from hamlet.executor.utilities.controller.fbc.mpc.model_registry import MODEL_REGISTRY
+from hamlet.executor.utilities.controller.fbc.mpc.poi.resident_model import BlockModel
+from hamlet.executor.utilities.controller.fbc.rb.rule_based import RuleBased
+
+
+class MpcBatch:
+    """
+    Batch of the poi mpc controllers of several agents that are solved as one block-diagonal problem.
+
+    Each agent solves a small mpc problem at each timestamp, for which the fixed overhead of a solve is often larger
+    than the solve itself. With a batch, the agents are first executed up to their controllers (AgentBase.prepare()).
+    The mpc controllers only create their market and plant objects and add themselves to the batch. The batch then
+    defines the models of all controllers as blocks of one shared model (BlockModel), solves it once and processes the
+    solution of each controller into the setpoints of its agent. Afterward, the agents create their bids and offers
+    (AgentBase.finish()).
+
+    The blocks do not share any variables or constraints, so minimizing the sum of their objectives minimizes each
+    block. Note that the time limit and the MIP gap of the solver apply to the whole batch.
+
+    The shared model stays resident in the process (see ModelRegistry) and is updated in place as long as the batch
+    consists of the same agents with the same structure. Controllers with different solvers are solved in separate
+    shared models. Rule-based controllers join the batch as well and are computed together as arrays over all their
+    agents (see RuleBased.run_batch()).
+
+    Attributes:
+        key: key of the batch, e.g. the region.
+        controllers: controllers of the batch in the format {batch group (solver name or rb): [controller]}.
+
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.controllers = {}
+
+    def add(self, controller):
+        """Add the fbc controller of an agent to the batch"""
+        self.controllers.setdefault(controller.batch_group, []).append(controller)
+
+    def solve(self):
+        """Solve the controllers of the batch and process their solutions into the setpoints of their agents"""
+        for group, controllers in self.controllers.items():
+            if group == c.C_RB:
+                RuleBased.run_batch(controllers)
+            else:
+                self.__solve_controllers(group, controllers)
+        self.controllers = {}
+
+    def __solve_controllers(self, solver_name: str, controllers: list):
+        """Solve the controllers with the same solver in one shared model"""
+        # Get the resident shared model of the batch or create a new one
+        key = (type(self).__name__, self.key, solver_name)
+        signature = tuple((controller.agent.agent_id, controller.signature) for controller in controllers)
+        model = MODEL_REGISTRY.get(key, signature)
+        resident = model is not None
+        if not resident:
+            model = controllers[0].get_model()
+
+        # Define the block of each controller (the blocks of the resident model are updated in place)
+        for controller in controllers:
+            controller.model = BlockModel(model, prefix=f'{controller.agent.agent_id}:')
+            controller.resident = resident
+            controller.define_model()
+        model.updating = True
+        MODEL_REGISTRY.put(key, signature, model)
+
+        # Minimize the sum of the objectives of all blocks
+        model.set_objective(np.sum([controller.model.objective for controller in controllers]),
+                            poi.ObjectiveSense.Minimize)
+
+        # Solve the optimization problem starting from the solution of the last timestamp
+        controllers[0].solver.set_poi_options(model)
+        model.set_start_values({controller.model.prefix + name: variables for controller in controllers
+                                for name, variables in controller.variables.items()})
+        model.optimize()
+        status = model.get_model_attribute(poi.ModelAttribute.TerminationStatus)
+
+        # Check if the solution is optimal
+        if status not in [poi.TerminationStatusCode.OPTIMAL, poi.TerminationStatusCode.TIME_LIMIT]:
+            print(f'Exited with status "{status}" for the batch {self.key}. \n ')
+
+        # Process the solution of each block into control commands
+        for controller in controllers:
+            controller.agent = controller.process_solution()
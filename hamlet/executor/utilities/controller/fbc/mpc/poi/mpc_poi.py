@@ -6,6 +6,7 @@ __email__ = "markus.doepfert@tum.de"
 
 from hamlet.executor.utilities.controller.fbc.mpc.mpc_base import MpcBase
 from hamlet.executor.utilities.controller.fbc.mpc.poi.components import *
+from hamlet.executor.utilities.controller.fbc.mpc.poi.resident_model import ResidentModel
 
 # Define all the available plants for this controller
 AVAILABLE_PLANTS = {
@@ -26,15 +27,16 @@ AVAILABLE_PLANTS = {
 
 
 class POI(MpcBase):
+    batchable = True
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Further definitions of the resident model update it in place (batched models are handled by the batch)
+        if self.batch is None:
+            self.model.updating = True
+
     def get_model(self, **kwargs):
-        env = gurobi.Env(empty=True)
-        env.set_raw_parameter("OutputFlag", 0)
-        env.start()
-        model = gurobi.Model(env)
-        model.set_model_attribute(poi.ModelAttribute.Silent, True)
-        model.set_raw_parameter("OutputFlag", 0)
-        model.set_raw_parameter("LogToConsole", 0)
-        return model
+        return ResidentModel(self.solver.create_poi_model())
 
     def get_available_plants(self):
         return AVAILABLE_PLANTS
@@ -67,51 +69,10 @@ class POI(MpcBase):
     def add_balance_constraints(self):
         # Initialize the balance equations for each energy type by creating a zero variable for each energy type
         balance_equations = {energy_type: [] for energy_type in self.energy_types}
-        # Loop through each energy type
+        # Add the plant and market variables of each energy type to its balance equation (see VariableRoles)
         for energy_type in self.energy_types:
-            # Loop through each variable and add it to the balance equation accordingly
-            for variable_name, variables in self.variables.items():
-                # Add the variable as generation if it is a market variable for the current energy type
-                if ((variable_name.startswith(tuple(self.market_objects)))
-                        and (energy_type in variable_name)
-                        and (variable_name.endswith(f'_{c.PF_IN}') or variable_name.endswith(f'_{c.PF_OUT}'))):
-                    balance_equations[energy_type].append(variables)
-                # Add the variable if it is a plant variable
-                elif (variable_name.startswith(tuple(self.plant_objects))) \
-                        and (variable_name.endswith(f'_{energy_type}')
-                             or variable_name.endswith(f'_{energy_type}_{c.PF_IN}')
-                             or variable_name.endswith(f'_{energy_type}_{c.PF_OUT}')):
-                    # Get the component name by splitting the variable name at the underscore
-                    component_name = variable_name.split('_', 1)[0]
-
-                    # Get the component type by comparing the ID with the plant names
-                    component_type = [vals['type'] for plant, vals in self.plants.items()
-                                      if plant == component_name][0]
-
-                    # If the component type is in the mapping for the current energy type and the variable is for
-                    # the energy type, add the variable to the balance equation
-                    if (energy_type in self.mapping[component_type].keys()) and (energy_type in variable_name):
-                        # Get the operation mode for the component and energy type
-                        component_energy_mode = self.mapping[component_type][energy_type]
-
-                        # Add the variable to the balance equation
-                        # Note: All components are modeled positively meaning that positive flows flow into the
-                        #  main meter while negative flows flow out of the main meter. The components are modeled
-                        #  accordingly
-                        if component_energy_mode == c.OM_GENERATION:
-                            balance_equations[energy_type].append(variables)
-                        elif component_energy_mode == c.OM_LOAD:
-                            balance_equations[energy_type].append(variables)
-                        elif component_energy_mode == c.OM_STORAGE:
-                            balance_equations[energy_type].append(variables)
-                        else:
-                            raise ValueError(f"Unsupported operation mode: {component_energy_mode}")
-                    else:
-                        # The component type is not in the mapping for the current energy type
-                        pass
-                else:
-                    # The variable is not a market or plant variable
-                    pass
+            for variable_name in self.roles.get_balance(energy_type):
+                balance_equations[energy_type].append(self.variables[variable_name])
 
         # Add the constraints for each energy type
         for energy_type, expressions in balance_equations.items():
@@ -126,36 +87,28 @@ class POI(MpcBase):
         # Initialize the objective function as zero
         objective = []
 
-        # Loop through the model's variables to identify the balancing variables
-        for variable_name, variables in self.variables.items():
-            # Only consider the cost and revenue components of the markets
-            if variable_name.startswith(tuple(self.market_names)):
-                if variable_name.endswith('_costs'):
-                    # Add the variable to the objective function
-                    objective.append(variables)
-                elif variable_name.endswith('_revenue'):
-                    # Subtract the variable from the objective function
-                    objective.append(-1 * variables)
-                else:
-                    pass
-            else:
-                pass
+        # Add the costs and subtract the revenue of the markets
+        for variable_name in self.roles.get(c.VR_COSTS):
+            objective.append(self.variables[variable_name])
+        for variable_name in self.roles.get(c.VR_REVENUE):
+            objective.append(-1 * self.variables[variable_name])
 
         # Set the objective function to the model with the minimize direction
         self.model.set_objective(np.sum(objective), poi.ObjectiveSense.Minimize)
 
     def run(self):
 
-        # Solve the optimization problem
-        solver = self.ems[c.C_OPTIM].get('solver')
-        match solver:
-            case 'gurobi':
-                if self.ems[c.C_OPTIM].get('time_limit') is not None:
-                    self.model.set_raw_parameter('TimeLimit', self.ems[c.C_OPTIM]['time_limit'] / 60)
-                self.model.optimize()
-                status = self.model.get_model_attribute(poi.ModelAttribute.TerminationStatus)
-            case _:
-                raise ValueError(f"Unsupported solver: {solver}")
+        # The batch defines and solves the model together with the other agents and processes the solution
+        if self.batch is not None:
+            self.batch.add(self)
+            return self.agent
+
+        # Solve the optimization problem with the time limit and threads of the solver backend
+        self.solver.set_poi_options(self.model)
+        # Start from the solution of the last timestamp
+        self.model.set_start_values(self.variables)
+        self.model.optimize()
+        status = self.model.get_model_attribute(poi.ModelAttribute.TerminationStatus)
 
         # Check if the solution is optimal
         if status not in [poi.TerminationStatusCode.OPTIMAL, poi.TerminationStatusCode.TIME_LIMIT]:
@@ -168,6 +121,7 @@ class POI(MpcBase):
         return self.agent
 
     def get_solution(self):
-        # Obtain the solution values
-        return {var_name: np.array([self.model.get_value(var) for var in vars]) for var_name, vars in
-                self.variables.items()}
+        # Obtain the solution values (kept as start values of the next solve)
+        self.model.solution = {var_name: np.array([self.model.get_value(var) for var in vars]) for var_name, vars in
+                               self.variables.items()}
+        return self.model.solution
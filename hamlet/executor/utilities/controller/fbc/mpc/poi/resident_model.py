@@ -0,0 +1,169 @@
+__author__ = "HodaHamdy"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import pyoptinterface as poi
+
+
+class ResidentModel:
+    """
+    Wrapper of a pyoptinterface model that is built once and updated in place at the following timestamps.
+
+    While the model is built, the variables and constraints are added to the model and their handles are kept by name.
+    When the components define the model again at a later timestamp (updating), the variables and constraints are
+    looked up by their name instead. Only the bounds, coefficients and right-hand sides that differ from the last
+    definition are changed in the model. All other calls (e.g. optimize, get_value) are passed on to the model.
+
+    Attributes:
+        model: the pyoptinterface model.
+        updating: whether the definitions update the existing model (False while the model is built).
+        variables: variables in the format {name: [variable, lower bound, upper bound]}.
+        constraints: constraints in the format {name: [constraint, {variable index: coefficient}, rhs]}.
+        solution: values of the variables of the last solve in the format {name: values} (start values of the next
+            solve).
+
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.updating = False
+        self.variables = {}
+        self.constraints = {}
+        self.solution = {}
+
+    def __getattr__(self, name):
+        # only called for attributes that are not defined by the wrapper
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def add_variable(self, name: str, lb: float, ub: float, domain=poi.VariableDomain.Continuous):
+        """Add the variable to the model or update the bounds of the existing variable with the same name"""
+        if not self.updating:
+            variable = self.model.add_variable(name=name, lb=lb, ub=ub, domain=domain)
+            self.variables[name] = [variable, lb, ub]
+            return variable
+
+        entry = self.__get_entry(self.variables, name)
+        variable, old_lb, old_ub = entry
+        if lb != old_lb:
+            self.model.set_variable_attribute(variable, poi.VariableAttribute.LowerBound, lb)
+        if ub != old_ub:
+            self.model.set_variable_attribute(variable, poi.VariableAttribute.UpperBound, ub)
+        entry[1:] = lb, ub
+
+        return variable
+
+    def add_linear_constraint(self, expr, sense, rhs: float, name: str = ''):
+        """Add the constraint to the model or update the coefficients and the right-hand side of the existing
+        constraint with the same name"""
+        if not self.updating:
+            constraint = self.model.add_linear_constraint(expr, sense, rhs, name=name)
+            terms, constant = self.__get_terms(expr)
+            self.constraints[name] = [constraint, terms, rhs - constant]
+            return constraint
+
+        entry = self.__get_entry(self.constraints, name)
+        constraint, old_terms, old_rhs = entry
+        terms, constant = self.__get_terms(expr)
+
+        # update the coefficients that changed (variables that are no longer part of the constraint are set to zero)
+        for index in old_terms.keys() | terms.keys():
+            coefficient = terms.get(index, 0.0)
+            if coefficient != old_terms.get(index, 0.0):
+                self.model.set_normalized_coefficient(constraint, poi.VariableIndex(index), coefficient)
+
+        # the constant of the expression is part of the right-hand side in the model
+        rhs = rhs - constant
+        if rhs != old_rhs:
+            self.model.set_normalized_rhs(constraint, rhs)
+        entry[1:] = terms, rhs
+
+        return constraint
+
+    def set_start_values(self, variables: dict):
+        """
+        Set the solution of the last solve as start values (warm start). The values are shifted by one timestep as the
+        horizon moved on by one timestep since the last solve.
+
+        Args:
+            variables: variables of the components in the format {name: array of variables}.
+
+        """
+        for name, values in self.solution.items():
+            variables_of_name = variables.get(name)
+            if variables_of_name is None or len(variables_of_name) != len(values):
+                continue
+            for variable, value in zip(variables_of_name, list(values[1:]) + list(values[-1:])):
+                self.model.set_variable_attribute(variable, poi.VariableAttribute.PrimalStart, value)
+
+    @staticmethod
+    def __get_entry(entries: dict, name: str) -> list:
+        """Get the variable or constraint of the given name that is updated"""
+        try:
+            return entries[name]
+        except KeyError:
+            raise ValueError(f"'{name}' is not part of the resident model. The structure of the model changed.")
+
+    @staticmethod
+    def __get_terms(expr) -> tuple[dict, float]:
+        """Get the coefficients of the variables and the constant of the expression"""
+        if not isinstance(expr, poi.ExprBuilder):
+            expr = poi.ExprBuilder(expr)
+        function = poi.ScalarAffineFunction(expr)
+        constant = function.constant if function.constant is not None else 0.0
+        return dict(zip(function.variables, function.coefficients)), constant
+
+
+class BlockModel:
+    """
+    View of the block of one agent in a resident model that is shared by the mpc controllers of several agents (see
+    MpcBatch).
+
+    The names of the variables and constraints of the block are prefixed so that they are unique in the shared model.
+    The objective of the block is kept instead of being set, as the batch minimizes the sum of the objectives of all
+    blocks. All other calls are passed on to the shared model.
+
+    Attributes:
+        model: the shared resident model.
+        prefix: prefix of the names of the block (e.g. the agent id).
+        objective: objective of the block.
+
+    """
+
+    def __init__(self, model: ResidentModel, prefix: str):
+        self.model = model
+        self.prefix = prefix
+        self.objective = 0
+
+    def __getattr__(self, name):
+        # only called for attributes that are not defined by the view
+        if name == 'model':
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    @property
+    def solution(self) -> dict:
+        """Solution of the block in the shared model without the prefix"""
+        return {name[len(self.prefix):]: values for name, values in self.model.solution.items()
+                if name.startswith(self.prefix)}
+
+    @solution.setter
+    def solution(self, solution: dict):
+        self.model.solution.update({self.prefix + name: values for name, values in solution.items()})
+
+    def add_variable(self, name: str, lb: float, ub: float, domain=poi.VariableDomain.Continuous):
+        """Add the variable of the block to the shared model"""
+        return self.model.add_variable(name=self.prefix + name, lb=lb, ub=ub, domain=domain)
+
+    def add_linear_constraint(self, expr, sense, rhs: float, name: str = ''):
+        """Add the constraint of the block to the shared model"""
+        return self.model.add_linear_constraint(expr, sense, rhs, name=self.prefix + name)
+
+    def set_objective(self, expr, sense=poi.ObjectiveSense.Minimize):
+        """Keep the objective of the block (the batch sets the objective of the shared model)"""
+        if sense != poi.ObjectiveSense.Minimize:
+            raise ValueError('The blocks of a batch can only be minimized.')
+        self.objective = expr
@@ -1,17 +1,272 @@
-__author__ = "Replace this with your name(s)"
+__author__ = "MarkusDoepfert"
 __credits__ = ""
 __license__ = ""
 __maintainer__ = "MarkusDoepfert"
 __email__ = "markus.doepfert@tum.de"
 
+import numpy as np
+
+import hamlet.constants as c
 from hamlet.executor.utilities.controller.fbc.fbc_base import FbcBase
+from hamlet.executor.utilities.controller.rules import PlantRows, group_sum, allocate, absorb, storage_limits, \
+    storage_soc
+
+# Define all the available plants for this controller and the rule that applies to them
+# Note: Flexible loads have no forecast and are not controlled by the rules.
+AVAILABLE_PLANTS = {
+            c.P_INFLEXIBLE_LOAD: 'load',
+            c.P_FLEXIBLE_LOAD: None,
+            c.P_HEAT: 'heat',
+            c.P_DHW: 'heat',
+            c.P_PV: 'gen',
+            c.P_WIND: 'gen',
+            c.P_FIXED_GEN: 'gen',
+            c.P_HP: 'hp',
+            c.P_EV: 'ev',
+            c.P_BATTERY: 'storage',
+            c.P_PSH: 'storage',
+            c.P_HYDROGEN: 'storage',
+            c.P_HEAT_STORAGE: 'heat_storage',
+        }
+
+
+class RuleBased(FbcBase):
+    """
+    Rule-based forecast controller.
+
+    The setpoints over the horizon follow fixed rules instead of an optimization:
+        - Loads and generation follow their forecasts (no curtailment).
+        - EVs charge with full power as soon as they are available until they are full (charge-on-arrival).
+        - Heat storages cover the heat demand if there is no PV surplus. Heat pumps cover the remaining heat demand and
+          use the PV surplus to charge the heat storages (PV-following).
+        - Batteries (and other electricity storages) charge with the surplus and discharge to cover the deficit
+          (self-consumption first). They neither charge from nor discharge to the grid.
+        - The remaining surplus or deficit of each energy type is sold or bought on its first market.
 
+    The solution has the same format as the solution of the mpc controllers (e.g. {plant}_{type}_{energy}_in/out,
+    {plant}_{type}_soc and {market}_{energy}_in/out) and is processed into the setpoints in the same way.
 
-class RuleBased(FbcBase):  # Note the change in class name
+    The rules are array operations over the plants and the horizon. Only the socs of the storages are computed
+    timestep by timestep. Without a batch, the arrays only contain the plants of the agent. With a batch (see MpcBatch),
+    the controllers of all agents of the batch are computed together (run_batch()).
+
+    """
+    # Controllers of a batch with the same group are computed together
+    batch_group = c.C_RB
 
     def __init__(self, **kwargs):
+        # Call the super class
         super().__init__(**kwargs)
+        self.ems = self.ems[c.C_CONTROLLER][c.C_FBC]
+        self.dt_hours = self.dt.total_seconds() * c.SECONDS_TO_HOURS  # time delta in hours
+
+        # Check that the rules apply to all plants
+        for plant_name, plant_data in self.plants.items():
+            if plant_data['type'] not in self.available_plants:
+                raise ValueError(f"Unsupported plant type: {plant_name} for the rule-based controller.")
+
+        # Plants and markets of the solution (see FbcBase.update_setpoints())
+        self.plant_objects = self.plants
+        self.market_objects = self.markets
+
+        # The rules of a batched controller are computed together with the other agents of the batch
+        self.batch = kwargs.get('batch')
+        self.solution = {}
+
+    def get_available_plants(self):
+        return AVAILABLE_PLANTS
 
     def run(self):
-        print('Running Rule-Based')
-        raise NotImplementedError()
+
+        # The batch computes the rules together with the other agents and processes the solution
+        if self.batch is not None:
+            self.batch.add(self)
+            return self.agent
+
+        # Compute the rules and process the solution into control commands
+        self.run_batch([self])
+
+        return self.agent
+
+    def get_solution(self):
+        return self.solution
+
+    @staticmethod
+    def run_batch(controllers: list):
+        """
+        Compute the rules of the controllers and process their solutions into the setpoints of their agents. The
+        controllers with the same number of timesteps are computed together.
+
+        Args:
+            controllers: rule-based controllers of the agents.
+
+        """
+        horizons = {}
+        for controller in controllers:
+            horizons.setdefault((len(controller.timesteps), controller.dt), []).append(controller)
+
+        for horizon in horizons.values():
+            RuleBased.__apply_rules(horizon)
+            for controller in horizon:
+                controller.agent = controller.process_solution()
+
+    @staticmethod
+    def __apply_rules(controllers: list):
+        """Compute the solution of the controllers (same number of timesteps) with the rules"""
+        num_agents = len(controllers)
+        num_timesteps = len(controllers[0].timesteps)
+        dt_hours = controllers[0].dt_hours
+        rows = RuleBased.__get_plant_rows(controllers, num_timesteps)
+        loads, gens, heats, hps, evs, storages, heat_storages = (rows[role] for role in (
+            'load', 'gen', 'heat', 'hp', 'ev', 'storage', 'heat_storage'))
+
+        # Loads and generation follow their forecasts (positive: surplus, negative: deficit)
+        electricity = (group_sum(gens['power'], gens.groups, num_agents)
+                       - group_sum(loads['power'], loads.groups, num_agents))
+        heat_demand = group_sum(heats['heat'], heats.groups, num_agents)
+
+        # Maximum heat of the heat pumps (limited by their heat and their electricity power)
+        hp_max = np.minimum(hps['power_heat'], hps['power_electricity'] * hps['cop'])
+
+        # Results of the flexible plants (power: positive flows into the main meter, negative flows out of it)
+        hp_heat = np.zeros((len(hps), num_timesteps))
+        ev_power, ev_socs = np.zeros((2, len(evs), num_timesteps))
+        storage_power, storage_socs = np.zeros((2, len(storages), num_timesteps))
+        heat_power, heat_socs = np.zeros((2, len(heat_storages), num_timesteps))
+        soc_ev, soc_storage, soc_heat = evs['soc'][:, 0], storages['soc'][:, 0], heat_storages['soc'][:, 0]
+
+        # Only the socs depend on the previous timestep
+        for t in range(num_timesteps):
+            # EVs charge with full power as soon as they are available until they are full (charge-on-arrival)
+            soc_ev = np.maximum(soc_ev - evs['energy_consumed'][:, t], 0)
+            charging, _ = storage_limits(soc_ev, evs['capacity'][:, t], evs['power'][:, t], evs['efficiency'][:, t],
+                                         dt_hours)
+            ev_power[:, t] = -charging * evs['availability'][:, t]
+            soc_ev = ev_socs[:, t] = storage_soc(soc_ev, ev_power[:, t], evs['efficiency'][:, t], dt_hours)
+            electricity[:, t] += group_sum(ev_power[:, t], evs.groups, num_agents)
+
+            # Heat storages cover the heat demand if there is no PV surplus
+            charging, discharging = storage_limits(soc_heat, heat_storages['capacity'][:, t],
+                                                   heat_storages['power'][:, t], heat_storages['efficiency'][:, t],
+                                                   dt_hours)
+            no_surplus = (electricity[:, t] <= 0)[heat_storages.groups]
+            discharge = allocate(heat_demand[:, t], discharging * no_surplus, heat_storages.groups)
+            demand = heat_demand[:, t] - group_sum(discharge, heat_storages.groups, num_agents)
+
+            # Heat pumps cover the remaining heat demand
+            hp_heat[:, t] = allocate(demand, hp_max[:, t], hps.groups)
+            electricity[:, t] -= group_sum(hp_heat[:, t] / hps['cop'][:, t], hps.groups, num_agents)
+
+            # Heat pumps use the remaining PV surplus to charge the heat storages (PV-following)
+            # Note: Only agents without a discharging heat storage have a surplus left.
+            room = group_sum(charging, heat_storages.groups, num_agents)
+            extra = allocate(np.maximum(electricity[:, t], 0), (hp_max[:, t] - hp_heat[:, t]) / hps['cop'][:, t],
+                             hps.groups) * hps['cop'][:, t]
+            total = group_sum(extra, hps.groups, num_agents)
+            extra *= np.divide(room, total, out=np.ones(num_agents), where=total > room)[hps.groups]
+            charge = allocate(group_sum(extra, hps.groups, num_agents), charging, heat_storages.groups)
+            hp_heat[:, t] += extra
+            electricity[:, t] -= group_sum(extra / hps['cop'][:, t], hps.groups, num_agents)
+            heat_power[:, t] = discharge - charge
+            soc_heat = heat_socs[:, t] = storage_soc(soc_heat, heat_power[:, t], heat_storages['efficiency'][:, t],
+                                                    dt_hours)
+
+            # Batteries charge with the surplus and discharge to cover the deficit (self-consumption first)
+            charging, discharging = storage_limits(soc_storage, storages['capacity'][:, t], storages['power'][:, t],
+                                                   storages['efficiency'][:, t], dt_hours)
+            storage_power[:, t] = absorb(electricity[:, t], np.zeros(len(storages)), -charging, discharging,
+                                         storages.groups)
+            soc_storage = storage_socs[:, t] = storage_soc(soc_storage, storage_power[:, t],
+                                                           storages['efficiency'][:, t], dt_hours)
+            electricity[:, t] += group_sum(storage_power[:, t], storages.groups, num_agents)
+
+        # Heat that is not covered (positive: surplus, negative: deficit)
+        heat = (group_sum(hp_heat, hps.groups, num_agents) + group_sum(heat_power, heat_storages.groups, num_agents)
+                - heat_demand)
+
+        # Collect the solution of each agent
+        solutions = [{} for _ in controllers]
+        RuleBased.__add_to_solutions(solutions, loads, {c.ET_ELECTRICITY: -loads['power']})
+        RuleBased.__add_to_solutions(solutions, gens, {c.ET_ELECTRICITY: gens['power']})
+        RuleBased.__add_to_solutions(solutions, heats, {c.ET_HEAT: -heats['heat']})
+        RuleBased.__add_to_solutions(solutions, hps, {c.ET_HEAT: hp_heat,
+                                                      c.ET_ELECTRICITY: -hp_heat / hps['cop']})
+        RuleBased.__add_to_solutions(solutions, evs, {f'{c.ET_ELECTRICITY}_{c.PF_OUT}': ev_power,
+                                                      f'{c.ET_ELECTRICITY}_{c.PF_IN}': np.zeros_like(ev_power),
+                                                      'soc': ev_socs})
+        RuleBased.__add_to_solutions(solutions, storages,
+                                     {f'{c.ET_ELECTRICITY}_{c.PF_OUT}': np.minimum(storage_power, 0),
+                                      f'{c.ET_ELECTRICITY}_{c.PF_IN}': np.maximum(storage_power, 0),
+                                      'soc': storage_socs})
+        RuleBased.__add_to_solutions(solutions, heat_storages, {f'{c.ET_HEAT}_{c.PF_OUT}': np.minimum(heat_power, 0),
+                                                                f'{c.ET_HEAT}_{c.PF_IN}': np.maximum(heat_power, 0),
+                                                                'soc': heat_socs})
+
+        for group, controller in enumerate(controllers):
+            # The first market of each energy type buys the deficit and sells the surplus
+            residuals = {c.ET_ELECTRICITY: electricity[group], c.ET_HEAT: heat[group]}
+            for market, energy_type in controller.markets.items():
+                residual = residuals.pop(energy_type, np.zeros(num_timesteps))
+                solutions[group][f'{market}_{energy_type}_{c.PF_IN}'] = np.maximum(-residual, 0)
+                solutions[group][f'{market}_{energy_type}_{c.PF_OUT}'] = np.minimum(-residual, 0)
+
+            controller.solution = solutions[group]
+
+    @staticmethod
+    def __get_plant_rows(controllers: list, num_timesteps: int) -> dict:
+        """Get the forecasts, sizing and socs of the plants of all controllers as rows of each rule"""
+        rows = {role: PlantRows(num_timesteps) for role in AVAILABLE_PLANTS.values() if role is not None}
+
+        for group, controller in enumerate(controllers):
+            fcast = controller.forecasts
+            for name, plant in controller.plants.items():
+                plant_type = plant['type']
+                role = AVAILABLE_PLANTS[plant_type]
+                sizing = plant.get('sizing', {})
+
+                match role:
+                    case 'load' | 'gen':
+                        rows[role].append(group, name, plant_type, power=fcast[f'{name}_{c.ET_ELECTRICITY}'])
+                    case 'heat':
+                        rows[role].append(group, name, plant_type, heat=fcast[f'{name}_{plant_type}'])
+                    case 'hp':
+                        cop = fcast[f'{name}_{c.S_COP}_{c.P_HEAT}'].to_numpy() * c.COP100_TO_COP
+                        # Note: The sizing power is a fallback to ensure that there is always enough power (see mpc)
+                        power_heat = RuleBased.__get_power(fcast, f'{name}_{c.S_POWER}_{c.ET_HEAT}_{c.P_HEAT}',
+                                                           sizing['power'])
+                        power_electricity = RuleBased.__get_power(
+                            fcast, f'{name}_{c.S_POWER}_{c.ET_ELECTRICITY}_{c.P_HEAT}', sizing['power'] / cop)
+                        rows[role].append(group, name, plant_type, cop=cop, power_heat=power_heat,
+                                          power_electricity=power_electricity)
+                    case 'ev':
+                        rows[role].append(group, name, plant_type,
+                                          availability=fcast[f'{name}_availability'],
+                                          energy_consumed=fcast[f'{name}_energy_consumed'],
+                                          capacity=sizing['capacity'],
+                                          power=sizing['charging_home'],
+                                          efficiency=sizing['charging_efficiency'],
+                                          soc=min(sizing['capacity'], controller.socs[name][0]))
+                    case 'storage' | 'heat_storage':
+                        rows[role].append(group, name, plant_type,
+                                          capacity=sizing['capacity'],
+                                          power=sizing['power'],
+                                          efficiency=sizing['efficiency'],
+                                          soc=min(sizing['capacity'], controller.socs[name][0]))
+                    case _:
+                        pass
+
+        return {role: plant_rows.stack() for role, plant_rows in rows.items()}
+
+    @staticmethod
+    def __get_power(fcast, col: str, minimum) -> np.ndarray:
+        """Get the power forecast of the column but at least the minimum (infinite if there is no such column)"""
+        if col not in fcast.columns:
+            return np.full(len(fcast), np.inf)
+        return np.maximum(minimum, fcast[col].to_numpy())
+
+    @staticmethod
+    def __add_to_solutions(solutions: list, rows: PlantRows, values: dict):
+        """Add the values of the plant rows to the solutions of their agents as {plant}_{type}_{key}"""
+        for key, array in values.items():
+            for group, name, plant_type, value in zip(rows.groups, rows.names, rows.types, array):
+                solutions[group][f'{name}_{plant_type}_{key}'] = value
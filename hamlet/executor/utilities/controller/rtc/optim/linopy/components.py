@@ -20,6 +20,7 @@ class LinopyComps:
         self.name = name
         self.ts = timeseries
         self.info = kwargs
+        self.roles = kwargs['roles']  # index of the variables of the controller
 
         # Other attributes (to be defined in subclasses)
         self.comp_type = None
@@ -42,8 +43,13 @@ class LinopyComps:
             model.variables[name].lower = kwargs.get("lower", -math.inf)
             model.variables[name].upper = kwargs.get("upper", math.inf)
 
+    def _register(self, name: str, role: str, comp_type: str = None, energy_type: str = None):
+        """Registers the variable of the component with its role (see VariableRoles)"""
+        self.roles.add(name, role, self.name, comp_type=comp_type, energy_type=energy_type)
+
     def define_electricity_variable(self, model, comp_type, lower, upper, integer=False) -> Model:
         # Define the power variable
+        self._register(f'{self.name}_{comp_type}_{c.ET_ELECTRICITY}', c.VR_POWER, comp_type, c.ET_ELECTRICITY)
         self.add_variable_to_model(model, name=f'{self.name}_{comp_type}_{c.ET_ELECTRICITY}', lower=lower, upper=upper,
                                    integer=integer)
 
@@ -53,7 +59,9 @@ class LinopyComps:
         # Define the power variable
         if load_target is None:
             name = f'{self.name}_{comp_type}_{c.ET_HEAT}'
+            self._register(name, c.VR_POWER, comp_type, c.ET_HEAT)
         else:
+            # Note: The variables of a load target are not part of the balance
             name = f'{self.name}_{comp_type}_{c.ET_HEAT}_{load_target}'
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, integer=integer)
 
@@ -63,7 +71,9 @@ class LinopyComps:
         # Define the power variable
         if load_target is None:
             name = f'{self.name}_{comp_type}_{c.ET_COOLING}'
+            self._register(name, c.VR_POWER, comp_type, c.ET_COOLING)
         else:
+            # Note: The variables of a load target are not part of the balance
             name = f'{self.name}_{comp_type}_{c.ET_COOLING}_{load_target}'
         self.add_variable_to_model(model, name=name, lower=lower, upper=upper, integer=integer)
 
@@ -71,6 +81,7 @@ class LinopyComps:
 
     def define_h2_variable(self, model, comp_type, lower, upper, integer=False) -> Model:
         # Define the power variable
+        self._register(f'{self.name}_{comp_type}_{c.ET_H2}', c.VR_POWER, comp_type, c.ET_H2)
         self.add_variable_to_model(model, name=f'{self.name}_{comp_type}_{c.ET_H2}', lower=lower, upper=upper,
                                    integer=integer)
 
@@ -79,6 +90,11 @@ class LinopyComps:
     # Subclass methods
 
     def _define_target_and_deviations_variables(self, model):
+        # Register the variables
+        self._register(f'{self.name}_{self.comp_type}_target', c.VR_TARGET, self.comp_type)
+        for direction in ('pos', 'neg'):
+            self._register(f'{self.name}_{self.comp_type}_deviation_{direction}', c.VR_DEVIATION, self.comp_type)
+
         self.add_variable_to_model(model, name=f'{self.name}_{self.comp_type}_target',
                                    lower=self.target, upper=self.target)
 
@@ -131,6 +147,13 @@ class Market(LinopyComps):
     def define_variables(self, model, **kwargs) -> Model:
         self.energy_type = kwargs['energy_type']
 
+        # Register the variables
+        self._register(f'{self.name}_{self.energy_type}', c.VR_MARKET, energy_type=self.energy_type)
+        self._register(f'{self.name}_{self.energy_type}_target', c.VR_TARGET, energy_type=self.energy_type)
+        for direction in ('pos', 'neg'):
+            self._register(f'{self.name}_{self.energy_type}_deviation_{direction}', c.VR_DEVIATION,
+                           energy_type=self.energy_type)
+
         # Define the market power variable
         self.add_variable_to_model(model, name=f'{self.name}_{self.energy_type}', lower=-inf, upper=inf, integer=False)
 
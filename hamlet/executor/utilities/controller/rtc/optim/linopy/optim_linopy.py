@@ -103,47 +103,10 @@ class Linopy(OptimBase):
                                                                    lower=0, upper=0, integer=True)
                              for energy_type in self.energy_types}
 
-        # Loop through each energy type
+        # Add the plant and market variables of each energy type to its balance equation (see VariableRoles)
         for energy_type in self.energy_types:
-            # Loop through each variable and add it to the balance equation accordingly
-            for variable_name, variable in self.model.variables.items():
-                # Add the variable as generation if it is a market variable for the current energy type
-                if (variable_name.startswith(tuple(self.market_objects))
-                        and variable_name.endswith(f'_{energy_type}')):
-                    balance_equations[energy_type] += variable
-                # Add the variable if it is a plant variable for the current energy type
-                elif (variable_name.startswith(tuple(self.plant_objects))
-                      and variable_name.endswith(f'_{energy_type}')):
-                    # Get the component name by splitting the variable name at the underscore
-                    component_name = variable_name.split('_', 1)[0]
-
-                    # Get the component type by comparing the ID with the plant names
-                    component_type = [vals['type'] for plant, vals in self.plants.items()
-                                      if plant == component_name][0]
-
-                    # If the component type is in the mapping for the current energy type, add the variable to the
-                    # balance equation
-                    if energy_type in self.mapping[component_type].keys():
-                        # Get the operation mode for the component and energy type
-                        component_energy_mode = self.mapping[component_type][energy_type]
-
-                        # Add the variable to the balance equation
-                        # Note: All components are modeled positively meaning that positive flows flow into the
-                        #  main meter while negative flows flow out of the main meter. The components are modeled
-                        #  accordingly
-                        if component_energy_mode == c.OM_GENERATION:
-                            balance_equations[energy_type] += variable
-                        elif component_energy_mode == c.OM_LOAD:
-                            balance_equations[energy_type] += variable
-                        elif component_energy_mode == c.OM_STORAGE:
-                            balance_equations[energy_type] += variable
-                        else:
-                            raise ValueError(f"Unsupported operation mode: {component_energy_mode}")
-                    else:
-                        # The component type is not in the mapping for the current energy type
-                        pass
-                else:
-                    pass
+            for variable_name in self.roles.get_balance(energy_type):
+                balance_equations[energy_type] += self.model.variables[variable_name]
 
         # Add the constraints for each energy type
         for energy_type, equation in balance_equations.items():
@@ -164,20 +127,11 @@ class Linopy(OptimBase):
         # Initialize the objective function as zero
         objective = []
 
-        # Loop through the model's variables to identify the balancing variables that need to be minimized
-        for variable_name, variable in self.model.variables.items():
-            # Check if variable_name contains an underscore
-            if "_deviation_" in variable_name:
-                # Extract component type from variable name using the weights mapping
-                component_type = next((key for key in weights.keys() if f'_{key}_' in variable_name), None)
-                # If component type is None assign market weight
-                component_type = 'market' if component_type is None else component_type
-
-                # Get the weight for the component type
-                weight = weights.get(component_type)
-
-                # Add deviation to objective function
-                objective.append(variable * weight)
+        # Add the deviations from the targets weighted by the type of their plant (markets and plants without a weight
+        # have the market weight)
+        for variable_name in self.roles.get(c.VR_DEVIATION):
+            weight = weights.get(self.roles[variable_name]['comp_type'], weights['market'])
+            objective.append(self.model.variables[variable_name] * weight)
 
         # Set the objective function to the model with the minimize direction
         self.model.add_objective(sum(objective), overwrite=True)
@@ -186,18 +140,10 @@ class Linopy(OptimBase):
 
     def run(self):
 
-        # Solve the optimization problem
-        solver = self.ems.get('solver')
-        match solver:
-            case 'gurobi':
-                sys.stdout = open(os.devnull, 'w')  # deactivate printing from linopy
-                solver_options = {'OutputFlag': 0, 'LogToConsole': 0}
-                if self.ems.get('time_limit') is not None:
-                    solver_options.update({'TimeLimit': self.ems['time_limit'] / 60})
-                status = self.model.solve(solver_name='gurobi', **solver_options)
-                sys.stdout = sys.__stdout__  # re-activate printing
-            case _:
-                raise ValueError(f"Unsupported solver: {solver}.")
+        # Solve the optimization problem with the options of the solver backend
+        sys.stdout = open(os.devnull, 'w')  # deactivate printing from linopy
+        status = self.model.solve(solver_name=self.solver.name, **self.solver.get_linopy_options())
+        sys.stdout = sys.__stdout__  # re-activate printing
 
         # Check if the solution is optimal
         if status[0] != 'ok':
@@ -250,36 +196,9 @@ class Linopy(OptimBase):
                                                                      lower=plant_power,
                                                                      upper=inf, integer=False)
 
-                    # Loop through each variable and add it to the balance equation accordingly
-                    for variable_name, variable in self.model.variables.items():
-                        # Add the variable if it is a plant variable for the current energy type
-                        if variable_name.startswith(tuple(self.plant_objects)) and variable_name.endswith(
-                                c.ET_ELECTRICITY):
-                            # Get the component name by splitting the variable name at the underscore
-                            component_name = variable_name.split('_', 1)[0]
-
-                            # Get the component type by comparing the ID with the plant names
-                            component_type = [vals['type'] for plant, vals in self.plants.items()
-                                              if plant == component_name][0]
-
-                            # If the component type is in the mapping for the current energy type, add the variable to
-                            # the balance equation
-                            if c.ET_ELECTRICITY in self.mapping[component_type].keys():
-                                # Get the operation mode for the component and energy type
-                                component_energy_mode = self.mapping[component_type][c.ET_ELECTRICITY]
-
-                                # Add the variable to the balance equation
-                                if component_energy_mode == c.OM_GENERATION:
-                                    balance_equations += variable
-                                elif component_energy_mode == c.OM_LOAD:
-                                    balance_equations += variable
-                                elif component_energy_mode == c.OM_STORAGE:
-                                    balance_equations += variable
-                                else:
-                                    raise ValueError(f"Unsupported operation mode: {component_energy_mode}")
-                            else:
-                                # The component type is not in the mapping for the current energy type
-                                pass
+                    # Add the electricity variables of the plants to the balance equation (see VariableRoles)
+                    for variable_name in self.roles.get_balance(c.ET_ELECTRICITY, markets=False):
+                        balance_equations += self.model.variables[variable_name]
 
                     self.model.add_constraints(balance_equations == 0, name='direct_power_control_ems')
 
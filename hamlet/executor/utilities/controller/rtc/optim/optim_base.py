@@ -8,12 +8,17 @@ import polars as pl
 
 import hamlet.constants as c
 from hamlet.executor.utilities.controller.rtc.rtc_base import RtcBase
+from hamlet.executor.utilities.controller.solvers import get_solver
+from hamlet.executor.utilities.controller.variable_roles import VariableRoles
 
 
 class OptimBase(RtcBase):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
+        # Get the solver backend
+        self.solver = get_solver(self.ems[c.C_CONTROLLER][c.C_RTC][c.C_OPTIM])
+
         # Create the model
         self.model = self.get_model(**kwargs)
         self.ems = self.ems[c.C_CONTROLLER][c.C_RTC]
@@ -26,6 +31,9 @@ class OptimBase(RtcBase):
         # Available plants
         self.available_plants = self.get_available_plants()
 
+        # Create the index of the variables that the components register when they define them
+        self.roles = VariableRoles(self.mapping)
+
         # Create the plant objects
         self.plant_objects = self.create_plants()
 
@@ -68,7 +76,7 @@ class OptimBase(RtcBase):
 
             # Create the plant object
             self.plant_objects[plant_name] = plant_class(name=plant_name, timeseries=timeseries, **plant_data,
-                                                         targets=targets, socs=socs, delta=self.dt)
+                                                         targets=targets, socs=socs, delta=self.dt, roles=self.roles)
 
         return self.plant_objects
 
@@ -83,7 +91,8 @@ class OptimBase(RtcBase):
             self.market_objects[market] = self.market_class(name=market,
                                                             timeseries=self.market,
                                                             market_result=self.market_results[market],
-                                                            delta=self.dt)
+                                                            delta=self.dt,
+                                                            roles=self.roles)
 
         return self.market_objects
 
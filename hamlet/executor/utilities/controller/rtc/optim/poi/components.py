@@ -20,6 +20,7 @@ class POIComps:
         self.name = name
         self.ts = timeseries
         self.info = kwargs
+        self.roles = kwargs['roles']  # index of the variables of the controller
 
         # Other attributes (to be defined in subclasses)
         self.comp_type = None
@@ -49,8 +50,13 @@ class POIComps:
         }
         variables[name] = model.add_variable(**kwargs_var)
 
+    def _register(self, name: str, role: str, comp_type: str = None, energy_type: str = None):
+        """Registers the variable of the component with its role (see VariableRoles)"""
+        self.roles.add(name, role, self.name, comp_type=comp_type, energy_type=energy_type)
+
     def define_electricity_variable(self, model, variables, comp_type, lower, upper, integer=False):
         # Define the power variable
+        self._register(f'{self.name}_{comp_type}_{c.ET_ELECTRICITY}', c.VR_POWER, comp_type, c.ET_ELECTRICITY)
         self.add_variable_to_model(model, variables, name=f'{self.name}_{comp_type}_{c.ET_ELECTRICITY}', lower=lower,
                                    upper=upper,
                                    integer=integer)
@@ -59,7 +65,9 @@ class POIComps:
         # Define the power variable
         if load_target is None:
             name = f'{self.name}_{comp_type}_{c.ET_HEAT}'
+            self._register(name, c.VR_POWER, comp_type, c.ET_HEAT)
         else:
+            # Note: The variables of a load target are not part of the balance
             name = f'{self.name}_{comp_type}_{c.ET_HEAT}_{load_target}'
         self.add_variable_to_model(model, variables, name=name, lower=lower, upper=upper, integer=integer)
 
@@ -67,12 +75,15 @@ class POIComps:
         # Define the power variable
         if load_target is None:
             name = f'{self.name}_{comp_type}_{c.ET_COOLING}'
+            self._register(name, c.VR_POWER, comp_type, c.ET_COOLING)
         else:
+            # Note: The variables of a load target are not part of the balance
             name = f'{self.name}_{comp_type}_{c.ET_COOLING}_{load_target}'
         self.add_variable_to_model(model, variables, name=name, lower=lower, upper=upper, integer=integer)
 
     def define_h2_variable(self, model, variables, comp_type, lower, upper, integer=False):
         # Define the power variable
+        self._register(f'{self.name}_{comp_type}_{c.ET_H2}', c.VR_POWER, comp_type, c.ET_H2)
         self.add_variable_to_model(model, variables, name=f'{self.name}_{comp_type}_{c.ET_H2}', lower=lower,
                                    upper=upper,
                                    integer=integer)
@@ -80,6 +91,11 @@ class POIComps:
     # Subclass methods
 
     def _define_target_and_deviations_variables(self, model, variables):
+        # Register the variables
+        self._register(f'{self.name}_{self.comp_type}_target', c.VR_TARGET, self.comp_type)
+        for direction in ('pos', 'neg'):
+            self._register(f'{self.name}_{self.comp_type}_deviation_{direction}', c.VR_DEVIATION, self.comp_type)
+
         self.add_variable_to_model(model, variables, name=f'{self.name}_{self.comp_type}_target',
                                    lower=self.target, upper=self.target)
 
@@ -126,6 +142,13 @@ class Market(POIComps):
     def define_variables(self, model, variables, **kwargs):
         self.energy_type = kwargs['energy_type']
 
+        # Register the variables
+        self._register(f'{self.name}_{self.energy_type}', c.VR_MARKET, energy_type=self.energy_type)
+        self._register(f'{self.name}_{self.energy_type}_target', c.VR_TARGET, energy_type=self.energy_type)
+        for direction in ('pos', 'neg'):
+            self._register(f'{self.name}_{self.energy_type}_deviation_{direction}', c.VR_DEVIATION,
+                           energy_type=self.energy_type)
+
         # Define the market power variable
         self.add_variable_to_model(model, variables, name=f'{self.name}_{self.energy_type}', lower=-inf, upper=inf,
                                    integer=True)
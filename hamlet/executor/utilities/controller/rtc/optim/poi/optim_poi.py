@@ -4,8 +4,6 @@ __license__ = ""
 __maintainer__ = "MarkusDoepfert"
 __email__ = "markus.doepfert@tum.de"
 
-from pyoptinterface import gurobi
-
 from hamlet.executor.utilities.controller.rtc.optim.poi.components import *
 from hamlet.executor.utilities.controller.rtc.optim.optim_base import OptimBase
 
@@ -29,14 +27,7 @@ AVAILABLE_PLANTS = {
 
 class POI(OptimBase):
     def get_model(self, **kwargs):
-        env = gurobi.Env(empty=True)
-        env.set_raw_parameter("OutputFlag", 0)
-        env.start()
-        model = gurobi.Model(env)
-        model.set_model_attribute(poi.ModelAttribute.Silent, True)
-        model.set_raw_parameter("OutputFlag", 0)
-        model.set_raw_parameter("LogToConsole", 0)
-        return model
+        return self.solver.create_poi_model()
 
     def get_available_plants(self):
         return AVAILABLE_PLANTS
@@ -80,47 +71,10 @@ class POI(OptimBase):
         # Initialize the balance equations for each energy type by creating a zero variable for each energy type
         balance_equations = {energy_type: [] for energy_type in self.energy_types}
 
-        # Loop through each energy type
+        # Add the plant and market variables of each energy type to its balance equation (see VariableRoles)
         for energy_type in self.energy_types:
-            # Loop through each variable and add it to the balance equation accordingly
-            for variable_name, variable in self.variables.items():
-                # Add the variable as generation if it is a market variable for the current energy type
-                if (variable_name.startswith(tuple(self.market_objects))
-                        and variable_name.endswith(f'_{energy_type}')):
-                    balance_equations[energy_type].append(variable)
-                # Add the variable if it is a plant variable for the current energy type
-                elif (variable_name.startswith(tuple(self.plant_objects))
-                      and variable_name.endswith(f'_{energy_type}')):
-                    # Get the component name by splitting the variable name at the underscore
-                    component_name = variable_name.split('_', 1)[0]
-
-                    # Get the component type by comparing the ID with the plant names
-                    component_type = [vals['type'] for plant, vals in self.plants.items()
-                                      if plant == component_name][0]
-
-                    # If the component type is in the mapping for the current energy type, add the variable to the
-                    # balance equation
-                    if energy_type in self.mapping[component_type].keys():
-                        # Get the operation mode for the component and energy type
-                        component_energy_mode = self.mapping[component_type][energy_type]
-
-                        # Add the variable to the balance equation
-                        # Note: All components are modeled positively meaning that positive flows flow into the
-                        #  main meter while negative flows flow out of the main meter. The components are modeled
-                        #  accordingly
-                        if component_energy_mode == c.OM_GENERATION:
-                            balance_equations[energy_type].append(variable)
-                        elif component_energy_mode == c.OM_LOAD:
-                            balance_equations[energy_type].append(variable)
-                        elif component_energy_mode == c.OM_STORAGE:
-                            balance_equations[energy_type].append(variable)
-                        else:
-                            raise ValueError(f"Unsupported operation mode: {component_energy_mode}")
-                    else:
-                        # The component type is not in the mapping for the current energy type
-                        pass
-                else:
-                    pass
+            for variable_name in self.roles.get_balance(energy_type):
+                balance_equations[energy_type].append(self.variables[variable_name])
 
         # Add the constraints for each energy type
         for energy_type, variables in balance_equations.items():
@@ -140,39 +94,21 @@ class POI(OptimBase):
         # Initialize the objective function as zero
         objective = []
 
-        # Loop through the model's variables to identify the balancing variables that need to be minimized
-        for variable_name, variable in self.variables.items():
-            # Check if variable_name contains an underscore
-            if "_deviation_" in variable_name:
-                # Extract component type from variable name using the weights mapping
-                component_type = next((key for key in weights.keys() if f'_{key}_' in variable_name), None)
-                # If component type is None assign market weight
-                component_type = 'market' if component_type is None else component_type
-
-                # Get the weight for the component type
-                weight = weights.get(component_type)
-
-                # Add deviation to objective function
-                objective.append(variable * weight)
+        # Add the deviations from the targets weighted by the type of their plant (markets and plants without a weight
+        # have the market weight)
+        for variable_name in self.roles.get(c.VR_DEVIATION):
+            weight = weights.get(self.roles[variable_name]['comp_type'], weights['market'])
+            objective.append(self.variables[variable_name] * weight)
 
         # Set the objective function to the model with the minimize direction
         self.model.set_objective(sum(objective), poi.ObjectiveSense.Minimize)
 
     def run(self):
 
-        # Solve the optimization problem
-        solver = self.ems[c.C_OPTIM].get('solver')
-        match solver:
-            case 'gurobi':
-                self.model.set_model_attribute(poi.ModelAttribute.Silent, True)
-                self.model.set_raw_parameter("OutputFlag", 0)
-                self.model.set_raw_parameter("LogToConsole", 0)
-                if self.ems[c.C_OPTIM].get('time_limit') is not None:
-                    self.model.set_raw_parameter('TimeLimit', self.ems[c.C_OPTIM]['time_limit'] / 60)
-                self.model.optimize()
-                status = self.model.get_model_attribute(poi.ModelAttribute.TerminationStatus)
-            case _:
-                raise ValueError(f"Unsupported solver: {solver}")
+        # Solve the optimization problem with the time limit and threads of the solver backend
+        self.solver.set_poi_options(self.model)
+        self.model.optimize()
+        status = self.model.get_model_attribute(poi.ModelAttribute.TerminationStatus)
 
         # Check if the solution is optimal
         if status not in [poi.TerminationStatusCode.OPTIMAL, poi.TerminationStatusCode.TIME_LIMIT]:
@@ -1,17 +1,205 @@
-__author__ = "Replace this with your name(s)"
+__author__ = "MarkusDoepfert"
 __credits__ = ""
 __license__ = ""
 __maintainer__ = "MarkusDoepfert"
 __email__ = "markus.doepfert@tum.de"
 
+import numpy as np
+
+import hamlet.constants as c
 from hamlet.executor.utilities.controller.rtc.rtc_base import RtcBase
+from hamlet.executor.utilities.controller.rules import PlantRows, group_sum, absorb, storage_limits
+
+# Define all the available plants for this controller and the rule that applies to them
+# Note: Flexible loads have no timeseries and are not controlled by the rules.
+AVAILABLE_PLANTS = {
+            c.P_INFLEXIBLE_LOAD: 'load',
+            c.P_FLEXIBLE_LOAD: None,
+            c.P_HEAT: 'heat',
+            c.P_DHW: 'heat',
+            c.P_PV: 'gen',
+            c.P_WIND: 'gen',
+            c.P_FIXED_GEN: 'gen',
+            c.P_HP: 'hp',
+            c.P_EV: 'ev',
+            c.P_BATTERY: 'storage',
+            c.P_PSH: 'storage',
+            c.P_HYDROGEN: 'storage',
+            c.P_HEAT_STORAGE: 'heat_storage',
+        }
+
+
+class Storage:
+    """State of a storage as needed to update its soc (see RtcBase.update_socs())"""
+
+    def __init__(self, soc: float, efficiency: float):
+        self.soc = soc
+        self.efficiency = efficiency
+
+
+class RuleBased(RtcBase):
+    """
+    Rule-based real-time controller.
 
+    The flexible plants follow the setpoints of the forecast-based controller (targets) within the limits of the current
+    timestep while loads and generation follow their actual values. The deviations are absorbed in the order in which
+    the optimization weighs them (see the objective of the optimization rtc):
+        - Heat: heat storages first, then the heat pumps.
+        - Electricity: batteries (and other electricity storages) first, then EVs, then the first market of the energy
+          type (balancing).
 
-class RuleBased(RtcBase):  # Note the change in class name
+    The solution has the same format as the solution of the optimization controllers ({plant}_{type}_{energy} and
+    {market}_{energy}) and is processed into the setpoints, socs and meters in the same way. The rules are array
+    operations over the plants of the agent.
+
+    """
 
     def __init__(self, **kwargs):
+        # Call the super class
         super().__init__(**kwargs)
+        self.ems = self.ems[c.C_CONTROLLER][c.C_RTC]
+        self.dt_hours = self.dt.total_seconds() * c.SECONDS_TO_HOURS  # time delta in hours
+
+        # Get the plants as rows of each rule (the storages are also plant objects to update their socs)
+        self.rows = self.create_plants()
+        self.solution = {}
+
+    def get_available_plants(self):
+        return AVAILABLE_PLANTS
+
+    def create_plants(self) -> dict:
+        """Get the timeseries, targets, sizing and socs of the plants as rows of each rule"""
+        rows = {role: PlantRows(1) for role in self.available_plants.values() if role is not None}
+
+        for name, plant in self.plants.items():
+            plant_type = plant['type']
+            if plant_type not in self.available_plants:
+                raise ValueError(f"Unsupported plant type: {name} for the rule-based controller.")
+            role = self.available_plants[plant_type]
+            sizing = plant.get('sizing', {})
+
+            match role:
+                case 'load' | 'gen':
+                    rows[role].append(0, name, plant_type, power=self.timeseries[f'{name}_{c.ET_ELECTRICITY}'][0])
+                case 'heat':
+                    rows[role].append(0, name, plant_type, heat=self.timeseries[f'{name}_{plant_type}'][0])
+                case 'hp':
+                    cop = self.__get_value(f'{name}_{c.S_COP}_{c.P_HEAT}', c.COP100_TO_COP, f'{name}_cop')
+                    # Note: The sizing power is a fallback to ensure that there is always enough power (see optim)
+                    power_heat = max(sizing.get('power', np.inf),
+                                     self.__get_value(f'{name}_{c.S_POWER}_{c.ET_HEAT}_{c.P_HEAT}', default=0))
+                    power_electricity = self.__get_value(f'{name}_{c.S_POWER}_{c.ET_ELECTRICITY}_{c.P_HEAT}',
+                                                         default=np.inf)
+                    power_electricity = max(sizing.get('power', 0) / cop, power_electricity)
+                    rows[role].append(0, name, plant_type, cop=cop, power_heat=power_heat,
+                                      power_electricity=power_electricity,
+                                      target=self.__get_target(name, plant_type, c.ET_ELECTRICITY))
+                case 'ev':
+                    # Overconsumption is assumed to be compensated elsewhere
+                    soc = max(0, self.socs[name][0] - self.timeseries[f'{name}_energy_consumed'][0])
+                    charging, discharging = storage_limits(soc, sizing['capacity'], sizing['charging_home'],
+                                                           sizing['charging_efficiency'], self.dt_hours)
+                    availability = self.timeseries[f'{name}_availability'][0]
+                    rows[role].append(0, name, plant_type, lower=-charging * availability,
+                                      upper=discharging * availability * sizing['v2g'],
+                                      target=self.__get_target(name, plant_type, c.ET_ELECTRICITY))
+                    self.plant_objects[name] = Storage(soc, sizing['charging_efficiency'])
+                case 'storage' | 'heat_storage':
+                    soc = self.socs[name][0]
+                    energy_type = next(iter(self.mapping[plant_type]))
+                    charging, discharging = storage_limits(soc, sizing['capacity'], sizing['power'],
+                                                           sizing['efficiency'], self.dt_hours)
+                    rows[role].append(0, name, plant_type, lower=-charging, upper=discharging,
+                                      target=self.__get_target(name, plant_type, energy_type))
+                    self.plant_objects[name] = Storage(soc, sizing['efficiency'])
+                case _:
+                    pass
+
+        return {role: plant_rows.stack() for role, plant_rows in rows.items()}
 
     def run(self):
-        print('Running Rule-Based')
-        raise NotImplementedError()
+
+        # Apply the rules and process the solution into control commands
+        self.solution = self.apply_rules()
+        self.agent = self.process_solution()
+
+        return self.agent
+
+    def apply_rules(self) -> dict:
+        """Compute the power of all plants and markets of the current timestep with the rules"""
+        loads, gens, heats, hps, evs, storages, heat_storages = (self.rows[role] for role in (
+            'load', 'gen', 'heat', 'hp', 'ev', 'storage', 'heat_storage'))
+        cop = hps['cop'][:, 0]
+
+        # The flexible plants follow their targets within their limits
+        hp_heat_max = np.minimum(hps['power_heat'][:, 0], hps['power_electricity'][:, 0] * cop)
+        hp_heat = np.clip(-hps['target'][:, 0] * cop, 0, hp_heat_max)
+        ev_power = np.clip(evs['target'][:, 0], evs['lower'][:, 0], evs['upper'][:, 0])
+        storage_power = np.clip(storages['target'][:, 0], storages['lower'][:, 0], storages['upper'][:, 0])
+        heat_power = np.clip(heat_storages['target'][:, 0], heat_storages['lower'][:, 0],
+                             heat_storages['upper'][:, 0])
+
+        # The heat storages and then the heat pumps absorb the deviation of the heat demand
+        heat_demand = group_sum(heats['heat'][:, 0], heats.groups, 1)
+        residual = group_sum(hp_heat, hps.groups, 1) + group_sum(heat_power, heat_storages.groups, 1) - heat_demand
+        heat_power = absorb(residual, heat_power, heat_storages['lower'][:, 0], heat_storages['upper'][:, 0],
+                            heat_storages.groups)
+        residual = group_sum(hp_heat, hps.groups, 1) + group_sum(heat_power, heat_storages.groups, 1) - heat_demand
+        hp_heat = absorb(residual, hp_heat, 0, hp_heat_max, hps.groups)
+        hp_electricity = np.divide(-hp_heat, cop, out=np.zeros_like(hp_heat), where=cop > 0)
+
+        # The electricity storages and then the EVs absorb the deviation from the market results
+        market_power = {market: int(round(self.market_results.get(market, 0) / self.dt_hours))
+                        for market in self.markets}
+        fixed = (group_sum(gens['power'][:, 0], gens.groups, 1) - group_sum(loads['power'][:, 0], loads.groups, 1)
+                 + group_sum(hp_electricity, hps.groups, 1)
+                 + sum(power for market, power in market_power.items() if self.markets[market] == c.ET_ELECTRICITY))
+        residual = fixed + group_sum(ev_power, evs.groups, 1) + group_sum(storage_power, storages.groups, 1)
+        storage_power = absorb(residual, storage_power, storages['lower'][:, 0], storages['upper'][:, 0],
+                               storages.groups)
+        residual = fixed + group_sum(ev_power, evs.groups, 1) + group_sum(storage_power, storages.groups, 1)
+        ev_power = absorb(residual, ev_power, evs['lower'][:, 0], evs['upper'][:, 0], evs.groups)
+        residual = fixed + group_sum(ev_power, evs.groups, 1) + group_sum(storage_power, storages.groups, 1)
+
+        # Collect the solution
+        solution = {}
+        self.__add_to_solution(solution, loads, {c.ET_ELECTRICITY: -loads['power'][:, 0]})
+        self.__add_to_solution(solution, gens, {c.ET_ELECTRICITY: gens['power'][:, 0]})
+        self.__add_to_solution(solution, heats, {c.ET_HEAT: -heats['heat'][:, 0]})
+        self.__add_to_solution(solution, hps, {c.ET_HEAT: hp_heat, c.ET_ELECTRICITY: hp_electricity})
+        self.__add_to_solution(solution, evs, {c.ET_ELECTRICITY: ev_power})
+        for name, plant_type, power in zip(storages.names, storages.types, storage_power):
+            solution[f'{name}_{plant_type}_{next(iter(self.mapping[plant_type]))}'] = int(round(power))
+        self.__add_to_solution(solution, heat_storages, {c.ET_HEAT: heat_power})
+
+        # The markets trade their results and the first electricity market also trades the remaining deviation
+        residuals = {c.ET_ELECTRICITY: residual[0]}
+        for market, energy_type in self.markets.items():
+            solution[f'{market}_{energy_type}'] = int(round(market_power[market] - residuals.pop(energy_type, 0)))
+
+        return solution
+
+    def get_solution(self):
+        return self.solution
+
+    def __get_value(self, col: str, factor: float = 1, fallback: str = None, default=None):
+        """Get the value of the timeseries column (or of the fallback column or the default if it does not exist)"""
+        if col in self.timeseries.columns:
+            return self.timeseries[col][0] * factor
+        if fallback is not None:
+            return self.timeseries[fallback][0]
+        return default
+
+    def __get_target(self, name: str, plant_type: str, energy_type: str) -> float:
+        """Get the target of the plant (column of the plant before the first fbc run and of its setpoint afterward)"""
+        for col in (name, f'{name}_{plant_type}_{energy_type}'):
+            if col in self.targets.columns:
+                return self.targets[col][0]
+        return 0
+
+    @staticmethod
+    def __add_to_solution(solution: dict, rows: PlantRows, values: dict):
+        """Add the values of the plant rows to the solution as {plant}_{type}_{key}"""
+        for key, array in values.items():
+            for name, plant_type, value in zip(rows.names, rows.types, array):
+                solution[f'{name}_{plant_type}_{key}'] = int(round(value))
@@ -36,7 +36,8 @@ class RtcBase(ControllerBase):
         self.ems = self.account[c.K_EMS]
         self.plants = self.agent.plants  # Formerly known as components
         self.setpoints = self.agent.setpoints
-        self.timeseries = self.agent.timeseries
+        # Note: Only the rows of the current timestamp are read (lazily loaded timeseries are not materialized)
+        self.timeseries = self.agent.get_table_window('timeseries', self.timestamp, self.timestamp)
         self.socs = self.agent.socs
         self.meters = self.agent.meters
         # Filter the timeseries to only include the rows with the current timestamp
@@ -0,0 +1,171 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import numpy as np
+
+
+class PlantRows:
+    """
+    Plants of the same kind of several agents as rows of arrays (used by the rule-based controllers).
+
+    The rows are added agent by agent so that the rows of each agent are next to each other and in the order of its
+    plants. All values have one column per timestep (scalar values like the capacity are repeated).
+
+    Attributes:
+        num_timesteps: number of timesteps (columns).
+        groups: index of the agent of each row.
+        names: name of the plant of each row.
+        types: type of the plant of each row.
+        data: values of the rows in the format {key: array of shape (rows, timesteps)}.
+
+    """
+
+    def __init__(self, num_timesteps: int):
+        self.num_timesteps = num_timesteps
+        self.groups = []
+        self.names = []
+        self.types = []
+        self.data = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, key: str) -> np.ndarray:
+        # Plants without rows have no values
+        if key not in self.data:
+            return np.zeros((0, self.num_timesteps))
+        return self.data[key]
+
+    def append(self, group: int, name: str, plant_type: str, **data):
+        """Add the plant of the given agent (group) with its values"""
+        self.groups.append(group)
+        self.names.append(name)
+        self.types.append(plant_type)
+        for key, values in data.items():
+            values = np.broadcast_to(np.asarray(values, dtype=float), (self.num_timesteps,))
+            self.data.setdefault(key, []).append(values)
+
+    def stack(self):
+        """Stack the values of all rows into arrays"""
+        self.groups = np.array(self.groups, dtype=int)
+        self.data = {key: np.stack(values) for key, values in self.data.items()}
+
+        return self
+
+
+def group_sum(values: np.ndarray, groups: np.ndarray, num_groups: int) -> np.ndarray:
+    """
+    Sum the values of the rows of each group.
+
+    Args:
+        values: values of the rows of shape (rows,) or (rows, timesteps).
+        groups: group of each row.
+        num_groups: number of groups.
+
+    Returns:
+        sums: sum of each group of shape (groups,) or (groups, timesteps).
+
+    """
+    sums = np.zeros((num_groups,) + np.shape(values)[1:])
+    np.add.at(sums, groups, values)
+
+    return sums
+
+
+def allocate(amount: np.ndarray, capacity: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """
+    Distribute the amount of each group over its rows. The rows are used one after another in their order, i.e. a row
+    is only used once the rows before it are used up to their capacity.
+
+    Args:
+        amount: non-negative amount of each group of shape (groups,) or (groups, timesteps).
+        capacity: non-negative capacity of each row of shape (rows,) or (rows, timesteps).
+        groups: group of each row (the rows of a group need to be next to each other).
+
+    Returns:
+        allocation: share of each row of the amount of its group (shape of capacity).
+
+    """
+    if len(groups) == 0:
+        return np.zeros(np.shape(capacity))
+
+    # A row never gets more than the amount of its group (this also removes infinite capacities)
+    amount = np.asarray(amount, dtype=float)[groups]
+    capacity = np.minimum(np.asarray(capacity, dtype=float), amount)
+
+    # Capacity of the rows before each row within its group
+    before = np.cumsum(capacity, axis=0) - capacity
+    _, first, inverse = np.unique(groups, return_index=True, return_inverse=True)
+    before = before - before[first][inverse]
+
+    return np.clip(amount - before, 0, capacity)
+
+
+def absorb(residual: np.ndarray, values: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+           groups: np.ndarray) -> np.ndarray:
+    """
+    Change the values of the rows within their bounds so that they absorb the residual of their group. A positive
+    residual (surplus) decreases the values, a negative residual (deficit) increases them. The rows are used one after
+    another in their order.
+
+    Args:
+        residual: residual of each group of shape (groups,).
+        values: current values of the rows of shape (rows,).
+        lower: lower bound of the rows.
+        upper: upper bound of the rows.
+        groups: group of each row.
+
+    Returns:
+        values: new values of the rows.
+
+    """
+    decrease = allocate(np.maximum(residual, 0), np.maximum(values - lower, 0), groups)
+    increase = allocate(np.maximum(-residual, 0), np.maximum(upper - values, 0), groups)
+
+    return values - decrease + increase
+
+
+def storage_limits(soc: np.ndarray, capacity: np.ndarray, power: np.ndarray, efficiency: np.ndarray,
+                   dt_hours: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Get the maximum charging and discharging power of storages at their current soc.
+
+    Args:
+        soc: state of charge (energy).
+        capacity: capacity (energy).
+        power: maximum charging and discharging power.
+        efficiency: charging and discharging efficiency.
+        dt_hours: length of the timestep in hours.
+
+    Returns:
+        charging: maximum charging power (positive).
+        discharging: maximum discharging power (positive).
+
+    """
+    charging = np.clip(np.minimum(power, (capacity - soc) / efficiency / dt_hours), 0, None)
+    discharging = np.clip(np.minimum(power, soc * efficiency / dt_hours), 0, None)
+
+    return charging, discharging
+
+
+def storage_soc(soc: np.ndarray, power: np.ndarray, efficiency: np.ndarray, dt_hours: float) -> np.ndarray:
+    """
+    Get the state of charge after one timestep.
+
+    Args:
+        soc: state of charge (energy) before the timestep.
+        power: power of the storage (negative: charging, positive: discharging).
+        efficiency: charging and discharging efficiency.
+        dt_hours: length of the timestep in hours.
+
+    Returns:
+        soc: state of charge (energy) after the timestep.
+
+    """
+    charging = np.maximum(-power, 0) * efficiency
+    discharging = np.maximum(power, 0) / efficiency
+
+    return soc + (charging - discharging) * dt_hours
@@ -0,0 +1,175 @@
+__author__ = "MarkusDoepfert"
+__credits__ = "HodaHamdy"
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import numpy as np
+import pyoptinterface as poi
+from pyoptinterface import gurobi, highs
+
+import hamlet.constants as c
+
+
+class SolverBase:
+    """
+    Solver backend of the optimization controllers (linopy and poi).
+
+    The backend creates the poi models and sets the options of each solve (output, time limit and threads) in the
+    notation of the solver. The options are taken from the optimization config of the controller:
+        solver: name of the solver (see SOLVERS).
+        time_limit: time limit of each solve (optional).
+        threads: maximum number of threads of each solve (optional, 0: chosen by the solver).
+        warm_start: whether the linopy models start from the solution of the last timestamp (optional, default: False).
+
+    Attributes:
+        name: name of the solver in linopy.
+        time_limit: time limit passed to the solver.
+        threads: maximum number of threads passed to the solver (None: default of the solver).
+        warm_start: whether the linopy models start from the solution of the last timestamp. Linopy only takes the
+        start values as a file so that it is opt-in. The poi models always start from the last solution (in memory).
+
+    """
+    name = None
+
+    def __init__(self, config: dict):
+        # Note: The time limit is passed to the solver as it was before the solver backends
+        self.time_limit = config['time_limit'] / 60 if config.get('time_limit') is not None else None
+        self.threads = config.get('threads')
+        self.warm_start = bool(config.get('warm_start', False))
+
+    def get_linopy_options(self) -> dict:
+        """Get the solver options of linopy.Model.solve()"""
+        raise NotImplementedError()
+
+    def create_poi_model(self):
+        """Create a new poi model of the solver without output"""
+        raise NotImplementedError()
+
+    def set_poi_options(self, model):
+        """Set the time limit and threads of the poi model"""
+        raise NotImplementedError()
+
+    def write_linopy_start(self, model, path: str):
+        """
+        Write the solution of the last solve of the linopy model as start values of the next solve. The values are
+        shifted by one timestep as the horizon moved on by one timestep since the last solve.
+
+        Args:
+            model: solved linopy model.
+            path: path of the file.
+
+        Returns:
+            path: path of the file that is passed to linopy as warmstart_fn (None if the solver does not support
+                warm starts in linopy).
+
+        """
+        return None
+
+
+class Gurobi(SolverBase):
+    """Gurobi (commercial, needs a license in each process)"""
+    name = c.C_GUROBI
+    # Environment shared by all poi models of the process (starting an environment checks the license)
+    env = None
+
+    def get_linopy_options(self) -> dict:
+        options = {'OutputFlag': 0, 'LogToConsole': 0}
+        if self.time_limit is not None:
+            options['TimeLimit'] = self.time_limit
+        if self.threads is not None:
+            options['Threads'] = self.threads
+        return options
+
+    def create_poi_model(self):
+        if Gurobi.env is None:
+            env = gurobi.Env(empty=True)
+            env.set_raw_parameter("OutputFlag", 0)
+            env.start()
+            Gurobi.env = env
+        model = gurobi.Model(Gurobi.env)
+        model.set_model_attribute(poi.ModelAttribute.Silent, True)
+        model.set_raw_parameter("OutputFlag", 0)
+        model.set_raw_parameter("LogToConsole", 0)
+        return model
+
+    def set_poi_options(self, model):
+        if self.time_limit is not None:
+            model.set_raw_parameter('TimeLimit', self.time_limit)
+        if self.threads is not None:
+            model.set_raw_parameter('Threads', self.threads)
+
+    def write_linopy_start(self, model, path: str):
+        # MIP start file with the names linopy gives the variables in the solver (x + label)
+        lines = ['# MIP start']
+        for name, variable in model.variables.items():
+            labels = np.ravel(variable.labels.values)
+            values = np.ravel(variable.solution.values)
+            if values.size > 1:
+                values = np.append(values[1:], values[-1:])
+            lines.extend(f'x{label} {value}' for label, value in zip(labels, values)
+                         if label >= 0 and not np.isnan(value))
+
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines))
+
+        return path
+
+
+class Highs(SolverBase):
+    """HiGHS (open-source, no license needed)"""
+    name = c.C_HIGHS
+    # Whether the HiGHS library of poi was loaded in this process
+    loaded = False
+
+    def get_linopy_options(self) -> dict:
+        options = {'output_flag': False, 'log_to_console': False}
+        if self.time_limit is not None:
+            options['time_limit'] = float(self.time_limit)
+        if self.threads is not None:
+            options['threads'] = int(self.threads)
+        return options
+
+    def create_poi_model(self):
+        if not Highs.loaded:
+            # poi uses the library that comes with highspy
+            if not highs.autoload_library():
+                raise ImportError("The HiGHS library could not be found. Install highspy to use the solver 'highs'.")
+            Highs.loaded = True
+        model = highs.Model()
+        model.set_model_attribute(poi.ModelAttribute.Silent, True)
+        return model
+
+    def set_poi_options(self, model):
+        if self.time_limit is not None:
+            model.set_raw_parameter('time_limit', float(self.time_limit))
+        if self.threads is not None:
+            model.set_raw_parameter('threads', int(self.threads))
+
+    # Note: linopy does not pass start values to HiGHS. The poi models are warm started (see ResidentModel).
+
+
+# Available solver backends
+SOLVERS = {
+    c.C_GUROBI: Gurobi,
+    c.C_HIGHS: Highs,
+}
+
+
+def get_solver(config: dict) -> SolverBase:
+    """
+    Get the solver backend of the optimization config of a controller.
+
+    Args:
+        config: optimization config of the controller (solver, time_limit, threads).
+
+    Returns:
+        solver: solver backend.
+
+    """
+    solver = config.get('solver')
+    solver_class = SOLVERS.get(solver)
+    if solver_class is None:
+        raise ValueError(f"Unsupported solver: {solver}. The available solvers are: {list(SOLVERS)}.")
+
+    return solver_class(config)
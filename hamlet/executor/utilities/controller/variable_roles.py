@@ -0,0 +1,101 @@
+__author__ = "MarkusDoepfert"
+__credits__ = "HodaHamdy"
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import hamlet.constants as c
+
+
+class VariableRoles:
+    """
+    Index of the variables of the model of an optimization controller by their role.
+
+    The components register their variables when they define them with the plant or market they belong to (owner), the
+    type of the plant, the energy type, the direction and the role (see VR_* in the constants). The balance constraints,
+    the objective and the grid commands get their variables from the index instead of matching the names of all
+    variables of the model.
+
+    Attributes:
+        mapping: energy types and operation modes of each plant type (see COMP_MAP).
+        variables: metadata of the variables in the format {name: {owner, comp_type, energy_type, direction, role}}.
+        roles: names of the variables in the format {role: {energy type: [name]}}.
+
+    """
+
+    def __init__(self, mapping: dict):
+        self.mapping = mapping
+        self.variables = {}
+        self.roles = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.variables
+
+    def __getitem__(self, name: str) -> dict:
+        return self.variables[name]
+
+    def add(self, name: str, role: str, owner: str, comp_type: str = None, energy_type: str = None,
+            direction: str = None):
+        """
+        Register the variable of a component.
+
+        Args:
+            name: name of the variable in the model.
+            role: role of the variable (VR_*).
+            owner: name of the plant or market the variable belongs to.
+            comp_type: type of the plant (None for markets).
+            energy_type: energy type of the variable (None if it has none, e.g. the mode flags).
+            direction: direction of the flow (PF_IN, PF_OUT or None).
+
+        """
+        # The components of a resident or loaded model define their variables again to update them
+        if name in self.variables:
+            return
+
+        self.variables[name] = {
+            'owner': owner,
+            'comp_type': comp_type,
+            'energy_type': energy_type,
+            'direction': direction,
+            'role': role,
+        }
+        self.roles.setdefault(role, {}).setdefault(energy_type, []).append(name)
+
+    def get(self, role: str, energy_type: str = None) -> list:
+        """Get the names of the variables with the role (and energy type if given)"""
+        energy_types = self.roles.get(role, {})
+        if energy_type is None:
+            return [name for names in energy_types.values() for name in names]
+        return energy_types.get(energy_type, [])
+
+    def get_balance(self, energy_type: str, markets: bool = True) -> list:
+        """
+        Get the names of the variables that are part of the balance of the energy type.
+
+        All components are modeled positively meaning that positive flows flow into the main meter while negative flows
+        flow out of the main meter. Thus, all plant variables of the energy type whose plant type operates with the
+        energy type (see mapping) and all market variables of the energy type are summed up.
+
+        Args:
+            energy_type: energy type of the balance.
+            markets: whether the market variables are part of the balance.
+
+        Returns:
+            names: names of the variables of the balance.
+
+        """
+        names = []
+        for name in self.get(c.VR_POWER, energy_type):
+            # Get the operation mode of the plant type for the energy type
+            mode = self.mapping.get(self.variables[name]['comp_type'], {}).get(energy_type)
+            if mode is None:
+                # The plant type is not in the mapping for the energy type
+                continue
+            if mode not in (c.OM_GENERATION, c.OM_LOAD, c.OM_STORAGE):
+                raise ValueError(f"Unsupported operation mode: {mode}")
+            names.append(name)
+
+        if markets:
+            names += self.get(c.VR_MARKET, energy_type)
+
+        return names
@@ -7,7 +7,16 @@ __email__ = "jiahe.chu@tum.de"
 import os.path
 import pickle
 import polars as pl
+from hamlet import constants as c
 from hamlet import functions as f
+from hamlet.executor.utilities.database.agent_store import AgentStore, TABLE_CACHE
+from hamlet.executor.utilities.database.result_sink import ResultSink
+from hamlet.executor.utilities.forecasts.forecast_metrics import ForecastMetrics
+
+
+def _table_property(table: str) -> property:
+    """Creates a property for the table that is read from and written to the store of the agent"""
+    return property(lambda self: self._get_table(table), lambda self, data: self._set_table(table, data))
 
 
 class AgentDB:
@@ -31,8 +40,27 @@ class AgentDB:
         timeseries (pl.LazyFrame): Timeseries data.
         setpoints (pl.LazyFrame): Setpoints data.
         forecasts (pl.LazyFrame): Forecast data.
+        store (AgentStore): store containing the tables of the agent (shared by all agents of a region if enabled).
+        lazy_files (dict): lazily loaded tables and their files in the format {table: (pl.LazyFrame, path)}.
     """
-    def __init__(self, path: str, agent_type: str, agent_id: str) -> None:
+    # Tables that are replaced during the simulation (polars tables are never changed in place)
+    TABLES = ('meters', 'socs', 'timeseries', 'setpoints', 'forecasts', 'bids_offers')
+    # Tables that cover the whole simulation period of which only the rows around the current timestamp change
+    TIME_TABLES = ('meters', 'socs')
+    # Tables that are not changed during the simulation (kept in the bounded TABLE_CACHE if loaded lazily)
+    READ_ONLY_TABLES = ('timeseries',)
+
+    # Empty table of tables that are not set yet (polars tables are never changed in place so it can be shared)
+    EMPTY = pl.DataFrame()
+
+    meters = _table_property('meters')
+    socs = _table_property('socs')
+    timeseries = _table_property('timeseries')
+    setpoints = _table_property('setpoints')
+    forecasts = _table_property('forecasts')
+    bids_offers = _table_property('bids_offers')
+
+    def __init__(self, path: str, agent_type: str, agent_id: str, store: AgentStore = None) -> None:
         """
         Initializes the AgentDB with the given path and agent type.
 
@@ -40,6 +68,7 @@ class AgentDB:
             path (str): The file path where the agent's information is stored.
             agent_type (str): The type of agent.
             agent_id (str): the agent id.
+            store (AgentStore, optional): store of the region. If None, the agent has its own store.
         """
 
         self.forecaster = None
@@ -51,14 +80,59 @@ class AgentDB:
         self.account = {}
         self.plants = {}
         self.specs = {}
-        self.meters = pl.DataFrame()
-        self.socs = pl.DataFrame()
-        self.timeseries = pl.DataFrame()
-        self.setpoints = pl.DataFrame()
-        self.forecasts = pl.DataFrame()
-        self.bids_offers = pl.DataFrame()
+        self.store = store if store is not None else AgentStore()
+        self.lazy_files = {}
+
+    def __getstate__(self) -> dict:
+        """Only the tables of this agent are pickled (e.g. when the agent is sent to a worker process)"""
+        state = self.__dict__.copy()
+        state['store'] = self.store.detach(self.agent_id)
+        return state
+
+    def _get_table(self, table: str) -> pl.DataFrame:
+        """Gets the table from the store (lazily loaded tables are materialized)"""
+        data = self._get_raw_table(table)
+        if isinstance(data, pl.LazyFrame):
+            # Read-only tables are kept in the bounded cache, all other tables are kept as they will be changed
+            if table in self.READ_ONLY_TABLES:
+                return TABLE_CACHE.get(data)
+            data = data.collect()
+            self._set_table(table, data)
+        return data
+
+    def _get_raw_table(self, table: str) -> pl.DataFrame | pl.LazyFrame:
+        """Gets the table from the store as it is stored (without materializing lazily loaded tables)"""
+        if not self.store.has(self.agent_id, table):
+            return self.EMPTY
+        return self.store.get(self.agent_id, table)
+
+    def get_table_window(self, table: str, start, end) -> pl.DataFrame:
+        """
+        Gets the rows of the table between start and end (both inclusive).
+
+        Lazily loaded tables are not materialized as a whole but only the rows of the window are read.
+        """
+        data = self._get_raw_table(table)
+        if isinstance(data, pl.LazyFrame):
+            cached = TABLE_CACHE.peek(data)
+            if cached is None:
+                return data.filter(pl.col(c.TC_TIMESTAMP).is_between(start, end)).collect()
+            data = cached
+        return f.slice_dataframe_window(data, start, end)
+
+    def _set_table(self, table: str, data: pl.DataFrame) -> None:
+        """Sets the table in the store"""
+        self.store.set(self.agent_id, table, data)
 
-    def register_agent(self) -> None:
+    def attach_store(self, store: AgentStore) -> None:
+        """Moves the tables of the agent to the given store (e.g. the store of the region)"""
+        if store is self.store:
+            return
+        for table in self.TABLES:
+            store.set(self.agent_id, table, self._get_table(table))
+        self.store = store
+
+    def register_agent(self, lazy: bool = False) -> None:
         """
         Reads and assigns class attributes from the data files located in the agent's folder.
 
@@ -66,6 +140,9 @@ class AgentDB:
         timeseries, State of Charge (SOC), and specifications. The data is stored
         as attributes of the AgentDB instance.
 
+        If lazy is True, the tables are only scanned from the files and materialized when they are needed for the first
+        time.
+
         Note:
             The loading process relies on the 'hamlet' library's load_file function.
         """
@@ -73,11 +150,32 @@ class AgentDB:
         self.account = f.load_file(path=os.path.join(self.agent_path, 'account.json'))
         self.plants = f.load_file(path=os.path.join(self.agent_path, 'plants.json'))
         self.specs = f.load_file(path=os.path.join(self.agent_path, 'specs.json'))
-        self.meters = f.load_file(path=os.path.join(self.agent_path, 'meters.ft'), df='polars', method='eager')
-        self.timeseries = f.load_file(path=os.path.join(self.agent_path, 'timeseries.ft'), df='polars', method='eager')
-        self.socs = f.load_file(path=os.path.join(self.agent_path, 'socs.ft'), df='polars', method='eager')
-        self.setpoints = f.load_file(path=os.path.join(self.agent_path, 'setpoints.ft'), df='polars', method='eager')
-        self.forecasts = f.load_file(path=os.path.join(self.agent_path, 'forecasts.ft'), df='polars', method='eager')
+        for table in AgentStore.FILE_TABLES:
+            # Skip tables that were already loaded by the store of the region
+            if self.store.has(self.agent_id, table):
+                continue
+            self._set_table(table, self.__load_table(table, lazy=lazy))
+
+    def __load_table(self, table: str, lazy: bool = False) -> pl.DataFrame | pl.LazyFrame:
+        """
+        Loads the table from the file of the agent.
+
+        If the agents of the region were saved together, the table is loaded from the stacked table of the region.
+        """
+        path = os.path.join(self.agent_path, f'{table}.ft')
+        if not os.path.exists(path):
+            data = AgentStore.load_agent_table(path=os.path.dirname(os.path.dirname(self.agent_path)),
+                                               agent_id=self.agent_id, table=table, lazy=lazy)
+            if data is not None:
+                return data
+
+        # Tables with appended rows are read eagerly to replay the log
+        if not lazy or os.path.exists(path + ResultSink.LOG_SUFFIX):
+            return ResultSink.read(path)
+
+        data = f.load_file(path=path, df='polars', method='lazy')
+        self.lazy_files[table] = (data, os.path.abspath(path))
+        return data
 
     def register_sub_agent(self, id: str, path: str) -> None:
         """
@@ -93,27 +191,143 @@ class AgentDB:
         self.sub_agents[id] = AgentDB(path, self.agent_type, id)
         self.sub_agents[id].register_agent()
 
-    def save_agent(self, path: str, save_all: bool = False) -> None:
+    def create_checkpoint(self) -> dict:
+        """
+        Creates a checkpoint of the agent's data that can be restored with restore_checkpoint().
+
+        The checkpoint only contains references to the current tables and forecaster train data. Since these are
+        replaced rather than changed in place during the simulation, creating a checkpoint does not copy any data. Only
+        the forecast metrics, which are changed in place, are copied (one small entry per plant and market).
+
+        Returns:
+            checkpoint (dict): references to the agent's data.
+        """
+        # Note: Lazily loaded tables are not materialized for the checkpoint
+        checkpoint = {table: self._get_raw_table(table) for table in self.TABLES}
+
+        # Forecaster train data (targets and features of each forecast id)
+        if self.forecaster is not None:
+            checkpoint['forecaster'] = {key: (data.get(c.K_TARGET), data.get(c.K_FEATURES))
+                                        for key, data in self.forecaster.train_data.items()}
+            checkpoint['metrics'] = self.forecaster.metrics.snapshot()
+
+        checkpoint['sub_agents'] = {id: sub_agent.create_checkpoint() for id, sub_agent in self.sub_agents.items()}
+
+        return checkpoint
+
+    def restore_checkpoint(self, checkpoint: dict) -> None:
+        """
+        Restores the agent's data from the given checkpoint.
+
+        Only the data that was replaced since the checkpoint was created is restored.
+
+        Args:
+            checkpoint (dict): checkpoint as returned by create_checkpoint().
+        """
+        for table in self.TABLES:
+            if self._get_raw_table(table) is not checkpoint[table]:
+                self._set_table(table, checkpoint[table])
+
+        # Forecaster train data (the models need to be updated as well)
+        for key, (target, features) in checkpoint.get('forecaster', {}).items():
+            train_data = self.forecaster.train_data[key]
+            if train_data.get(c.K_TARGET) is not target:
+                self.forecaster.update_forecaster(id=key, dataframe=target, target=True)
+            if train_data.get(c.K_FEATURES) is not features:
+                self.forecaster.update_forecaster(id=key, dataframe=features, target=False)
+
+        # Forecast metrics (e.g. so that a repeated timestamp is not recorded twice)
+        if 'metrics' in checkpoint:
+            self.forecaster.metrics.restore(checkpoint['metrics'])
+
+        for id, sub_checkpoint in checkpoint['sub_agents'].items():
+            self.sub_agents[id].restore_checkpoint(sub_checkpoint)
+
+    def get_changes(self, checkpoint: dict, window: tuple = None) -> dict:
+        """
+        Gets the data that was replaced since the given checkpoint was created.
+
+        Args:
+            checkpoint (dict): checkpoint as returned by create_checkpoint().
+            window (tuple, optional): first and last timestamp of the rows of the time tables (meters, socs) that can
+                have changed. If given, only these rows are returned for the time tables.
+
+        Returns:
+            changes (dict): agent_type and agent_id of the agent, the changed tables ('tables'), the changed
+            forecaster target data ('targets') and the changed forecast metrics ('metrics').
+        """
+        changes = {'agent_type': self.agent_type, 'agent_id': self.agent_id, 'tables': {}, 'targets': {},
+                   'metrics': {}}
+
+        for table in self.TABLES:
+            if self._get_raw_table(table) is not checkpoint[table]:
+                data = getattr(self, table)
+                if window and table in self.TIME_TABLES:
+                    data = data.filter(pl.col(c.TC_TIMESTAMP).is_between(*window))
+                changes['tables'][table] = data
+
+        # Forecaster target data (e.g. changed by variable grid fees)
+        for key, (target, _) in checkpoint.get('forecaster', {}).items():
+            if self.forecaster.train_data[key].get(c.K_TARGET) is not target:
+                changes['targets'][key] = self.forecaster.train_data[key][c.K_TARGET]
+
+        # Forecast metrics of the plants and markets that were forecasted or fitted
+        if 'metrics' in checkpoint:
+            changes['metrics'] = self.forecaster.metrics.get_changes(checkpoint['metrics'])
+
+        return changes
+
+    def save_agent(self, path: str, save_all: bool = False, save_tables: bool = True,
+                   sink: ResultSink = None) -> None:
         """
         Saves the agent's data to the agent's folder.
 
         The method saves the agent's data to the agent's folder as files.
         The data is stored as files with the same name as the class attributes.
+
+        If save_tables is False, the tables are saved together with the ones of the other agents by the store of the
+        region. Files of the tables from before are removed as they are outdated.
+
+        If a sink is given, only the rows that changed since the last save are appended to the files.
         """
 
         # Update agent path
         self.agent_save = os.path.abspath(path)
 
         # Save data
-        f.save_file(path=os.path.join(self.agent_save, 'meters.ft'), data=self.meters, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'timeseries.ft'), data=self.timeseries, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'socs.ft'), data=self.socs, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'setpoints.ft'), data=self.setpoints, df='polars')
-        f.save_file(path=os.path.join(self.agent_save, 'forecasts.ft'), data=self.forecasts, df='polars')
+        for table in AgentStore.FILE_TABLES:
+            table_path = os.path.join(self.agent_save, f'{table}.ft')
+            lazy, lazy_path = self.lazy_files.get(table, (None, None))
+            if lazy is not None and lazy_path == table_path and lazy is self._get_raw_table(table):
+                # Skip lazily loaded tables that did not change and would be saved to the file they were loaded from
+                if save_tables:
+                    continue
+                # Materialize the table before its file is removed
+                self._set_table(table, self._get_table(table))
+            if save_tables and sink is not None:
+                sink.write(table_path, getattr(self, table))
+            elif save_tables:
+                f.save_file(path=table_path, data=getattr(self, table), df='polars')
+            elif os.path.exists(table_path):
+                os.remove(table_path)
 
         # Save forecaster train data (for multiprocessing)
-        with open(os.path.join(self.agent_save, 'forecaster_train.pickle'), 'wb') as handle:
-            pickle.dump(self.forecaster.train_data, handle)
+        train_path = os.path.join(self.agent_save, 'forecaster_train.pickle')
+        if sink is not None:
+            # Only saved again if the train data changed
+            sink.dump(train_path, self.forecaster.train_data,
+                      refs=tuple(value for key, data in self.forecaster.train_data.items()
+                                 for value in (key, data.get(c.K_TARGET), data.get(c.K_FEATURES))))
+        else:
+            with open(train_path, 'wb') as handle:
+                pickle.dump(self.forecaster.train_data, handle)
+
+        # Save cost and accuracy of the forecasts (only the changed rows are appended if a sink is given)
+        metrics_path = os.path.join(self.agent_save, ForecastMetrics.FILE)
+        if sink is not None:
+            sink.write(metrics_path, self.forecaster.metrics.to_frame())
+        else:
+            f.save_file(path=metrics_path, data=self.forecaster.metrics.to_frame(), df='polars')
 
         # Data optional to save as there aren't any changes to them (as of now)
         if save_all:
@@ -0,0 +1,254 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import os
+from collections import OrderedDict
+
+import polars as pl
+
+from hamlet import constants as c
+from hamlet import functions as f
+
+
+class AgentStore:
+    """
+    Store of the tables of several agents.
+
+    Each AgentDB reads and writes its tables through a store. By default, each agent has its own store. If the region
+    uses a shared store, the tables of all agents can be stacked into one table with the column id_agent. This allows
+    region-wide operations (e.g. collecting the bids and offers) and saving the tables in one file per table instead of
+    one file per table and agent.
+
+    The columns of the file tables are named by plant (e.g. {plant_id}_{plant}_{key}). Thus, they are saved in long
+    format (id_agent, key columns, row, column, value) so that the files grow with the number of values instead of the
+    number of agents times their columns. The key columns (e.g. the timestamp) are the columns that are not numeric.
+    The values are saved as floats and cast back to their type when the table of an agent is loaded.
+
+    Attributes:
+        tables (dict): tables of the agents in the format {table: {agent_id: pl.DataFrame}}
+        saved (dict): tables as they were last saved in the format {file path: {agent_id: pl.DataFrame}} (unchanged
+            tables are not saved again)
+    """
+    # Tables that are saved to files
+    FILE_TABLES = ('meters', 'timeseries', 'socs', 'setpoints', 'forecasts')
+    # File containing the columns of each agent in the stacked tables
+    COLUMNS_FILE = 'columns.json'
+    # Columns of the long format
+    ROW = 'row'
+    COLUMN = 'column'
+    VALUE = 'value'
+
+    # Columns of the stacked tables in the format {path: (modification time, columns)} (read once per file)
+    _columns_cache = {}
+
+    def __init__(self):
+        self.tables = {}
+        self.saved = {}
+
+    def get(self, agent_id: str, table: str) -> pl.DataFrame:
+        """Gets the table of the agent"""
+        return self.tables[table][agent_id]
+
+    def set(self, agent_id: str, table: str, data: pl.DataFrame):
+        """Sets the table of the agent"""
+        self.tables.setdefault(table, {})[agent_id] = data
+
+    def has(self, agent_id: str, table: str) -> bool:
+        """Checks if the store contains the table of the agent"""
+        return agent_id in self.tables.get(table, {})
+
+    def detach(self, agent_id: str) -> 'AgentStore':
+        """Returns a new store that only contains the tables of the agent (e.g. to send the agent to a worker)"""
+        store = AgentStore()
+        for table, agents in self.tables.items():
+            if agent_id in agents:
+                store.set(agent_id, table, agents[agent_id])
+        return store
+
+    def stack(self, table: str) -> pl.DataFrame:
+        """
+        Stacks the table of all agents into one table.
+
+        The column id_agent is added to tables that do not contain it yet. Columns that only exist for some agents are
+        filled with null values for the other agents. Thus, this is meant for tables whose columns are shared by the
+        agents (e.g. bids_offers).
+        """
+        frames = [data if c.TC_ID_AGENT in data.columns else data.with_columns(pl.lit(agent_id).alias(c.TC_ID_AGENT))
+                  for agent_id, data in self.__get_frames(table).items()]
+        if not frames:
+            return pl.DataFrame()
+        return pl.concat(frames, how='diagonal')
+
+    def save(self, path: str):
+        """Saves the tables of all agents in long format to the given path (one file per table)
+
+        Tables of which no agent changed since the last save to the path are not saved again.
+        """
+        columns = {}
+        for table in self.FILE_TABLES:
+            table_path = os.path.join(path, f'{table}.ft')
+            frames = self.__get_frames(table)
+            columns[table] = {agent_id: self.__get_columns(data) for agent_id, data in frames.items()}
+
+            saved = self.saved.get(table_path)
+            if (saved is not None and saved.keys() == frames.keys()
+                    and all(saved[agent_id] is data for agent_id, data in frames.items())):
+                continue
+            f.save_file(path=table_path, data=self.__to_long(frames), df='polars')
+            self.saved[table_path] = frames
+
+        f.save_file(path=os.path.join(path, self.COLUMNS_FILE), data=columns)
+
+    def load(self, path: str) -> bool:
+        """Loads the stacked tables from the given path if they exist
+
+        Returns:
+            bool: True if the tables were loaded, False if there are no stacked tables
+        """
+        columns = self.load_columns(path)
+        if columns is None:
+            return False
+
+        for table in self.FILE_TABLES:
+            stacked = f.load_file(path=os.path.join(path, f'{table}.ft'), df='polars', method='eager')
+            if c.TC_ID_AGENT not in stacked.columns:    # no agent had the table
+                continue
+            for (agent_id,), data in stacked.partition_by([c.TC_ID_AGENT], as_dict=True, maintain_order=True).items():
+                self.set(agent_id, table, self.__from_long(data.lazy(), columns[table][agent_id]).collect())
+
+        return True
+
+    @classmethod
+    def load_columns(cls, path: str) -> dict | None:
+        """Loads the columns of the stacked tables in the given path (None if there are no stacked tables)
+
+        The file is only read again if it changed since it was read last.
+        """
+        file = os.path.abspath(os.path.join(path, cls.COLUMNS_FILE))
+        if not os.path.exists(file):
+            return None
+
+        mtime = os.stat(file).st_mtime_ns
+        cached = cls._columns_cache.get(file)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, f.load_file(path=file))
+            cls._columns_cache[file] = cached
+
+        return cached[1]
+
+    @classmethod
+    def load_agent_table(cls, path: str, agent_id: str, table: str,
+                         lazy: bool = False) -> pl.DataFrame | pl.LazyFrame | None:
+        """Loads the table of one agent from the stacked tables in the given path (None if they do not exist)
+
+        If lazy is True, the table is returned as LazyFrame that is only read when it is collected.
+        """
+        columns = cls.load_columns(path)
+        if columns is None:
+            return None
+
+        data = (pl.scan_ipc(os.path.join(path, f'{table}.ft'), memory_map=False)
+                .filter(pl.col(c.TC_ID_AGENT) == agent_id))
+        data = cls.__from_long(data, columns[table][agent_id])
+
+        return data if lazy else data.collect()
+
+    def __get_frames(self, table: str) -> dict:
+        """Gets the table of all agents that have it (lazily loaded tables are materialized)"""
+        frames = {agent_id: data.collect() if isinstance(data, pl.LazyFrame) else data
+                  for agent_id, data in self.tables.get(table, {}).items()}
+        # Tables that were never set have no columns
+        return {agent_id: data for agent_id, data in frames.items() if data.width}
+
+    @staticmethod
+    def __get_columns(data: pl.DataFrame) -> dict:
+        """Gets the columns of the table and the types of its value columns (all numeric and boolean columns)"""
+        return {'columns': data.columns,
+                'values': {col: str(dtype) for col, dtype in data.schema.items()
+                           if dtype.is_numeric() or dtype == pl.Boolean}}
+
+    @classmethod
+    def __to_long(cls, frames: dict) -> pl.DataFrame:
+        """Converts the tables of the agents into one table in long format"""
+        long = []
+        for agent_id, data in frames.items():
+            values = list(cls.__get_columns(data)['values'])
+            keys = [col for col in data.columns if col not in values and col != c.TC_ID_AGENT]
+            data = data.with_row_index(cls.ROW).with_columns(pl.lit(agent_id).alias(c.TC_ID_AGENT))
+            if values:
+                data = data.with_columns(pl.col(values).cast(pl.Float64)).melt(
+                    id_vars=[c.TC_ID_AGENT] + keys + [cls.ROW], value_vars=values, variable_name=cls.COLUMN,
+                    value_name=cls.VALUE)
+            else:
+                # Tables without values keep one row per row of the table
+                data = data.select([c.TC_ID_AGENT] + keys + [cls.ROW]).with_columns(
+                    pl.lit(None, dtype=pl.Utf8).alias(cls.COLUMN), pl.lit(None, dtype=pl.Float64).alias(cls.VALUE))
+            long.append(data)
+
+        if not long:
+            return pl.DataFrame()
+        return pl.concat(long, how='diagonal')
+
+    @classmethod
+    def __from_long(cls, data: pl.LazyFrame, columns: dict) -> pl.LazyFrame:
+        """Converts the long format rows of one agent back into its table"""
+        values = columns['values']
+        keys = [col for col in columns['columns'] if col not in values]
+        data = (data.group_by(cls.ROW, maintain_order=True)
+                .agg([pl.col(key).first() for key in keys]
+                     + [pl.col(cls.VALUE).filter(pl.col(cls.COLUMN) == col).first().alias(col) for col in values])
+                .sort(cls.ROW))
+
+        return data.select([pl.col(col).cast(getattr(pl, values[col])) if col in values else pl.col(col)
+                            for col in columns['columns']])
+
+
+class TableCache:
+    """
+    Bounded cache of lazily loaded tables that were materialized.
+
+    Only tables that are not changed during the simulation (e.g. timeseries) are kept here. If the cache is full, the
+    least recently used table is dropped and materialized again from its file when needed.
+
+    Attributes:
+        max_tables (int): maximum number of tables in the cache
+        tables (OrderedDict): materialized tables in the format {id(lazy): (lazy, data)}
+    """
+    MAX_TABLES = 512
+
+    def __init__(self, max_tables: int = MAX_TABLES):
+        self.max_tables = max_tables
+        self.tables = OrderedDict()
+
+    def get(self, lazy: pl.LazyFrame) -> pl.DataFrame:
+        """Gets the materialized table of the LazyFrame (materializes it if it is not in the cache)"""
+        key = id(lazy)
+        if key in self.tables:
+            self.tables.move_to_end(key)
+            return self.tables[key][1]
+
+        data = lazy.collect()
+        # The LazyFrame is kept as well so that its id cannot be reused while the entry exists
+        self.tables[key] = (lazy, data)
+        while len(self.tables) > self.max_tables:
+            self.tables.popitem(last=False)
+
+        return data
+
+    def peek(self, lazy: pl.LazyFrame) -> pl.DataFrame | None:
+        """Gets the materialized table of the LazyFrame if it is in the cache (None otherwise)"""
+        entry = self.tables.get(id(lazy))
+        return entry[1] if entry is not None else None
+
+    def resize(self, max_tables: int):
+        """Changes the maximum number of tables in the cache"""
+        self.max_tables = max_tables
+        while len(self.tables) > self.max_tables:
+            self.tables.popitem(last=False)
+
+
+# Cache of the materialized read-only tables of all agents of this process
+TABLE_CACHE = TableCache()
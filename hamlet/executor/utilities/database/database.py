@@ -28,13 +28,26 @@ class Database:
         __regions: Dictionary contains RegionDB objects. The AgentDB and MarketDB objects of the corresponding region
         are stored in each RegionDB object.
         __grids: Dictionary contains different types of GridDB objects.
+        __agent_store: If True, the tables of all agents of a region are kept in one store of the region.
+        __lazy_agents: If True, the tables of the agents are loaded from the files when they are needed.
+        __append_results: If True, only the changed rows of the agent tables are appended to their files when saving.
+        __global_forecast_models: If True, the plants of the same type in a region share one global forecast model.
 
     """
 
-    def __init__(self, scenario_path):
+    def __init__(self, scenario_path, agent_store: bool = False, lazy_agents: bool = False,
+                 append_results: bool = False, global_forecast_models: bool = False):
 
         self.__scenario_path = scenario_path
 
+        self.__agent_store = agent_store
+
+        self.__lazy_agents = lazy_agents
+
+        self.__append_results = append_results
+
+        self.__global_forecast_models = global_forecast_models
+
         self.__general = {}  # dict
 
         self.__regions = {}
@@ -201,15 +214,8 @@ class Database:
             all markets and timesteps in the specified region.
 
         """
-        # get bids and offers table
-        bids_offers = {}
-
-        for agents in self.__regions[region].agents.values():
-            for agent_id, agentDB in agents.items():
-                bids_offers[agent_id] = agentDB.bids_offers
-
-        # combine tables
-        bids_offers_table = pl.concat(bids_offers.values(), how='vertical')
+        # get bids and offers table of all agents
+        bids_offers_table = self.__regions[region].get_agent_table('bids_offers')
 
         # if given, generate lists for applying self.filter_market_data function
         by = []
@@ -235,6 +241,10 @@ class Database:
 
         return bids_offers_table
 
+    def get_local_market_prices(self, region: str) -> dict:
+        """Retrieve the local market prices of the last market clearing of the specified region."""
+        return self.__regions[region].local_market_prices
+
     """post data"""
 
     def post_agents_to_region(self, region: str, agents: list):
@@ -253,8 +263,56 @@ class Database:
         for agent in agents:
             agent_id = agent.agent_id
             agent_type = agent.agent_type
+            # Move the tables of the agent to the store of the region (agents from worker processes have their own)
+            if self.__regions[region].agent_store is not None:
+                agent.attach_store(self.__regions[region].agent_store)
             self.__regions[region].agents[agent_type][agent_id] = agent
 
+    def post_agent_deltas_to_region(self, region: str, deltas: list):
+        """
+        Post the changes of agents that are executed in resident worker processes to the given region.
+
+        Each delta is a dict as returned by AgentDB.get_changes() containing the agent_type and agent_id as well as the
+        changed tables, forecaster target data and forecast metrics. Tables in 'tables' either replace the existing
+        table or, for tables that cover the whole simulation period (meters, socs), contain the changed rows. The
+        changed rows replace the rows with the same timestamp.
+
+        Args:
+            region: name of the region.
+            deltas: list of dicts containing the changes of each agent.
+
+        """
+        for delta in deltas:
+            agent = self.__regions[region].agents[delta['agent_type']][delta['agent_id']]
+
+            # Update tables
+            for table, data in delta['tables'].items():
+                if table in agent.TIME_TABLES:
+                    old_data = getattr(agent, table)
+                    data = (old_data.filter(~pl.col(c.TC_TIMESTAMP).is_in(data.get_column(c.TC_TIMESTAMP)))
+                            .merge_sorted(data, key=c.TC_TIMESTAMP))
+                setattr(agent, table, data)
+
+            # Update forecaster train data
+            for key, target in delta['targets'].items():
+                agent.forecaster.update_forecaster(id=key, dataframe=target, target=True)
+
+            # Update forecast metrics
+            agent.forecaster.metrics.update(delta.get('metrics', {}))
+
+    def set_remote_forecasters(self, remote: bool):
+        """
+        Set if the forecasters of the agents are resident in worker processes.
+
+        If so, the local market prices are only calculated in the main process and applied in the worker processes.
+
+        Args:
+            remote: True if the forecasters are resident in worker processes.
+
+        """
+        for region in self.__regions.values():
+            region.remote_forecasters = remote
+
     def post_markets_to_region(self, region: str, markets: list, timestamp, path_results):
         """
         Post the given markets to the given region.
@@ -423,6 +481,37 @@ class Database:
 
         return filtered_market
 
+    """checkpoints"""
+
+    def create_checkpoint(self) -> dict:
+        """
+        Create a checkpoint of the regions that can be restored with restore_checkpoint().
+
+        The checkpoint only stores references to the current agent and market data. Since all tables are replaced
+        rather than changed in place during the simulation, creating a checkpoint does not copy any data and restoring
+        it only touches the data that changed in the meantime.
+
+        Note:
+            The grids are not part of the checkpoint since their results and restriction commands are to be kept when
+            a timestamp is repeated.
+
+        Returns:
+            checkpoint: dict with region names as keys and region checkpoints as values.
+
+        """
+        return {region: region_db.create_checkpoint() for region, region_db in self.__regions.items()}
+
+    def restore_checkpoint(self, checkpoint: dict):
+        """
+        Restore the regions from the given checkpoint.
+
+        Args:
+            checkpoint: checkpoint as returned by create_checkpoint().
+
+        """
+        for region, region_checkpoint in checkpoint.items():
+            self.__regions[region].restore_checkpoint(region_checkpoint)
+
     """save database"""
 
     def save_database(self, path: str, save_restriction_commands_only):
@@ -441,7 +530,9 @@ class Database:
 
         # save region data
         for region in self.__regions.keys():
-            self.__regions[region].save_region(path=os.path.join(path, region))
+            # Note: The appended rows of the agent tables are compacted into their files when the whole database is saved
+            self.__regions[region].save_region(path=os.path.join(path, region),
+                                               compact=not save_restriction_commands_only)
 
         # save grid data
         grid_path = os.path.join(path, list(self.__regions.keys())[0], 'grids')
@@ -464,8 +555,10 @@ class Database:
         Get all general information from files in scenario path and write them to self.__general dict.
 
         """
-        self.__general[c.K_WEATHER] = f.load_file(path=os.path.join(self.__scenario_path, 'general', 'weather',
-                                                                    'weather.ft'), df='polars', method='eager')
+        # Note: The weather is flagged as sorted so that the forecasters can slice it by binary search
+        self.__general[c.K_WEATHER] = f.set_sorted_time_index(
+            f.load_file(path=os.path.join(self.__scenario_path, 'general', 'weather', 'weather.ft'), df='polars',
+                        method='eager'))
         self.__general[c.K_RETAILER] = f.load_file(path=os.path.join(self.__scenario_path, 'general', 'retailer.ft'),
                                                    df='polars', method='eager')
         self.__general[c.K_TASKS] = f.load_file(path=os.path.join(self.__scenario_path, 'general', 'timetable.ft'),
@@ -485,7 +578,10 @@ class Database:
 
         for region in structure.keys():
             # initialize RegionDB object
-            self.__regions[region] = RegionDB(os.path.join(os.path.dirname(self.__scenario_path), structure[region]))
+            self.__regions[region] = RegionDB(os.path.join(os.path.dirname(self.__scenario_path), structure[region]),
+                                              agent_store=self.__agent_store, lazy_agents=self.__lazy_agents,
+                                              append_results=self.__append_results,
+                                              global_forecast_models=self.__global_forecast_models)
 
             # register region
             self.__regions[region].register_region()
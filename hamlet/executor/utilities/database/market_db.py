@@ -4,19 +4,26 @@ __license__ = ""
 __maintainer__ = "jiahechu"
 __email__ = "jiahe.chu@tum.de"
 
+import copy
 import datetime
 import os
-import shutil
 
 import polars as pl
 
 from hamlet import constants as c
 from hamlet import functions as f
+from hamlet.executor.utilities.database.market_spill import MarketSpill
 
 
 class MarketDB:
     """Database contains all the information for markets.
     Should only be connected with Database class, no connection with main Executor."""
+    # Tables that are replaced during the simulation (polars tables are never changed in place)
+    TABLES = ('market_transactions', 'bids_cleared', 'bids_uncleared', 'offers_cleared', 'offers_uncleared',
+              'positions_matched', 'retailer')
+    # Tables that contain the results of the market clearing
+    RESULT_TABLES = ('market_transactions', 'bids_cleared', 'bids_uncleared', 'offers_cleared', 'offers_uncleared',
+                     'positions_matched')
 
     def __init__(self, market_type, name, market_path, retailer_path):
         self.market_type = market_type
@@ -32,6 +39,7 @@ class MarketDB:
         self.offers_uncleared = pl.DataFrame()
         self.positions_matched = pl.DataFrame()
         self.retailer = pl.DataFrame()
+        self.spill = None   # spill of the records that are out of the horizon (created with the first records)
 
         # Tuples of (file name, file schema)
         self.files = [(f'{c.TN_MARKET_TRANSACTIONS}.ft', c.TS_MARKET_TRANSACTIONS),
@@ -89,52 +97,75 @@ class MarketDB:
             f.save_file(path=os.path.join(path, 'offers_uncleared.ft'), data=self.offers_uncleared, df='polars')
 
     def save_and_drop_past_records(self, timestamp, path_results):
-        """Save market data out of horizon to files and drop the past records."""
+        """Spill market data out of horizon and drop the past records."""
         horizon_range = self.market_config['clearing']['timing']['horizon'][1]
         start_horizon_ts = timestamp - datetime.timedelta(seconds=horizon_range)
 
+        if self.spill is None:
+            self.spill = MarketSpill(os.path.join(path_results, 'markets', self.market_type, self.market_name,
+                                                  'past_data'))
+
         for file_name, schema in self.files:
-            attr_name, extension = file_name.rsplit('.', 1)
-            path = os.path.join(path_results, 'markets', self.market_type, self.market_name, 'past_data', attr_name)
-            # Create new folder if nonexisting
-            f.create_folder(path, delete=False)
+            attr_name = file_name.rsplit('.', 1)[0]
             # Skip saving data if all data is within horizon
             df = getattr(self, attr_name)
             min_timestep = df.select(pl.min(c.TC_TIMESTEP)).item()
             if min_timestep and min_timestep >= start_horizon_ts:
                 continue
             past_data = df.filter(pl.col(c.TC_TIMESTEP) < start_horizon_ts)
-            # Save dataframe to file if nonempty
+            # Spill dataframe if nonempty
             if len(past_data):
-                f.save_file(path=os.path.join(path, f'{attr_name}_{start_horizon_ts.timestamp()}.{extension}'),
-                            data=past_data, df='polars')
+                self.spill.add(attr_name, start_horizon_ts, past_data)
             # Replace with new data
             new_data = df.filter(pl.col(c.TC_TIMESTEP) >= start_horizon_ts)
             setattr(self, attr_name, new_data)
 
+    def get_past_data(self, table: str) -> pl.LazyFrame:
+        """Gets the lazy query of all records of the table including the spilled ones"""
+        schema = dict(self.files)[f'{table}.ft']
+        current = getattr(self, table).lazy().cast(schema)
+        if self.spill is None:
+            return current
+        return pl.concat([self.spill.scan(table, schema), current], how='vertical')
+
     def concat_past_data(self, delete_dir=True):
-        """Concatenates past data saved in files"""
-        # Files to be processed. Tuples of (file name, file schema)
+        """Merges the spilled past data with the current data into single files"""
+        if self.spill is None:
+            self.spill = MarketSpill(os.path.join(self.market_save, 'past_data'))
+
         for file_name, schema in self.files:
             # Get attribute name
             attr_name = file_name.rsplit('.', 1)[0]
-            # Get attribute path
-            path = os.path.join(self.market_save, 'past_data', attr_name)
-            # Collect dataframe parts
-            df_parts = [getattr(self, attr_name)]  # initialize with current data
-            # Add all saved data in files
-            for file_part in os.listdir(path):
-                df = f.load_file(path=os.path.join(path, file_part), df='polars', method='eager', parse_dates=True)
-                df = df.cast(schema)
-                df_parts.append(df)
-            # If list is nonempty, concatenate and save dataframe
-            if df_parts:
-                df = pl.concat(df_parts)
-                df = df.sort(by=[c.TC_TIMESTAMP, c.TC_TIMESTEP]).to_pandas()
-                f.save_file(path=os.path.join(self.market_save, file_name), data=df, df='pandas')
-            # Optionally delete the past data
-            if delete_dir:
-                shutil.rmtree(path)
+            # Merge the spilled and the current data without loading all of it into memory
+            self.spill.merge(attr_name, current=getattr(self, attr_name), schema=schema,
+                             path=os.path.join(self.market_save, file_name))
+
+        # Optionally delete the past data
+        if delete_dir:
+            self.spill.delete()
+
+    def create_checkpoint(self) -> dict:
+        """Creates a checkpoint of the market tables (only references as the tables are not changed in place)."""
+        return {table: getattr(self, table) for table in self.TABLES}
+
+    def restore_checkpoint(self, checkpoint: dict):
+        """Restores the market tables that were replaced since the checkpoint was created."""
+        for table, data in checkpoint.items():
+            if getattr(self, table) is not data:
+                setattr(self, table, data)
+
+    def get_slice(self, timestep) -> 'MarketDB':
+        """Returns a copy of the market that only contains the data needed to clear the given timestep.
+
+        The result tables only keep their schema as they are cleared by the market anyway. The copy is small enough to
+        be sent to a worker process.
+        """
+        market_slice = copy.copy(self)
+        market_slice.retailer = self.retailer.filter(pl.col(c.TC_TIMESTAMP) == timestep)
+        market_slice.market_transactions = self.market_transactions.filter(pl.col(c.TC_TIMESTEP) == timestep)
+        for table in self.RESULT_TABLES[1:]:
+            setattr(market_slice, table, getattr(self, table).clear())
+        return market_slice
 
     def set_market_transactions(self, data):
         self.market_transactions = data
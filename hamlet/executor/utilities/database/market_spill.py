@@ -0,0 +1,98 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import glob
+import os
+import shutil
+
+import polars as pl
+
+from hamlet import constants as c
+from hamlet import functions as f
+
+
+class MarketSpill:
+    """
+    Spill of the past records of the market tables.
+
+    The records that are out of the market horizon are buffered in memory and written as Parquet files partitioned by
+    the date of their timestep once the buffer is full (past_data/{table}/{date}/part-{number}.parquet). The spilled
+    history can be queried lazily and is merged with the current records into one file at the end of the simulation
+    without loading all records into memory.
+
+    Attributes:
+        path (str): path of the past data of the market
+        buffers (dict): buffered records in the format {table: {start of horizon: pl.DataFrame}}
+        parts (int): number of written flushes (used to name the files)
+    """
+    # Number of buffered rows of a table from which on they are written to files
+    BUFFER_ROWS = 100_000
+    # Column with the date of the timestep that is used to partition the files
+    DATE = '__date'
+
+    def __init__(self, path: str):
+        self.path = path
+        self.buffers = {}
+        self.parts = 0
+
+    def __getstate__(self) -> dict:
+        """The buffered records are not pickled (e.g. when the market is sent to a worker process)"""
+        state = self.__dict__.copy()
+        state['buffers'] = {}
+        return state
+
+    def add(self, table: str, start_horizon, data: pl.DataFrame):
+        """
+        Adds the past records of the table that were dropped at the given start of the horizon.
+
+        The records of the same start of the horizon are replaced if they are added again (e.g. if the timestamp is
+        executed again). The records of earlier starts are written to files if the buffer is full.
+        """
+        buffer = self.buffers.setdefault(table, {})
+        if sum(df.height for df in buffer.values()) >= self.BUFFER_ROWS:
+            self.flush(table, before=start_horizon)
+        buffer[start_horizon] = data
+
+    def flush(self, table: str, before=None):
+        """Writes the buffered records of the table to files (only the ones added before the given start of the
+        horizon if before is not None)"""
+        buffer = self.buffers.get(table, {})
+        keys = [key for key in buffer if before is None or key < before]
+        if not keys:
+            return
+
+        data = (pl.concat([buffer.pop(key) for key in keys], how='vertical_relaxed')
+                .with_columns(pl.col(c.TC_TIMESTEP).dt.date().alias(self.DATE)))
+        for (date,), partition in data.partition_by([self.DATE], as_dict=True, include_key=False).items():
+            path = os.path.join(self.path, table, str(date), f'part-{self.parts:05d}.parquet')
+            f.create_folder(os.path.dirname(path), delete=False)
+            partition.write_parquet(path)
+        self.parts += 1
+
+    def scan(self, table: str, schema: dict) -> pl.LazyFrame:
+        """Scans the spilled records of the table (including the buffered ones)"""
+        frames = [data.lazy().cast(schema) for data in self.buffers.get(table, {}).values()]
+        if glob.glob(self.__get_pattern(table)):
+            frames.insert(0, pl.scan_parquet(self.__get_pattern(table)).cast(schema))
+        if not frames:
+            return pl.LazyFrame(schema=schema)
+        return pl.concat(frames, how='vertical')
+
+    def merge(self, table: str, current: pl.DataFrame, schema: dict, path: str):
+        """Merges the spilled records of the table with the current records sorted into the given file"""
+        (pl.concat([self.scan(table, schema), current.lazy().cast(schema)], how='vertical')
+         .sort(by=[c.TC_TIMESTAMP, c.TC_TIMESTEP])
+         .sink_ipc(path, compression='lz4'))
+
+    def delete(self):
+        """Deletes all spilled records"""
+        self.buffers = {}
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+
+    def __get_pattern(self, table: str) -> str:
+        """Gets the glob pattern of the spilled files of the table"""
+        return os.path.join(self.path, table, '*', '*.parquet')
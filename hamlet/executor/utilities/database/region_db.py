@@ -11,19 +11,30 @@ import polars as pl
 from hamlet import constants as c
 from hamlet import functions as f
 from hamlet.executor.utilities.database.agent_db import AgentDB
+from hamlet.executor.utilities.database.agent_store import AgentStore
 from hamlet.executor.utilities.database.market_db import MarketDB
+from hamlet.executor.utilities.database.result_sink import ResultSink
 from hamlet.executor.utilities.forecasts.forecaster import Forecaster
+from hamlet.executor.utilities.forecasts.global_models import GlobalModels
+from hamlet.executor.utilities.forecasts.market_forecasts import MarketForecasts
 
 
 class RegionDB:
     """Database contains all the information for region."""
-    def __init__(self, path):
+    def __init__(self, path, agent_store: bool = False, lazy_agents: bool = False, append_results: bool = False,
+                 global_forecast_models: bool = False):
 
         self.region_path = path
         self.region_save = None  # path to save the region
         self.agents = {}
         self.markets = {}
         self.subregions = {}
+        self.local_market_prices = {}   # local market prices of the last market clearing
+        self.remote_forecasters = False     # True if the forecasters are resident in worker processes
+        self.agent_store = AgentStore() if agent_store else None    # store of the tables of all agents if enabled
+        self.lazy_agents = lazy_agents  # if True, the tables of the agents are loaded when needed
+        self.result_sink = ResultSink() if append_results else None   # appends the changed rows of the agent tables
+        self.global_forecast_models = global_forecast_models    # if True, plants of the same type share one model
 
     def register_region(self):
         """Register this region."""
@@ -31,16 +42,81 @@ class RegionDB:
 
         self.__register_all_markets()
 
-    def save_region(self, path):
-        """Save this region."""
+    def save_region(self, path, compact: bool = False):
+        """Save this region (compact=True writes the appended rows of the agent tables back into their files)."""
 
         # Update region path
         self.region_save = os.path.abspath(path)
 
         self.__save_all_agents()
 
+        if compact and self.result_sink is not None:
+            self.result_sink.compact()
+
         self.__save_all_markets()
 
+    def create_checkpoint(self) -> dict:
+        """
+        Create a checkpoint of the region that can be restored with restore_checkpoint().
+
+        The checkpoint contains the AgentDB and MarketDB objects of the region together with the checkpoints of their
+        data. No data is copied since all tables are replaced rather than changed in place.
+
+        Returns:
+            checkpoint: dict with the checkpoints of agents and markets as well as the local market prices.
+
+        """
+        return {'agents': {agent_type: {agent_id: (agent, agent.create_checkpoint())
+                                        for agent_id, agent in agents.items()}
+                           for agent_type, agents in self.agents.items()},
+                'markets': {market_type: {market_name: (market, market.create_checkpoint())
+                                          for market_name, market in markets.items()}
+                            for market_type, markets in self.markets.items()},
+                'local_market_prices': self.local_market_prices}
+
+    def restore_checkpoint(self, checkpoint: dict):
+        """
+        Restore the region from the given checkpoint.
+
+        Agents and markets that were replaced (e.g. by results of the parallel execution) are replaced with the objects
+        of the checkpoint. Afterward, only the data that was replaced since the checkpoint was created is restored.
+
+        Args:
+            checkpoint: checkpoint as returned by create_checkpoint().
+
+        """
+        for agent_type, agents in checkpoint['agents'].items():
+            for agent_id, (agent, agent_checkpoint) in agents.items():
+                self.agents[agent_type][agent_id] = agent
+                agent.restore_checkpoint(agent_checkpoint)
+
+        for market_type, markets in checkpoint['markets'].items():
+            for market_name, (market, market_checkpoint) in markets.items():
+                self.markets[market_type][market_name] = market
+                market.restore_checkpoint(market_checkpoint)
+
+        self.local_market_prices = checkpoint['local_market_prices']
+
+    def get_agent_table(self, table: str) -> pl.DataFrame:
+        """
+        Get the given table of all agents in the region as one table.
+
+        If the region has a store, the tables are stacked by the store (with the column id_agent). Otherwise, the
+        tables of the agents are concatenated.
+
+        Args:
+            table: name of the table (see AgentDB.TABLES).
+
+        Returns:
+            table: the tables of all agents.
+
+        """
+        if self.agent_store is not None:
+            return self.agent_store.stack(table)
+
+        return pl.concat([getattr(agent, table) for agents in self.agents.values() for agent in agents.values()],
+                         how='vertical')
+
     def register_forecasters_for_agents(self, general: dict):
         """
         Add forecaster for each agent in the region.
@@ -60,9 +136,16 @@ class RegionDB:
             for market_name in self.markets[market_type].keys():
                 markets[market_name] = self.markets[market_type][market_name]
 
+        # market targets and forecasts are shared by all forecasters of the region
+        market_forecasts = MarketForecasts()
+
+        # global models of the plants are shared by all forecasters of the region if enabled
+        global_models = GlobalModels() if self.global_forecast_models else None
+
         for agent_type, agents in self.agents.items():
             for agent_id, agentDB in agents.items():
-                forecaster = Forecaster(agentDB=agentDB, marketsDB=markets, general=general)
+                forecaster = Forecaster(agentDB=agentDB, marketsDB=markets, general=general,
+                                        market_forecasts=market_forecasts, global_models=global_models)
                 forecaster.init_forecaster()    # initialize
                 self.agents[agent_type][agent_id].forecaster = forecaster   # register
 
@@ -75,69 +158,99 @@ class RegionDB:
         according to the c.TC_TIMESTAMP. Currently only relevant for local market, because the "real" local market price
         need to be updated after each simulated timestamp.
 
+        If the forecasters are resident in other processes (see remote_forecasters), the prices are only calculated and
+        stored in self.local_market_prices to be applied there.
+
         """
+        self.local_market_prices = self.calculate_local_market_prices()
+
+        if not self.remote_forecasters:
+            self.apply_local_market_prices(agents=self.agents, market_prices=self.local_market_prices)
+
+    def calculate_local_market_prices(self) -> dict:
+        """
+        Calculate the average local market price for each timestep of each market in the region.
+
+        Returns:
+            market_prices: dict with market names as keys and dataframes with the columns c.TC_TIMESTAMP,
+            'new_target_buy' and 'new_target_sell' as values.
+
+        """
+        market_prices = {}
+
         for markets in self.markets.values():
             for market in markets.values():
-                wholesale_market_key = f'{market.market_name}_{c.TT_RETAIL}'  # key of local market for lookup
-
-                # initialize
-                unique_timestep_bids = market.bids_cleared.select(c.TC_TIMESTEP).unique()
-                market_price = pl.concat([market.bids_cleared.select(c.TC_TIMESTEP),
-                                          market.offers_cleared.select(c.TC_TIMESTEP)], how='vertical').unique()
-                market_price = market_price.with_columns(pl.lit(None).alias('new_target_buy'),
-                                                         pl.lit(None).alias('new_target_sell'))
-                market_price = market_price.rename({c.TC_TIMESTEP: c.TC_TIMESTAMP})
-
-                # calculate average price for each timestep
-                for ts in unique_timestep_bids:
-                    for ts_ in ts:
-                        # buy price
-                        bids_for_ts = market.bids_cleared.filter((pl.col(c.TC_TIMESTEP) == ts_) &
-                                                                 (pl.col(c.TC_ID_AGENT_IN) != 'retailer'))
-
-                        if len(bids_for_ts) != 0:
-                            buy_price_for_ts = int(bids_for_ts.select(pl.col(c.TC_PRICE_IN).sum()).item() /
-                                                   bids_for_ts.select(pl.col(c.TC_ENERGY_IN).sum()).item())
-
-                            market_price = market_price.with_columns(pl.when(pl.col(c.TC_TIMESTAMP) == ts_)
-                                                                     .then(buy_price_for_ts)
-                                                                     .otherwise(pl.col('new_target_buy'))
-                                                                     .alias('new_target_buy'))
-
-                        # sell price
-                        offers_for_ts = market.offers_cleared.filter((pl.col(c.TC_TIMESTEP) == ts_) &
-                                                                     (pl.col(c.TC_ID_AGENT_OUT) != 'retailer'))
-
-                        if len(offers_for_ts) != 0:
-                            sell_price_for_ts = int(offers_for_ts.select(pl.col(c.TC_PRICE_OUT).sum()).item() /
-                                                    offers_for_ts.select(pl.col(c.TC_ENERGY_OUT).sum()).item())
-
-                            market_price = market_price.with_columns(pl.when(pl.col(c.TC_TIMESTAMP) == ts_)
-                                                                     .then(sell_price_for_ts)
-                                                                     .otherwise(pl.col('new_target_sell'))
-                                                                     .alias('new_target_sell'))
-
-                for agents in self.agents.values():
-                    for agent in agents.values():
-                        # print(f'updating local market for agent {agent.agent_id}')
-                        old_target = agent.forecaster.train_data[wholesale_market_key][c.K_TARGET]
-
-                        # replace a part of the old target with new target
-                        new_target = old_target.join(market_price, on=c.TC_TIMESTAMP, how='left')
-                        new_target = new_target.with_columns(pl.when(pl.col('new_target_buy').is_null())
-                                                             .then(pl.col(f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_IN}'))
-                                                             .otherwise(pl.col('new_target_buy'))
-                                                             .alias(f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_IN}'))
-                        new_target = new_target.with_columns(pl.when(pl.col('new_target_sell').is_null())
-                                                             .then(pl.col(f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_OUT}'))
-                                                             .otherwise(pl.col('new_target_sell'))
-                                                             .alias(f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_OUT}'))
-
-                        # delete unnecessary column
-                        new_target = new_target.drop('new_target_buy', 'new_target_sell')
-
-                        # update forecaster
+                # all cleared timesteps
+                market_price = (pl.concat([market.bids_cleared.select(c.TC_TIMESTEP),
+                                           market.offers_cleared.select(c.TC_TIMESTEP)], how='vertical')
+                                .unique()
+                                .rename({c.TC_TIMESTEP: c.TC_TIMESTAMP}))
+
+                # volume-weighted buy and sell price of each timestep (without the trades of the retailer)
+                buy_price = (market.bids_cleared.filter(pl.col(c.TC_ID_AGENT_IN) != 'retailer')
+                             .group_by(c.TC_TIMESTEP)
+                             .agg((pl.col(c.TC_PRICE_IN).sum() / pl.col(c.TC_ENERGY_IN).sum())
+                                  .cast(pl.Int32).alias('new_target_buy')))
+                sell_price = (market.offers_cleared.filter(pl.col(c.TC_ID_AGENT_OUT) != 'retailer')
+                              .group_by(c.TC_TIMESTEP)
+                              .agg((pl.col(c.TC_PRICE_OUT).sum() / pl.col(c.TC_ENERGY_OUT).sum())
+                                   .cast(pl.Int32).alias('new_target_sell')))
+
+                # Note: Prices are only calculated for the timesteps with cleared bids (same for the sell price)
+                sell_price = sell_price.join(market.bids_cleared.select(c.TC_TIMESTEP).unique(), on=c.TC_TIMESTEP,
+                                             how='semi')
+
+                market_price = (market_price
+                                .join(buy_price.rename({c.TC_TIMESTEP: c.TC_TIMESTAMP}), on=c.TC_TIMESTAMP, how='left')
+                                .join(sell_price.rename({c.TC_TIMESTEP: c.TC_TIMESTAMP}), on=c.TC_TIMESTAMP,
+                                      how='left'))
+
+                market_prices[market.market_name] = market_price
+
+        return market_prices
+
+    @staticmethod
+    def apply_local_market_prices(agents: dict, market_prices: dict):
+        """
+        Replace the local market prices in the forecaster train data of the given agents.
+
+        Agents that share the same target (see MarketForecasts) also share the new target so that it is only calculated
+        once.
+
+        Args:
+            agents: dict of AgentDB objects in the format {agent_type: {agent_id: AgentDB}}.
+            market_prices: dict of local market prices as returned by calculate_local_market_prices().
+
+        """
+        for market_name, market_price in market_prices.items():
+            wholesale_market_key = f'{market_name}_{c.TT_RETAIL}'  # key of local market for lookup
+            new_targets = {}    # new targets of the old targets in the format {id(old target): (old target, new)}
+
+            for agents_of_type in agents.values():
+                for agent in agents_of_type.values():
+                    # print(f'updating local market for agent {agent.agent_id}')
+                    old_target = agent.forecaster.train_data[wholesale_market_key][c.K_TARGET]
+
+                    # reuse the new target if the old target is shared with an agent that was already updated
+                    cached_target, new_target = new_targets.get(id(old_target), (None, None))
+                    if cached_target is old_target:
                         agent.forecaster.update_forecaster(id=wholesale_market_key, dataframe=new_target, target=True)
+                        continue
+
+                    # replace a part of the old target with new target
+                    new_target = old_target.join(market_price, on=c.TC_TIMESTAMP, how='left')
+                    new_target = new_target.with_columns(
+                        pl.coalesce('new_target_buy', f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_IN}')
+                        .alias(f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_IN}'),
+                        pl.coalesce('new_target_sell', f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_OUT}')
+                        .alias(f'{c.TC_ENERGY}_{c.TC_PRICE}_{c.PF_OUT}'))
+
+                    # delete unnecessary column
+                    new_target = f.set_sorted_time_index(new_target.drop('new_target_buy', 'new_target_sell'))
+                    new_targets[id(old_target)] = (old_target, new_target)
+
+                    # update forecaster
+                    agent.forecaster.update_forecaster(id=wholesale_market_key, dataframe=new_target, target=True)
 
     def __register_all_agents(self):
         """
@@ -148,6 +261,10 @@ class RegionDB:
         second level keys agent ids.
 
         """
+        # Load the tables of all agents at once if they were saved together
+        if self.agent_store is not None:
+            self.agent_store.load(os.path.join(self.region_path, 'agents'))
+
         agents_types = f.get_all_subdirectories(os.path.join(self.region_path, 'agents'))
         for agents_type in agents_types:
             # register agents for each type
@@ -159,9 +276,10 @@ class RegionDB:
                     self.agents[agents_type][agent] = AgentDB(
                         path=os.path.join(self.region_path, 'agents', agents_type, agent),
                         agent_type=agents_type,
-                        agent_id=agent)
+                        agent_id=agent,
+                        store=self.agent_store)
                     if sub_agents is None:
-                        self.agents[agents_type][agent].register_agent()
+                        self.agents[agents_type][agent].register_agent(lazy=self.lazy_agents)
                     else:
                         for sub_agent in sub_agents:
                             self.agents[agents_type][agent].register_sub_agent(id=sub_agent,
@@ -199,13 +317,17 @@ class RegionDB:
 
         """
 
+        # Save the tables of all agents together if the region has a store
+        if self.agent_store is not None:
+            self.agent_store.save(os.path.join(self.region_save, 'agents'))
+
         for agents_type, agents in self.agents.items():
             for agent_id, agentDB in agents.items():
                 # Path to save results to
                 path = os.path.join(self.region_save, 'agents', agents_type, agent_id)
 
                 # Save agent data
-                agentDB.save_agent(path)
+                agentDB.save_agent(path, save_tables=self.agent_store is None, sink=self.result_sink)
                 # TODO: Add subagent functionality
 
     def __save_all_markets(self):
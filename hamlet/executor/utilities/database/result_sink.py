@@ -0,0 +1,148 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import io
+import os
+import pickle
+import struct
+
+import polars as pl
+
+from hamlet import functions as f
+
+
+class ResultSink:
+    """
+    Append-only writer of the agent tables.
+
+    The first time a table is written, the whole table is saved as file. Afterward, only the rows that changed since
+    the last write are appended as segment to a log file next to it ({table}.ft.log). Each segment is an Arrow IPC
+    stream with the row index of the changed rows, prefixed by its length. Reading the table replays the segments on
+    top of the file. The log is compacted into the file if it gets too long, if most rows changed or if the columns
+    changed, and at the end of the simulation.
+
+    Attributes:
+        saved (dict): last written state of each file in the format {path: pl.DataFrame}
+        segments (dict): number of segments in the log of each file in the format {path: int}
+        pickles (dict): objects of the last written pickle of each file in the format {path: tuple}
+    """
+    # Suffix of the log file
+    LOG_SUFFIX = '.log'
+    # Column with the row index of the changed rows in the segments
+    ROW = '__row'
+    # Maximum number of segments before the log is compacted
+    MAX_SEGMENTS = 64
+    # Share of changed rows above which the table is rewritten instead of appended
+    MAX_CHANGED_SHARE = 0.5
+    # Format of the length prefix of each segment
+    LENGTH = struct.Struct('<Q')
+
+    def __init__(self):
+        self.saved = {}
+        self.segments = {}
+        self.pickles = {}
+
+    def write(self, path: str, data: pl.DataFrame):
+        """Writes the table to the file (only the changed rows are appended if the file was written before)"""
+        old = self.saved.get(path)
+        if old is data:
+            return
+
+        segment = self.__get_changed_rows(old, data) if os.path.exists(path) else None
+        if (segment is None or self.segments.get(path, 0) >= self.MAX_SEGMENTS
+                or segment.height > self.MAX_CHANGED_SHARE * data.height):
+            self.__write_file(path, data)
+        elif segment.height:
+            self.__append_segment(path, segment)
+
+        self.saved[path] = data
+
+    def dump(self, path: str, obj, refs: tuple):
+        """Pickles the object to the file unless the objects in refs are the same as at the last dump"""
+        old = self.pickles.get(path)
+        if old is not None and len(old) == len(refs) and all(a is b for a, b in zip(old, refs)):
+            return
+
+        with open(path, 'wb') as handle:
+            pickle.dump(obj, handle)
+        self.pickles[path] = refs
+
+    def compact(self):
+        """Writes the last state of all tables with a log to their files and removes the logs"""
+        for path, num_segments in list(self.segments.items()):
+            if num_segments:
+                self.__write_file(path, self.saved[path])
+
+    def forget(self, path: str):
+        """Forgets the file (e.g. because it was removed)"""
+        self.saved.pop(path, None)
+        self.segments.pop(path, None)
+
+    @classmethod
+    def read(cls, path: str) -> pl.DataFrame:
+        """Reads the table from the file and replays the segments of its log"""
+        data = f.load_file(path=path, df='polars', method='eager')
+
+        segments = cls.read_segments(path + cls.LOG_SUFFIX)
+        if not segments:
+            return data
+
+        return (pl.concat([data.with_row_index(cls.ROW)] + segments, how='vertical_relaxed')
+                .unique(subset=cls.ROW, keep='last')
+                .sort(cls.ROW)
+                .drop(cls.ROW))
+
+    @classmethod
+    def read_segments(cls, path: str) -> list[pl.DataFrame]:
+        """Reads all complete segments of the log (an incomplete segment at the end is ignored)"""
+        if not os.path.exists(path):
+            return []
+
+        with open(path, 'rb') as handle:
+            buffer = handle.read()
+
+        segments = []
+        position = 0
+        while position + cls.LENGTH.size <= len(buffer):
+            (length,) = cls.LENGTH.unpack_from(buffer, position)
+            position += cls.LENGTH.size
+            if position + length > len(buffer):
+                break
+            segments.append(pl.read_ipc_stream(io.BytesIO(buffer[position:position + length])))
+            position += length
+
+        return segments
+
+    def __get_changed_rows(self, old: pl.DataFrame | None, data: pl.DataFrame) -> pl.DataFrame | None:
+        """Gets the rows that changed compared to the last written state with their row index (None if the table
+        needs to be rewritten)"""
+        # Rows can only be appended or updated if the columns are the same and no rows were removed
+        if old is None or old.schema != data.schema or data.height < old.height:
+            return None
+
+        head = data.slice(0, old.height)
+        changed = pl.DataFrame([head[col].ne_missing(old[col]) for col in data.columns])
+        mask = changed.select(pl.any_horizontal(pl.all())).to_series()
+        # Appended rows are always written
+        mask = mask.extend_constant(True, data.height - old.height)
+
+        return data.with_row_index(self.ROW).filter(mask)
+
+    def __write_file(self, path: str, data: pl.DataFrame):
+        """Writes the whole table to the file and removes its log"""
+        f.save_file(path=path, data=data, df='polars')
+        if os.path.exists(path + self.LOG_SUFFIX):
+            os.remove(path + self.LOG_SUFFIX)
+        self.segments[path] = 0
+
+    def __append_segment(self, path: str, segment: pl.DataFrame):
+        """Appends the segment to the log of the file"""
+        buffer = io.BytesIO()
+        segment.write_ipc_stream(buffer)
+        with open(path + self.LOG_SUFFIX, 'ab') as handle:
+            handle.write(self.LENGTH.pack(buffer.getbuffer().nbytes))
+            handle.write(buffer.getbuffer())
+        self.segments[path] = self.segments.get(path, 0) + 1
@@ -0,0 +1,148 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import polars as pl
+
+
+class ForecastMetrics:
+    """
+    Cost and accuracy of the forecasts of one forecaster.
+
+    For each plant and market, the number and wall time of the fits and forecasts, the number of forecasted rows and
+    the error of the forecasts against the perfect data (target) are recorded. The error is given as MAE and RMSE over
+    all forecasts and as exponentially weighted moving MAE and RMSE over the recent forecasts. The metrics are saved
+    as table next to the agent tables (forecast_metrics.ft).
+
+    The counters and timers are always recorded. The error is only recorded if the actual values are given with the
+    forecast (see the forecast option accuracy_metrics), since comparing each forecast costs an extra slice of the
+    target and a table operation per plant and timestamp. Without errors, the MAE and RMSE are empty.
+
+    Note: Fits and forecasts of models that are shared with other forecasters (e.g. MarketForecasts, ModelCache) are
+    only timed for the forecaster that computes them, the other forecasters record the time of the lookup.
+
+    Attributes:
+        entries: metrics in the format {id: {column: value}}.
+
+    """
+    # File of the metrics in the agent folder
+    FILE = 'forecast_metrics.ft'
+    # Weight of the latest forecast in the moving error
+    ALPHA = 0.05
+    # Columns of the metrics table
+    SCHEMA = {
+        'id': pl.Utf8,
+        'model': pl.Utf8,
+        'fits': pl.Int64,
+        'fit_time': pl.Float64,         # unit: s
+        'forecasts': pl.Int64,
+        'forecast_time': pl.Float64,    # unit: s
+        'rows': pl.Int64,
+        'errors': pl.Int64,             # number of compared values
+        'abs_error': pl.Float64,        # sum of the absolute errors
+        'squared_error': pl.Float64,    # sum of the squared errors
+        'moving_abs_error': pl.Float64,
+        'moving_squared_error': pl.Float64,
+    }
+
+    def __init__(self):
+        self.entries = {}
+
+    def record_fit(self, id: str, model: str, seconds: float):
+        """Record a fit of the model of the given id"""
+        entry = self.__get_entry(id, model)
+        entry['fits'] += 1
+        entry['fit_time'] += seconds
+
+    def record_forecast(self, id: str, model: str, seconds: float, forecast: pl.DataFrame,
+                        actual: pl.DataFrame = None):
+        """
+        Record a forecast of the given id and its error against the actual values (if given).
+
+        Args:
+            id: Identifier for the plant or market.
+            model: keyword of the model.
+            seconds: wall time of the forecast (including fits that were needed for it).
+            forecast: forecast without time columns.
+            actual: actual values of the forecasted period (compared by position and column name, optional).
+
+        """
+        entry = self.__get_entry(id, model)
+        entry['forecasts'] += 1
+        entry['forecast_time'] += seconds
+        entry['rows'] += forecast.height
+
+        if actual is None:
+            return
+
+        # compare the numeric columns that are in both the forecast and the actual values
+        length = min(forecast.height, actual.height)
+        columns = [col for col in forecast.columns
+                   if col in actual.columns and forecast[col].dtype.is_numeric() and actual[col].dtype.is_numeric()]
+        if not length or not columns:
+            return
+
+        errors = pl.DataFrame({col: (forecast[col].slice(0, length).cast(pl.Float64)
+                                     - actual[col].slice(0, length).cast(pl.Float64)) for col in columns})
+        count, abs_error, squared_error = errors.select(
+            pl.sum_horizontal(pl.all().is_not_null().sum()).alias('count'),
+            pl.sum_horizontal(pl.all().abs().sum()).alias('abs'),
+            pl.sum_horizontal(pl.all().pow(2).sum()).alias('squared'),
+        ).row(0)
+        if not count:
+            return
+
+        # moving error of the recent forecasts (the first compared forecast initializes it)
+        alpha = self.ALPHA if entry['errors'] else 1
+        entry['moving_abs_error'] += alpha * (abs_error / count - entry['moving_abs_error'])
+        entry['moving_squared_error'] += alpha * (squared_error / count - entry['moving_squared_error'])
+
+        entry['errors'] += count
+        entry['abs_error'] += abs_error
+        entry['squared_error'] += squared_error
+
+    def to_frame(self) -> pl.DataFrame:
+        """Get the metrics as table with the MAE and RMSE over all and the recent forecasts"""
+        data = pl.DataFrame(list(self.entries.values()), schema=self.SCHEMA)
+        compared = pl.col('errors') > 0
+        return data.with_columns(
+            pl.when(compared).then(pl.col('abs_error') / pl.col('errors')).alias('mae'),
+            pl.when(compared).then((pl.col('squared_error') / pl.col('errors')).sqrt()).alias('rmse'),
+            pl.when(compared).then(pl.col('moving_abs_error')).alias('moving_mae'),
+            pl.when(compared).then(pl.col('moving_squared_error').sqrt()).alias('moving_rmse'),
+        )
+
+    def snapshot(self) -> dict:
+        """Get a copy of the metrics that can be restored with restore() (the entries are changed in place)"""
+        return {id: entry.copy() for id, entry in self.entries.items()}
+
+    def restore(self, snapshot: dict):
+        """Restore the metrics from the given snapshot"""
+        self.entries = {id: entry.copy() for id, entry in snapshot.items()}
+
+    def get_changes(self, snapshot: dict) -> dict:
+        """Get the entries that changed since the given snapshot was taken in the format {id: entry}"""
+        return {id: entry.copy() for id, entry in self.entries.items() if snapshot.get(id) != entry}
+
+    def update(self, entries: dict):
+        """Update the metrics with the given entries (e.g. the changes of a worker process)"""
+        self.entries.update({id: entry.copy() for id, entry in entries.items()})
+
+    @classmethod
+    def from_frame(cls, data: pl.DataFrame) -> 'ForecastMetrics':
+        """Restore the metrics from a table created by to_frame()"""
+        metrics = cls()
+        for row in data.select(list(cls.SCHEMA)).iter_rows(named=True):
+            metrics.entries[row['id']] = row
+        return metrics
+
+    def __get_entry(self, id: str, model: str) -> dict:
+        """Get the metrics of the given id (restarted if the model changed)"""
+        entry = self.entries.get(id)
+        if entry is None or entry['model'] != model:
+            entry = {col: (0 if dtype == pl.Int64 else 0.0) for col, dtype in self.SCHEMA.items()}
+            entry.update({'id': id, 'model': model})
+            self.entries[id] = entry
+        return entry
@@ -6,11 +6,17 @@ __email__ = "jiahe.chu@tum.de"
 
 import polars as pl
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta
 import inspect
 import ast
+import time
 from hamlet import constants as c
 import hamlet.executor.utilities.forecasts.models as models
+from hamlet.executor.utilities.forecasts.forecast_metrics import ForecastMetrics
+from hamlet.executor.utilities.forecasts.global_models import GlobalModels
+from hamlet.executor.utilities.forecasts.market_forecasts import MarketForecasts
+from hamlet.executor.utilities.forecasts.model_cache import ModelCache, MODEL_CACHE
+from hamlet.executor.utilities.forecasts.refit_scheduler import REFIT_SCHEDULER, RefitScheduler
 import hamlet.functions as f
 from pprint import pprint
 
@@ -28,16 +34,27 @@ class Forecaster:
         train_data: data to feed into models
         all_models: all available forecast models
         used_models: chosen models for forecasting
+        shared_models: models shared with other forecasters with the same train data (see ModelCache)
         weather: weather dataframe
         length_to_predict: length to predict everytime when calling forecast. Unit: s
         start_ts: timestamp when simulation starts
         refit_period: period, after which models should be refitted. Unit: s
+        refit_lead: time before the refit at which the next model version is fitted in the background. Unit: s
+        max_staleness: time after the refit during which the old model version is used until the new one is fitted.
+        Unit: s
+        refit_threads: number of threads of the process that fit the models in the background (see RefitScheduler).
+        market_forecasts: market targets and forecasts shared by all forecasters of the region (None if not shared)
+        global_models: global models of the plants of the region (None if each plant has its own model)
+        global_model_keys: keys of the global models of the plants that use one in the format {id: key}
+        accuracy_metrics: whether the error of each forecast against the perfect data is recorded in the metrics.
+        metrics: cost and accuracy of the fits and forecasts of each plant and market (see ForecastMetrics)
 
     Methods:
 
     """
 
-    def __init__(self, agentDB, marketsDB: dict, general: dict):
+    def __init__(self, agentDB, marketsDB: dict, general: dict, market_forecasts: MarketForecasts = None,
+                 global_models: GlobalModels = None):
         """
         Initialize the Forecaster object.
 
@@ -45,21 +62,32 @@ class Forecaster:
             agentDB: AgentDB object.
             marketsDB: Dictionary containing all MarketDB objects in the region where the agent is.
             general: General data dictionary.
+            market_forecasts: MarketForecasts object shared by all forecasters of the region (optional).
+            global_models: GlobalModels object shared by all forecasters of the region (optional).
 
         """
         self.agentDB = agentDB  # AgentDB object
         self.marketsDB = marketsDB  # MarketDB object
         self.general = general  # general data
+        self.market_forecasts = market_forecasts    # market targets and forecasts shared within the region
+        self.global_models = global_models  # global models of the plants shared within the region
 
         # empty variables, to be initialized
         self.config_dict = {}   # dictionary contains forecast config
         self.train_data = {}    # data to feed into models
         self.all_models = {}    # all available forecast models
         self.used_models = {}   # chosen models for forecasting
+        self.shared_models = {}     # models shared with other forecasters in the format {id: (key, column mapping)}
+        self.global_model_keys = {}     # keys of the global models in the format {id: key}
         self.weather = pl.LazyFrame()   # weather dataframe
         self.length_to_predict = 0  # length to predict everytime when calling forecast
         self.start_ts = datetime.now(tz=pytz.utc)   # timestamp when simulation starts
         self.refit_period = 0   # period, after which models should be refitted
+        self.refit_lead = 0     # time before the refit at which the next model version is fitted in the background
+        self.max_staleness = 0  # time after the refit during which the old model version can still be used
+        self.refit_threads = RefitScheduler.MAX_WORKERS  # threads of the process that fit models in the background
+        self.accuracy_metrics = False   # if True, the error of each forecast is recorded in the metrics
+        self.metrics = ForecastMetrics()    # cost and accuracy of the fits and forecasts
 
     ########################################## PUBLIC METHODS ##########################################
 
@@ -90,11 +118,27 @@ class Forecaster:
             target: Boolean indicating if the updated data is a target variable.
 
         """
-        # new train data with new target
+        # new train data with new target (flagged as sorted for slicing by binary search)
         if target:
-            self.train_data[id][c.K_TARGET] = dataframe
+            self.train_data[id][c.K_TARGET] = f.set_sorted_time_index(dataframe)
         else:
-            self.train_data[id][c.K_FEATURES] = dataframe
+            self.train_data[id][c.K_FEATURES] = f.set_sorted_time_index(dataframe)
+
+        # the global model is fitted again with the new train data
+        if id in self.global_model_keys:
+            self.global_models.register(self.global_model_keys[id], (self.agentDB.agent_id, id), self.train_data[id])
+            return
+
+        # shared models are not updated since the other forecasters still use the old train data
+        if id in self.shared_models:
+            del self.shared_models[id]
+            chosen_model = self.config_dict[id]['method']
+            self.used_models[id] = self.all_models[chosen_model](self.train_data[id],
+                                                                 **self.config_dict[id][chosen_model])
+            return
+
+        # fits of the next model version with the old train data are not needed anymore
+        REFIT_SCHEDULER.cancel(self.__get_refit_key(id))
 
         # update model
         self.used_models[id].update_train_data(self.train_data[id])
@@ -116,8 +160,7 @@ class Forecaster:
 
         # make forecast for each plant and assign results to the empty dict
         for id in self.config_dict.keys():
-            forecast = self.__make_forecast_for_id(current_ts, id)
-            forecasts[id] = forecast
+            forecasts[id] = self.__get_forecast_for_id(current_ts, id)
 
         # summarize all forecasts to a dataframe (lazyframe)
         forecasts = self.__summarize_forecasts_to_df(forecasts, current_ts)
@@ -148,6 +191,15 @@ class Forecaster:
         # get refit period
         self.refit_period = self.agentDB.account['ems']['fcasts']['retraining']
 
+        # get background refit settings (0: models are refitted synchronously at the refit timestamp)
+        self.refit_lead = self.agentDB.account['ems']['fcasts'].get('retraining_lead', 0)
+        self.max_staleness = self.agentDB.account['ems']['fcasts'].get('retraining_staleness', 0)
+        self.refit_threads = self.agentDB.account['ems']['fcasts'].get('retraining_threads',
+                                                                        RefitScheduler.MAX_WORKERS)
+
+        # get if the error of each forecast is recorded in the metrics (the counters and timers are always recorded)
+        self.accuracy_metrics = self.agentDB.account['ems']['fcasts'].get('accuracy_metrics', False)
+
     def __assign_config_dict(self):
         """
         Summarize all forecast config into one dictionary.
@@ -209,6 +261,18 @@ class Forecaster:
         # assign and initialize the chosen models
         for id in self.config_dict.keys():
             chosen_model = self.config_dict[id]['method']  # keyword of the chosen model as string
+
+            # plants use the global model of their type if enabled
+            if (self.global_models is not None and chosen_model in GlobalModels.SUPPORTED_MODELS
+                    and id.rsplit('_', 1)[0] not in self.marketsDB):
+                self.__assign_global_model(id, chosen_model)
+                continue
+
+            # plants with the same train data share the model with other forecasters (markets are shared already)
+            if chosen_model in ModelCache.SHARED_MODELS and id.rsplit('_', 1)[0] not in self.marketsDB:
+                self.__assign_shared_model(id, chosen_model)
+                continue
+
             # check if there's extra keyword arguments for model initialization
             self.used_models[id] = self.all_models[chosen_model](self.train_data[id],
                                                                  **self.config_dict[id][chosen_model])
@@ -221,6 +285,42 @@ class Forecaster:
                 self.train_data[id]['general_config'] = self.general['general']
                 self.train_data[id][c.K_FEATURES] = self.weather
 
+    def __assign_shared_model(self, id, chosen_model):
+        """
+        Assign the model of the plant from the model cache (see ModelCache).
+
+        The model is only created if no other forecaster created it for the same train data and config. Its
+        predictions are named after the columns of the forecaster that created it and thus renamed to the own columns.
+
+        Args:
+            id: Identifier for the plant.
+            chosen_model: keyword of the chosen model.
+
+        """
+        target = self.train_data[id][c.K_TARGET]
+        key = ModelCache.get_key(chosen_model, self.config_dict[id][chosen_model], target,
+                                 self.train_data[id].get(c.K_FEATURES, pl.DataFrame()),
+                                 self.length_to_predict, self.refit_period, self.start_ts)
+
+        self.used_models[id], columns = MODEL_CACHE.get_model(
+            key, target, create=lambda: self.all_models[chosen_model](self.train_data[id],
+                                                                      **self.config_dict[id][chosen_model]))
+        self.shared_models[id] = (key, dict(zip(columns, target.columns)))
+
+    def __assign_global_model(self, id, chosen_model):
+        """
+        Register the plant for the global model of its type (see GlobalModels). No model is created for the plant.
+
+        Args:
+            id: Identifier for the plant.
+            chosen_model: keyword of the chosen model.
+
+        """
+        key = (self.config_dict[id]['type'], chosen_model, repr(self.config_dict[id][chosen_model]),
+               self.length_to_predict, self.refit_period, self.start_ts)
+        self.global_models.register(key, (self.agentDB.agent_id, id), self.train_data[id])
+        self.global_model_keys[id] = key
+
     def __prepare_train_data(self):
         """
         Prepare train data according to the given features.
@@ -245,37 +345,60 @@ class Forecaster:
 
         """
         for market_name, marketDB in self.marketsDB.items():  # assign market config dict for each market
-            # get retailer data
-            target_wholesale = marketDB.retailer
-
-            # pre-processing for retailer data
-            # calculate market data resolution
-            resolution = f.calculate_time_resolution(target_wholesale)
-
             # add offset day(s) before simulation with the same data
             offset = self.config_dict[f'{market_name}_{c.TT_RETAIL}']['naive']['offset']    # here method is hard-coded
 
-            day_before = f.slice_dataframe_between_times(target_df=target_wholesale, reference_ts=self.start_ts,
-                                                         duration=c.DAYS_TO_SECONDS * offset + resolution)
-
-            day_before = day_before.with_columns((pl.col(c.TC_TIMESTAMP) - pl.duration(days=offset, seconds=resolution))
-                                                 .alias(c.TC_TIMESTAMP)
-                                                 .cast(pl.Datetime(time_unit='ns', time_zone='UTC')))
-
-            target_wholesale = pl.concat([day_before, target_wholesale], how='vertical')
-
-            # drop unnecessary columns
-            # TODO: update column name in constants
-            target_wholesale = target_wholesale.drop('index', c.TC_MARKET, c.TC_NAME, c.TC_REGION, 'retailer')
+            # the targets are the same for all agents with the same offset and are thus only prepared once if shared
+            if self.market_forecasts is not None:
+                target_wholesale, target_local = self.market_forecasts.get_targets(
+                    key=(market_name, offset, self.start_ts),
+                    prepare=lambda: self.__prepare_market_targets(marketDB, offset))
+            else:
+                target_wholesale, target_local = self.__prepare_market_targets(marketDB, offset)
 
             # initial prepare for the wholesale market
             self.train_data[f'{market_name}_{c.TT_RETAIL}'] = {c.K_TARGET: target_wholesale}
 
             # initial prepare for the local market
-            target_local = target_wholesale.select(c.TC_TIMESTAMP, f'{c.MCT_ENERGY}_{c.TC_PRICE}_{c.PF_IN}')\
-                                           .rename({f'{c.MCT_ENERGY}_{c.TC_PRICE}_{c.PF_IN}': 'energy_price_local'})
             self.train_data[f'{market_name}_{c.TT_MARKET}'] = {c.K_TARGET: target_local}
 
+    def __prepare_market_targets(self, marketDB, offset: int) -> tuple[pl.DataFrame, pl.DataFrame]:
+        """
+        Prepare the wholesale and local target of the given market.
+
+        Args:
+            marketDB: MarketDB object.
+            offset: days that are added before the simulation start with the same data.
+
+        Returns:
+            targets: tuple of wholesale and local target.
+
+        """
+        # get retailer data
+        target_wholesale = marketDB.retailer
+
+        # pre-processing for retailer data
+        # calculate market data resolution
+        resolution = f.calculate_time_resolution(target_wholesale)
+
+        day_before = f.slice_dataframe_between_times(target_df=target_wholesale, reference_ts=self.start_ts,
+                                                     duration=c.DAYS_TO_SECONDS * offset + resolution)
+
+        day_before = day_before.with_columns((pl.col(c.TC_TIMESTAMP) - pl.duration(days=offset, seconds=resolution))
+                                             .alias(c.TC_TIMESTAMP)
+                                             .cast(pl.Datetime(time_unit='ns', time_zone='UTC')))
+
+        target_wholesale = f.set_sorted_time_index(pl.concat([day_before, target_wholesale], how='vertical'))
+
+        # drop unnecessary columns
+        # TODO: update column name in constants
+        target_wholesale = target_wholesale.drop('index', c.TC_MARKET, c.TC_NAME, c.TC_REGION, 'retailer')
+
+        target_local = target_wholesale.select(c.TC_TIMESTAMP, f'{c.MCT_ENERGY}_{c.TC_PRICE}_{c.PF_IN}')\
+                                       .rename({f'{c.MCT_ENERGY}_{c.TC_PRICE}_{c.PF_IN}': 'energy_price_local'})
+
+        return target_wholesale, target_local
+
     def __prepare_plants_target_data(self):
         """
         Prepare target data for plants.
@@ -283,8 +406,8 @@ class Forecaster:
         Go through the timeseries and take each column as target data for corresponding plant.
 
         """
-        # get plants' timeseries
-        plants_timeseries = self.agentDB.timeseries
+        # get plants' timeseries (flagged as sorted for slicing by binary search)
+        plants_timeseries = f.set_sorted_time_index(self.agentDB.timeseries)
 
         # get all related plants except timestamps
         plants_cols = plants_timeseries.columns
@@ -339,6 +462,69 @@ class Forecaster:
 
     """relevant for data processing"""
 
+    def __get_forecast_for_id(self, current_ts, id):
+        """
+        Get the forecast for the plant or market with given id with the data types of its target.
+
+        The forecasts of markets are computed only once per timestamp for all forecasters of the region if the model
+        does not have any state of its own (see MarketForecasts).
+
+        Args:
+            current_ts: Current timestamp for the forecast.
+            id: Identifier for the plant or market.
+
+        Returns:
+            forecast: Dataframe containing the forecast result for the given plant or market without time columns.
+
+        """
+        chosen_model = self.config_dict[id]['method']  # keyword of the chosen model as string
+        start = time.perf_counter()
+
+        if (self.market_forecasts is None or id.rsplit('_', 1)[0] not in self.marketsDB
+                or chosen_model not in MarketForecasts.SHARED_MODELS):
+            forecast = self.__format_forecast(id, self.__make_forecast_for_id(current_ts, id))
+        else:
+            forecast = self.market_forecasts.get_forecast(
+                key=(id, chosen_model, repr(self.config_dict[id][chosen_model]), self.length_to_predict),
+                target=self.train_data[id][c.K_TARGET], current_ts=current_ts,
+                predict=lambda: self.__format_forecast(id, self.__make_forecast_for_id(current_ts, id)))
+
+        # record cost (and accuracy against the perfect data of the forecasted period if enabled)
+        actual = None
+        if self.accuracy_metrics:
+            actual = f.slice_dataframe_between_times(target_df=self.train_data[id][c.K_TARGET],
+                                                     reference_ts=current_ts, duration=self.length_to_predict)
+        self.metrics.record_forecast(id, chosen_model, time.perf_counter() - start, forecast, actual)
+
+        return forecast
+
+    def __format_forecast(self, id, forecast: pl.DataFrame) -> pl.DataFrame:
+        """
+        Remove the time column(s) of the forecast and cast it to the data types of the target.
+
+        Args:
+            id: Identifier for the plant or market.
+            forecast: Forecast result of the model.
+
+        Returns:
+            forecast: Formatted forecast.
+
+        """
+        # remove time column(s) for all forecasts
+        if c.TC_TIMESTAMP in forecast.columns:
+            forecast = forecast.drop(c.TC_TIMESTAMP)
+        if c.TC_TIMESTEP in forecast.columns:
+            forecast = forecast.drop(c.TC_TIMESTEP)
+
+        # change data type of each forecast, should be the same as the target data
+        for column in forecast.columns:
+            dtype = self.train_data[id][c.K_TARGET].select(column).dtypes
+
+            # each column should only have one data type
+            forecast = forecast.with_columns(pl.col(column).cast(dtype[0]))
+
+        return forecast
+
     def __make_forecast_for_id(self, current_ts, id):
         """
         Make forecast for the plant with given id. Re-fit model before forecasting if needed.
@@ -353,18 +539,158 @@ class Forecaster:
         """
         chosen_model = self.config_dict[id]['method']  # keyword of the chosen model as string
 
+        # global models are fitted and predict for all plants of their type at once
+        if id in self.global_model_keys:
+            return self.__make_global_forecast_for_id(current_ts, id, chosen_model)
+
+        # shared models are fitted and predict only once per timestamp for all forecasters
+        if id in self.shared_models:
+            return self.__make_shared_forecast_for_id(current_ts, id, chosen_model)
+
         # refit model if needed
-        offset = (current_ts - self.start_ts).seconds  # offset between current ts and start ts
-        # check offset % refit period to see if the current time is exactly the beginning of a new refitting period
-        if offset % self.refit_period == 0:
-            self.used_models[id].fit(current_ts=current_ts, length_to_predict=self.length_to_predict,
-                                     **self.config_dict[id][chosen_model])
+        self.__refit_model(current_ts, id, chosen_model)
 
         forecast = self.used_models[id].predict(current_ts=current_ts, length_to_predict=self.length_to_predict,
                                                 **self.config_dict[id][chosen_model])  # predict
 
         return forecast
 
+    def __make_shared_forecast_for_id(self, current_ts, id, chosen_model):
+        """
+        Make forecast for the plant with given id with the shared model. Re-fit model before forecasting if needed.
+
+        Args:
+            current_ts: Current timestamp for the forecast.
+            id: Identifier for the plant.
+            chosen_model: keyword of the chosen model.
+
+        Returns:
+            forecast: Dataframe containing the forecast result for the given plant with its own column names.
+
+        """
+        key, columns = self.shared_models[id]
+
+        # refit model if needed
+        self.__refit_model(current_ts, id, chosen_model)
+        model = self.used_models[id]
+
+        forecast = MODEL_CACHE.get_forecast(key, current_ts, predict=lambda: model.predict(
+            current_ts=current_ts, length_to_predict=self.length_to_predict, **self.config_dict[id][chosen_model]))
+
+        return forecast.rename({column: own for column, own in columns.items()
+                                if column in forecast.columns and column != own})
+
+    def __make_global_forecast_for_id(self, current_ts, id, chosen_model):
+        """
+        Make forecast for the plant with given id with the global model of its type. Re-fit model before forecasting if
+        needed.
+
+        Args:
+            current_ts: Current timestamp for the forecast.
+            id: Identifier for the plant.
+            chosen_model: keyword of the chosen model.
+
+        Returns:
+            forecast: Dataframe containing the forecast result for the given plant.
+
+        """
+        config = self.config_dict[id][chosen_model]
+        offset = (current_ts - self.start_ts).seconds  # offset between current ts and start ts
+
+        return self.global_models.get_forecast(self.global_model_keys[id], (self.agentDB.agent_id, id), current_ts,
+                                               refit=offset % self.refit_period == 0,
+                                               create=lambda train_data: self.all_models[chosen_model](train_data,
+                                                                                                       **config),
+                                               config=config, length_to_predict=self.length_to_predict)
+
+    def __refit_model(self, current_ts, id, chosen_model):
+        """
+        Refit the model of the given id if needed.
+
+        The model is refitted at the beginning of each refitting period. If a refit lead is given, the next model
+        version is fitted in the background (see RefitScheduler) and replaces the current model once it is collected.
+        The model is only refitted synchronously if no new version was scheduled (e.g. at the first timestamp).
+
+        Args:
+            current_ts: Current timestamp for the forecast.
+            id: Identifier for the plant or market.
+            chosen_model: keyword of the chosen model.
+
+        """
+        model = self.used_models[id]
+        config = self.config_dict[id][chosen_model]
+
+        # models without fit (e.g. statistical models) do not need to be refitted
+        if type(model).fit is models.ModelBase.fit:
+            return
+
+        key = self.__get_refit_key(id)
+        offset = (current_ts - self.start_ts).seconds  # offset between current ts and start ts
+        refit_ts = REFIT_SCHEDULER.get_refit_ts(key)
+
+        if refit_ts is not None and refit_ts <= current_ts:
+            # swap in the new version if it is fitted (wait for it if the current version is too old)
+            wait = (current_ts - refit_ts).total_seconds() >= self.max_staleness
+            result = REFIT_SCHEDULER.collect(key, wait=wait)
+            if result is not None:
+                # the fit is recorded here as the metrics must not be changed by the background thread
+                new_model, seconds = result
+                self.metrics.record_fit(id, chosen_model, seconds)
+                self.used_models[id] = new_model
+                if id in self.shared_models:
+                    MODEL_CACHE.replace(key, new_model, fitted_at=refit_ts)
+        # check offset % refit period to see if the current time is exactly the beginning of a new refitting period
+        elif refit_ts is None and offset % self.refit_period == 0:
+            start = time.perf_counter()
+            if id in self.shared_models:
+                MODEL_CACHE.fit(key, current_ts, fit=lambda: model.fit(current_ts=current_ts,
+                                                                         length_to_predict=self.length_to_predict,
+                                                                         **config))
+            else:
+                model.fit(current_ts=current_ts, length_to_predict=self.length_to_predict, **config)
+            self.metrics.record_fit(id, chosen_model, time.perf_counter() - start)
+
+        # the shared model may have been replaced by another forecaster
+        if id in self.shared_models and MODEL_CACHE.peek(key) is not None:
+            self.used_models[id] = MODEL_CACHE.peek(key)
+
+        # schedule the fit of the next version if the next refit is within the lead
+        next_refit_ts = current_ts + timedelta(seconds=self.refit_period - offset % self.refit_period)
+        if self.refit_lead > 0 and (next_refit_ts - current_ts).total_seconds() <= self.refit_lead:
+            train_data = dict(self.train_data[id])  # the train data of the forecaster may be replaced meanwhile
+            REFIT_SCHEDULER.update_max_workers(self.refit_threads)
+            REFIT_SCHEDULER.schedule(key, next_refit_ts, fit=lambda: self.__fit_new_model(
+                train_data, chosen_model, config, next_refit_ts))
+
+    def __fit_new_model(self, train_data, chosen_model, config, refit_ts) -> tuple:
+        """
+        Create a new version of the model and fit it with the data up to the refit timestamp (runs in the background).
+
+        The forecaster is not changed here. The fit is recorded in the metrics when the new version is collected.
+
+        Args:
+            train_data: train data of the model.
+            chosen_model: keyword of the chosen model.
+            config: config of the chosen model.
+            refit_ts: timestamp at which the new version replaces the current one.
+
+        Returns:
+            model: the fitted model.
+            seconds: wall time of the fit. Unit: s
+
+        """
+        start = time.perf_counter()
+        model = self.all_models[chosen_model](train_data, **config)
+        model.fit(current_ts=refit_ts, length_to_predict=self.length_to_predict, **config)
+
+        return model, time.perf_counter() - start
+
+    def __get_refit_key(self, id) -> tuple:
+        """Get the key of the model in the refit scheduler (the cache key for shared models)"""
+        if id in self.shared_models:
+            return self.shared_models[id][0]
+        return self.agentDB.agent_id, id
+
     def __summarize_forecasts_to_df(self, forecasts: dict, current_ts) -> pl.DataFrame:
         """
         Summarize all forecasts from dictionary to one polars lazyframe. All forecasts should have the same length and
@@ -395,24 +721,8 @@ class Forecaster:
                                              .alias(c.TC_TIMESTAMP)
                                              .cast(pl.Datetime(time_unit=dtype.time_unit, time_zone=dtype.time_zone)))
 
-        forecasts_list = [timestamps]     # list which will contain all forecast dataframes
-
-        for user_id, forecast in forecasts.items():
-            # remove time column(s) for all forecasts
-            if c.TC_TIMESTAMP in forecast.columns:
-                forecast = forecast.drop(c.TC_TIMESTAMP)
-            if c.TC_TIMESTEP in forecast.columns:
-                forecast = forecast.drop(c.TC_TIMESTEP)
-
-            # change data type of each forecast, should be the same as the target data
-            for column in forecast.columns:
-                dtype = self.train_data[user_id][c.K_TARGET].select(column).dtypes
-
-                # each column should only have one data type
-                forecast = forecast.with_columns(pl.col(column).cast(dtype[0]))
-
-            # add forecast to the list
-            forecasts_list.append(forecast)
+        # list which will contain all forecast dataframes (already formatted, see __format_forecast())
+        forecasts_list = [timestamps] + list(forecasts.values())
 
         # summarize everything together
         forecasts_df = pl.concat(forecasts_list, how='horizontal')
@@ -0,0 +1,197 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+from typing import Callable
+
+import numpy as np
+import polars as pl
+
+from hamlet import constants as c
+
+
+class GlobalModels:
+    """
+    Global forecast models shared by all plants of the same type in a region.
+
+    Instead of fitting one model per plant, one model per plant type, model and config is fitted on the stacked train
+    data of all plants of the region that use it. The target of each plant is divided by its peak, so that plants of
+    different sizes share one model, and the peak relative to the largest plant is added as feature. The peaks are
+    taken from the train data of the fit only (no future values) and are kept with the fitted model. All plants are
+    predicted in one batched call per timestamp and the predictions are scaled back with the peak of each plant.
+
+    Only models that separate the preparation of their data from fitting and predicting are supported (see
+    SUPPORTED_MODELS and RandomForest.get_fit_data() for an example).
+
+    Attributes:
+        members: plants of each global model in the format {key: {(agent id, plant id): train data}}.
+        models: fitted global model of each key.
+        fits: timestamp of the last fit of each global model.
+        scales: peaks and relative peaks of the plants of the last fit in the format {key: (peaks, scales)}.
+        forecasts: forecasts of the current timestamp in the format {key: (timestamp, {member: forecast})}.
+
+    """
+    # Models that can be fitted on the data of several plants
+    SUPPORTED_MODELS = ('rfr', 'cnn', 'rnn')
+    # Feature column with the peak of the plant relative to the largest plant of the global model
+    SCALE = '__scale'
+
+    def __init__(self):
+        self.members = {}
+        self.models = {}
+        self.fits = {}
+        self.scales = {}
+        self.forecasts = {}
+
+    def __getstate__(self) -> dict:
+        """The fitted models are not pickled (e.g. keras models), they are fitted again when needed"""
+        state = self.__dict__.copy()
+        state['models'] = {}
+        state['fits'] = {}
+        state['scales'] = {}
+        state['forecasts'] = {}
+        return state
+
+    def register(self, key: tuple, member: tuple, train_data: dict):
+        """
+        Register the train data of a plant for the global model of the given key.
+
+        Args:
+            key: key of the global model, e.g. plant type, model name and config.
+            member: key of the plant, e.g. agent id and plant id.
+            train_data: train data of the plant.
+
+        """
+        self.members.setdefault(key, {})[member] = train_data
+
+        # the global model needs to be fitted again with the new data
+        self.fits.pop(key, None)
+        self.forecasts.pop(key, None)
+
+    def retain(self, agent_ids: set):
+        """
+        Keep only the plants of the given agents, e.g. the agents that are resident in a sticky worker. The models are
+        then fitted on and predict only these plants instead of the plants of all agents of the region.
+
+        Args:
+            agent_ids: ids of the agents whose plants are kept.
+
+        """
+        for key in list(self.members):
+            members = {member: train_data for member, train_data in self.members[key].items()
+                       if member[0] in agent_ids}
+            if len(members) == len(self.members[key]):
+                continue
+
+            # the global model needs to be fitted again without the dropped plants
+            if members:
+                self.members[key] = members
+            else:
+                del self.members[key]
+                self.models.pop(key, None)
+                self.scales.pop(key, None)
+            self.fits.pop(key, None)
+            self.forecasts.pop(key, None)
+
+    def get_forecast(self, key: tuple, member: tuple, current_ts, refit: bool, create: Callable, config: dict,
+                     length_to_predict: int) -> pl.DataFrame:
+        """
+        Get the forecast of a plant from the global model. The model is fitted if needed and all plants are predicted
+        if they were not predicted at the current timestamp yet.
+
+        Args:
+            key: key of the global model.
+            member: key of the plant.
+            current_ts: Current timestamp for the forecast.
+            refit: whether the model should be refitted at the current timestamp.
+            create: function that creates a new model from train data.
+            config: config of the model.
+            length_to_predict: length to predict. Unit: s
+
+        Returns:
+            forecast: Dataframe containing the forecast of the plant.
+
+        """
+        if key not in self.fits or (refit and self.fits[key] != current_ts):
+            self.__fit(key, current_ts, create, config, length_to_predict)
+
+        timestamp, forecasts = self.forecasts.get(key, (None, None))
+        if timestamp != current_ts:
+            forecasts = self.__predict(key, current_ts, config, length_to_predict)
+            self.forecasts[key] = (current_ts, forecasts)
+
+        return forecasts[member]
+
+    def __fit(self, key: tuple, current_ts, create: Callable, config: dict, length_to_predict: int):
+        """Fit the global model on the stacked data of all its plants"""
+        members = self.members[key]
+
+        # the model is created with the train data of the first plant including the scale feature
+        if key not in self.models:
+            train_data = next(iter(members.values()))
+            self.models[key] = create({c.K_TARGET: train_data[c.K_TARGET],
+                                       c.K_FEATURES: train_data[c.K_FEATURES].with_columns(
+                                           pl.lit(0.0).alias(self.SCALE))})
+        model = self.models[key]
+
+        # prepare the data of each plant
+        members_data = {member: model.get_fit_data(train_data, current_ts=current_ts,
+                                                   length_to_predict=length_to_predict, **config)
+                        for member, train_data in members.items()}
+
+        # scale the data of each plant with the peak of its train data (the features and targets are copied since the
+        # models reuse buffers)
+        peaks, scales = self.__get_scales(members_data)
+        data = [[(self.__add_scale(features, scales[member]), target / peaks[member])
+                 for features, target in member_data]
+                for member, member_data in members_data.items()]
+
+        # stack the data of all plants and fit
+        model.fit_data([(np.concatenate([member_data[i][0] for member_data in data]),
+                         np.concatenate([member_data[i][1] for member_data in data]))
+                        for i in range(len(data[0]))], **config)
+
+        self.fits[key] = current_ts
+        self.scales[key] = (peaks, scales)
+        self.forecasts.pop(key, None)
+
+    def __predict(self, key: tuple, current_ts, config: dict, length_to_predict: int) -> dict:
+        """Predict all plants of the global model in one batch"""
+        members = self.members[key]
+        peaks, scales = self.scales[key]
+        model = self.models[key]
+
+        features = [self.__add_scale(model.get_predict_data(train_data, current_ts=current_ts,
+                                                            length_to_predict=length_to_predict, **config),
+                                     scales[member])
+                    for member, train_data in members.items()]
+        predictions = np.split(np.ravel(model.predict_data(np.concatenate(features), **config)),
+                               np.cumsum([len(member_features) for member_features in features])[:-1])
+
+        forecasts = {}
+        for (member, train_data), prediction in zip(members.items(), predictions):
+            column = [col for col in train_data[c.K_TARGET].columns if col != c.TC_TIMESTAMP][0]
+            forecasts[member] = pl.DataFrame({column: prediction * peaks[member]})
+
+        return forecasts
+
+    @staticmethod
+    def __get_scales(members_data: dict) -> tuple[dict, dict]:
+        """Get the peak of the train targets of each plant (see get_fit_data()) and the peak relative to the largest
+        plant"""
+        peaks = {}
+        for member, member_data in members_data.items():
+            peak = max((np.nanmax(np.abs(target)) for _, target in member_data if np.size(target)), default=0.0)
+            peaks[member] = float(peak) if peak > 0 else 1.0
+
+        max_peak = max(peaks.values())
+        scales = {member: peak / max_peak for member, peak in peaks.items()}
+
+        return peaks, scales
+
+    @staticmethod
+    def __add_scale(features: np.ndarray, scale: float) -> np.ndarray:
+        """Add the scale as the last feature (for tabular as well as sequence features)"""
+        return np.concatenate([features, np.full(features.shape[:-1] + (1,), scale, dtype=np.float32)], axis=-1)
@@ -0,0 +1,77 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+from typing import Callable
+
+import polars as pl
+
+
+class MarketForecasts:
+    """
+    Market price forecasts shared by all forecasters of a region.
+
+    The market targets of all agents in a region are derived from the same retailer data. Therefore, they are only
+    prepared once and the same (immutable) dataframes are used by all forecasters. The forecasts of the market prices
+    are only computed once per timestamp for all forecasters that use the same model with the same config on the same
+    target.
+
+    Attributes:
+        targets: prepared market targets in the format {key: (wholesale target, local target)}.
+        forecasts: forecasts of the current timestamp in the format {key: (target, forecast)}.
+        timestamp: timestamp of the cached forecasts.
+
+    """
+    # Models whose forecasts only depend on the train data and the config (no fitted or random state)
+    SHARED_MODELS = ('perfect', 'naive', 'average', 'smoothed')
+
+    def __init__(self):
+        self.targets = {}
+        self.forecasts = {}
+        self.timestamp = None
+
+    def get_targets(self, key: tuple, prepare: Callable) -> tuple[pl.DataFrame, pl.DataFrame]:
+        """
+        Get the wholesale and local target of a market. They are prepared by calling prepare() if not done yet.
+
+        Args:
+            key: key of the targets, e.g. market name and offset.
+            prepare: function that returns the wholesale and local target.
+
+        Returns:
+            targets: tuple of wholesale and local target.
+
+        """
+        if key not in self.targets:
+            self.targets[key] = prepare()
+
+        return self.targets[key]
+
+    def get_forecast(self, key: tuple, target: pl.DataFrame, current_ts, predict: Callable) -> pl.DataFrame:
+        """
+        Get the forecast of the current timestamp. It is predicted by calling predict() if it was not predicted for the
+        same target yet.
+
+        Args:
+            key: key of the forecast, e.g. forecast id, model and config.
+            target: target the forecast is based on (compared by identity).
+            current_ts: current timestamp of the forecast.
+            predict: function that returns the forecast.
+
+        Returns:
+            forecast: forecast of the current timestamp.
+
+        """
+        # forecasts of past timestamps are not needed anymore
+        if current_ts != self.timestamp:
+            self.forecasts = {}
+            self.timestamp = current_ts
+
+        cached_target, forecast = self.forecasts.get(key, (None, None))
+        if cached_target is not target:
+            forecast = predict()
+            self.forecasts[key] = (target, forecast)
+
+        return forecast
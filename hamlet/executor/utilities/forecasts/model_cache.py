@@ -0,0 +1,171 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import hashlib
+from collections import OrderedDict
+from typing import Callable
+
+import polars as pl
+
+
+class ModelCache:
+    """
+    Forecast models shared by all forecasters of the process that have the same train data.
+
+    Many agents are created from the same input profiles and thus have identical targets and features (apart from the
+    column names). The models are looked up by a hash of the content of the train data together with the model name
+    and config. Agents with the same key share one model, which is therefore only fitted once per timestamp. The
+    prediction of the current timestamp is shared as well.
+
+    The cache is bounded by the number of models and the size of their targets. The least recently used models are
+    dropped first together with their fit timestamp and prediction. The forecasters that already use a dropped model
+    keep it, but its fits and predictions are no longer shared.
+
+    Note: The size only counts the targets of the models. The features (mostly the weather, which is shared by all
+    forecasters), the predictions and the fitted models (e.g. random forests or neural networks) are not counted. Their
+    number is bounded by max_entries.
+
+    Attributes:
+        max_entries: maximum number of cached models.
+        max_target_bytes: maximum size of the targets of all cached models in bytes.
+        entries: cached models in the format {key: [model, target columns, size of the target in bytes, timestamp of
+        the last fit, (timestamp, prediction) of the last prediction]}.
+        target_nbytes: size of the targets of all cached models in bytes.
+
+    """
+    # Models that only depend on their train data and config (models with agent specific data, e.g. weather, are not
+    # shared)
+    SHARED_MODELS = ('perfect', 'naive', 'average', 'smoothed', 'sarma', 'rfr', 'cnn', 'rnn', 'arima')
+    MAX_ENTRIES = 1024
+    MAX_TARGET_BYTES = 1024 ** 3
+    # Positions of the values of an entry
+    MODEL, COLUMNS, NBYTES, FITTED_AT, FORECAST = range(5)
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, max_target_bytes: int = MAX_TARGET_BYTES):
+        self.max_entries = max_entries
+        self.max_target_bytes = max_target_bytes
+        self.entries = OrderedDict()
+        self.target_nbytes = 0
+
+    def get_model(self, key: tuple, target: pl.DataFrame, create: Callable) -> tuple[object, list]:
+        """
+        Get the model of the given key. It is created by calling create() if it is not cached yet.
+
+        Args:
+            key: key of the model as returned by get_key().
+            target: target of the forecaster that requests the model.
+            create: function that returns a new model for the train data of the forecaster.
+
+        Returns:
+            model: the shared model.
+            columns: target columns of the forecaster that created the model (the predictions are named after them).
+
+        """
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            entry = self.entries[key]
+            return entry[self.MODEL], entry[self.COLUMNS]
+
+        model = create()
+        nbytes = target.estimated_size()
+        self.entries[key] = [model, target.columns, nbytes, None, (None, None)]
+        self.target_nbytes += nbytes
+
+        # drop the least recently used models if the cache is full
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries
+                                         or self.target_nbytes > self.max_target_bytes):
+            _, old_entry = self.entries.popitem(last=False)
+            self.target_nbytes -= old_entry[self.NBYTES]
+
+        return model, target.columns
+
+    def peek(self, key: tuple):
+        """Get the model of the given key if it is cached (None otherwise)"""
+        entry = self.entries.get(key)
+        return entry[self.MODEL] if entry is not None else None
+
+    def replace(self, key: tuple, model, fitted_at):
+        """Replace the model of the given key by a new version that was fitted at the given timestamp"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            entry[self.MODEL] = model
+            entry[self.FITTED_AT] = fitted_at
+            entry[self.FORECAST] = (None, None)
+
+    def fit(self, key: tuple, current_ts, fit: Callable):
+        """
+        Fit the model of the given key by calling fit() if it was not fitted at the current timestamp yet. Models that
+        are no longer cached are always fitted.
+
+        Args:
+            key: key of the model as returned by get_key().
+            current_ts: current timestamp of the fit.
+            fit: function that fits the model.
+
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            fit()
+        elif entry[self.FITTED_AT] != current_ts:
+            fit()
+            entry[self.FITTED_AT] = current_ts
+
+    def get_forecast(self, key: tuple, current_ts, predict: Callable) -> pl.DataFrame:
+        """
+        Get the prediction of the model of the given key at the current timestamp. It is predicted by calling predict()
+        if it was not predicted yet. Models that are no longer cached always predict.
+
+        Args:
+            key: key of the model as returned by get_key().
+            current_ts: current timestamp of the prediction.
+            predict: function that returns the prediction of the model.
+
+        Returns:
+            forecast: prediction of the model.
+
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            return predict()
+
+        timestamp, forecast = entry[self.FORECAST]
+        if timestamp != current_ts:
+            forecast = predict()
+            entry[self.FORECAST] = (current_ts, forecast)
+
+        return forecast
+
+    @classmethod
+    def get_key(cls, model_name: str, config: dict, target: pl.DataFrame, features, *args) -> tuple:
+        """
+        Get the key of the model from its name, config and the content of its train data.
+
+        Args:
+            model_name: name of the model.
+            config: config of the model.
+            target: target dataframe.
+            features: features dataframe or lazyframe.
+            args: other values the model depends on (e.g. the refit period).
+
+        Returns:
+            key: key of the model.
+
+        """
+        return (model_name, repr(config), cls.hash_frame(target), cls.hash_frame(features)) + args
+
+    @staticmethod
+    def hash_frame(data) -> tuple:
+        """Hash the content of the dataframe (the column names are not part of the hash)"""
+        if isinstance(data, pl.LazyFrame):
+            data = data.collect()
+        if not data.width:
+            return 0, (), None
+        digest = hashlib.blake2b(data.hash_rows(seed=0).to_numpy().tobytes(), digest_size=16).hexdigest()
+        return data.height, tuple(str(dtype) for dtype in data.dtypes), digest
+
+
+# models shared by all forecasters of this process
+MODEL_CACHE = ModelCache()
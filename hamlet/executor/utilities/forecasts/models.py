@@ -4,6 +4,7 @@ __license__ = ""
 __maintainer__ = "jiahechu"
 __email__ = "jiahe.chu@tum.de"
 
+import math
 import os
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'  # turn off onednn for tensorflow
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # silence tensorflow logs
@@ -12,10 +13,10 @@ import ast
 import polars as pl
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from keras.api.layers import Input, Dense, LSTM, Conv1D, MaxPooling1D, Flatten, Dropout
 from keras.api.models import Model
 from sktime.forecasting.arima import ARIMA
-from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 import pvlib
 from pvlib.pvsystem import PVSystem
@@ -25,6 +26,219 @@ from hamlet import constants as c
 from hamlet import functions as f
 
 
+class PrecomputedForecasts:
+    """
+    Precomputed forecast columns of a deterministic model (one per model instance).
+
+    Deterministic models (e.g. average or smoothed) compute the same value for a timestep of the target regardless of
+    the time the forecast is made. These values are computed once for the whole target as a column. The forecast is
+    then only the window of the column that starts at the current timestamp. Since the targets are replaced rather
+    than changed (e.g. local market prices), a column is recomputed when the target of the model is replaced (compared
+    by identity). Only targets with a regular time resolution are precomputed.
+
+    Attributes:
+        entries: precomputed tables in the format {key: (target, table, resolution)}.
+
+    """
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, target: pl.DataFrame, key: tuple, compute) -> tuple[pl.DataFrame | None, int | None]:
+        """
+        Get the precomputed table of the target. It is computed by calling compute(resolution) if needed.
+
+        Args:
+            target: target of the model with a c.TC_TIMESTAMP column.
+            key: key of the table, e.g. model parameters.
+            compute: function that returns the precomputed table with a c.TC_TIMESTAMP column for the resolution.
+
+        Returns:
+            table: precomputed table or None if the target cannot be precomputed.
+            resolution: resolution of the target in seconds or None if the target cannot be precomputed.
+
+        """
+        cached_target, table, resolution = self.entries.get(key, (None, None, None))
+        if cached_target is not target:
+            resolution = self.get_regular_resolution(target)
+            table = f.set_sorted_time_index(compute(resolution)) if resolution else None
+            self.entries[key] = (target, table, resolution)
+
+        return table, resolution
+
+    @staticmethod
+    def get_regular_resolution(target: pl.DataFrame) -> int | None:
+        """Get the resolution of the target in seconds if its timestamps are sorted, unique and regular (else None)"""
+        if (not isinstance(target, pl.DataFrame) or target.height < 2
+                or f.get_sorted_time_index(target) is None):
+            return None
+
+        resolutions = target.select(pl.col(c.TC_TIMESTAMP).diff().drop_nulls().unique())
+        if resolutions.height != 1:
+            return None
+
+        resolution = resolutions.item().total_seconds()
+        if resolution <= 0 or resolution != int(resolution) or c.DAYS_TO_SECONDS % resolution:
+            return None
+
+        return int(resolution)
+
+
+class WeatherInputs:
+    """
+    Weather inputs of the weather models that are shared by all plants of the process.
+
+    All plants of a scenario use the same weather data and location. The preparation of the weather data (e.g. the
+    solar position and the dni) for a forecast only depends on the weather, the location, the current timestamp and
+    the horizon. It is thus done once per forecast for all plants instead of once per plant. Since the weather data is
+    not changed during the simulation, it is compared by identity.
+
+    Attributes:
+        max_entries: maximum number of prepared inputs.
+        entries: prepared inputs in the format {(id(weather), key): (weather, inputs)} (least recently used first).
+
+    """
+    MAX_ENTRIES = 32
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = {}
+
+    def get(self, weather: pl.DataFrame, key: tuple, prepare):
+        """
+        Get the prepared inputs. They are prepared by calling prepare() if needed.
+
+        Args:
+            weather: weather data the inputs are prepared from.
+            key: key of the inputs, e.g. type of plant, location, current timestamp and horizon.
+            prepare: function that returns the inputs.
+
+        Returns:
+            inputs: prepared inputs (must not be changed by the caller).
+
+        """
+        entry_key = (id(weather), key)
+        cached_weather, inputs = self.entries.pop(entry_key, (None, None))
+        if cached_weather is not weather:
+            inputs = prepare()
+
+        # keep the entry as most recently used and drop the least recently used one if full
+        self.entries[entry_key] = (weather, inputs)
+        if len(self.entries) > self.max_entries:
+            self.entries.pop(next(iter(self.entries)))
+
+        return inputs
+
+
+# weather inputs of all weather models of this process
+WEATHER_INPUTS = WeatherInputs()
+
+
+class SolarPositionLocation(Location):
+    """pvlib Location that returns the given solar position instead of calculating it again for the same times"""
+    def __init__(self, solar_position: pd.DataFrame, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.solar_position = solar_position
+
+    def get_solarposition(self, times, pressure=None, temperature=12, **kwargs):
+        if self.solar_position.index.equals(times):
+            return self.solar_position
+        return super().get_solarposition(times, pressure=pressure, temperature=temperature, **kwargs)
+
+
+class SequenceBuffer:
+    """
+    Input sequences of the neural networks (CNN and RNN) with reusable buffers.
+
+    For each to be predicted timestep, the window of the previous features is used as input sequence. The windows are
+    created as zero-copy views over the float32 features (numpy stride tricks) and copied once into a contiguous buffer
+    for keras. The buffers are reused by later fits and predictions of the same model as long as their shape stays the
+    same.
+
+    Attributes:
+        buffers: buffers of the sequences in the format {name: numpy.ndarray}.
+
+    """
+    # share of the data that is used for validation (the last part of the data)
+    VALIDATION_SHARE = 0.2
+
+    def __init__(self):
+        self.buffers = {}
+
+    def __getstate__(self) -> dict:
+        """The buffers are not pickled (e.g. when the model is sent to a worker process)"""
+        return {'buffers': {}}
+
+    def get_train_data(self, window_length: int, features: pl.DataFrame, target: pl.DataFrame) -> tuple:
+        """
+        Prepare training data for a neural network.
+
+        The data is split into training and validation sets (the validation set is the last part of the data) and both
+        are organized into sequences with the given window length.
+
+        Args:
+            window_length: The length of the input sequences as features.
+            features: The training input data without time columns.
+            target: The training target data without time columns.
+
+        Returns:
+            train_sequences (numpy.ndarray): Sequences of training data with shape (num_samples, window_length,
+            num_features).
+            train_targets (numpy.ndarray): Target values corresponding to the training sequences with shape
+            (num_samples, 1, num_targets).
+            val_sequences (numpy.ndarray): Sequences of validation data.
+            val_targets (numpy.ndarray): Target values corresponding to the validation sequences.
+
+        """
+        features = self.to_array(features)
+        target = self.to_array(target)
+
+        # split train and validation data (same split as sklearn's train_test_split without shuffling)
+        split = len(features) - math.ceil(self.VALIDATION_SHARE * len(features))
+
+        train_sequences = self.get_sequences('train', features[:split], window_length)
+        val_sequences = self.get_sequences('val', features[split:], window_length)
+
+        # each sequence is followed by its target timestep
+        train_targets = target[window_length:split, None, :]
+        val_targets = target[split + window_length:, None, :]
+
+        return train_sequences, train_targets, val_sequences, val_targets
+
+    def get_sequences(self, name: str, data: np.ndarray, window_length: int) -> np.ndarray:
+        """
+        Get the sequences of the given window length before each timestep of the data.
+
+        Args:
+            name: name of the buffer, e.g. 'train' or 'predict'.
+            data: data with shape (num_timesteps, num_features).
+            window_length: The length of the input sequences.
+
+        Returns:
+            sequences (numpy.ndarray): Sequences with shape (num_timesteps - window_length, window_length,
+            num_features).
+
+        """
+        shape = (max(len(data) - window_length, 0), window_length, data.shape[1])
+
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, dtype=np.float32)
+            self.buffers[name] = buffer
+
+        if shape[0]:
+            # windows have the shape (num_windows, num_features, window_length)
+            windows = sliding_window_view(data, window_length, axis=0)[:shape[0]]
+            np.copyto(buffer, windows.transpose(0, 2, 1))
+
+        return buffer
+
+    @staticmethod
+    def to_array(data: pl.DataFrame) -> np.ndarray:
+        """Convert the dataframe to a float32 array with shape (num_rows, num_columns)"""
+        return data.cast(pl.Float32).to_numpy().reshape(data.height, data.width)
+
+
 def forecast_model(name):
     """Decorator to match model with the given name. All forecast models should use this decorator."""
     def decorator(cls):
@@ -139,6 +353,13 @@ class NaiveModel(ModelBase):
 @forecast_model(name='average')
 class AverageModel(ModelBase):
     """Today will be the same as the average of the last n days with offset."""
+    # Column of the precomputed averages that states if all days of the average are in the target
+    VALID = '__valid'
+
+    def __init__(self, train_data: dict, **kwargs):
+        super().__init__(train_data, **kwargs)
+        self.precomputed = PrecomputedForecasts()    # precomputed averages of the target
+
     def predict(self, current_ts, length_to_predict, offset, days, **kwargs):
         """
         Calculate the average of the last days of given number (days) with offset (offset) to current timestep, use the
@@ -158,6 +379,18 @@ class AverageModel(ModelBase):
         # get column name
         plant_id = self.train_data[c.K_TARGET].drop(c.TC_TIMESTAMP).columns[0]
 
+        # take the window of the precomputed averages if possible
+        averages, resolution = self.precomputed.get(
+            self.train_data[c.K_TARGET], key=(plant_id, offset, days),
+            compute=lambda resolution: self.__precompute(resolution, plant_id, offset, days))
+        if averages is not None:
+            forecast = f.slice_dataframe_between_times(target_df=averages, reference_ts=current_ts,
+                                                       duration=length_to_predict, unit='second')
+            # the window needs to be complete and all days of the averages need to be in the target
+            if (forecast.height == -(-length_to_predict // resolution)
+                    and forecast.select(pl.col(self.VALID).all()).item()):
+                return forecast.select(plant_id)
+
         # generate dataframe with data for last n days
         past_data = []  # empty list, will contain past data for each past day
         for day in range(days):
@@ -174,10 +407,37 @@ class AverageModel(ModelBase):
 
         return forecast.select(plant_id)
 
+    def __precompute(self, resolution: int, plant_id: str, offset: int, days: int) -> pl.DataFrame:
+        """
+        Precompute the averages for all timesteps of the target. The average of a timestep is valid if all days before
+        are in the target.
+
+        Args:
+            resolution: Resolution of the target. Unit: seconds.
+            plant_id: Column name of the target.
+            offset:  Offset in days to the current day. Unit: days.
+            days: Number of days to be used for averaging. Unit: days.
+
+        Returns:
+            averages: Dataframe with the timestamp, the average and if it is valid.
+
+        """
+        steps_per_day = c.DAYS_TO_SECONDS // resolution
+        shifts = [(offset + day) * steps_per_day for day in range(days)]
+
+        return self.train_data[c.K_TARGET].select(
+            c.TC_TIMESTAMP,
+            (pl.sum_horizontal([pl.col(plant_id).shift(shift) for shift in shifts]) / days).alias(plant_id),
+            (pl.int_range(0, pl.len()) >= max(shifts)).alias(self.VALID))
+
 
 @forecast_model(name='smoothed')
 class SmoothedModel(ModelBase):
     """Prediction value is a moving mean of the future values with a specified window width."""
+    def __init__(self, train_data: dict, **kwargs):
+        super().__init__(train_data, **kwargs)
+        self.precomputed = PrecomputedForecasts()    # precomputed moving averages of the target
+
     def predict(self, current_ts, length_to_predict, steps, **kwargs):
         """
         Calculate the moving average in the future as prediction.
@@ -195,13 +455,23 @@ class SmoothedModel(ModelBase):
             forecast: Forecast result as Dataframe.
 
         """
+        # take the window of the precomputed moving averages (starting at the next timestep) if possible
+        moving_averages, resolution = self.precomputed.get(self.train_data[c.K_TARGET], key=(steps,),
+                                                           compute=lambda resolution: self.__precompute(steps))
+        if moving_averages is not None:
+            forecast = f.slice_dataframe_between_times(target_df=moving_averages,
+                                                       reference_ts=current_ts + timedelta(seconds=resolution),
+                                                       duration=length_to_predict, unit='second')
+            if forecast.height == int(length_to_predict / resolution):
+                return forecast
+
         # calculate train data resolution first
         resolution = f.calculate_time_resolution(self.train_data[c.K_TARGET])
 
         # calculate the moving average for each timestep to predict
         forecast = []   # empty list, will contain the moving average for each horizon
         for timestep in range(1, int(length_to_predict / resolution) + 1):
-            reference_ts = current_ts + timestep * resolution
+            reference_ts = current_ts + timedelta(seconds=timestep * resolution)
             horizon = f.slice_dataframe_between_times(target_df=self.train_data[c.K_TARGET], reference_ts=reference_ts,
                                                       duration=steps * resolution, unit='second')  # get horizon
 
@@ -213,6 +483,25 @@ class SmoothedModel(ModelBase):
 
         return forecast
 
+    def __precompute(self, steps: int) -> pl.DataFrame:
+        """
+        Precompute the moving average of the next steps timesteps (including the timestep itself) for all timesteps of
+        the target.
+
+        Args:
+            steps: Number of future time steps to be used for smoothing. Unit: time steps
+
+        Returns:
+            moving_averages: Dataframe with the timestamp and the moving averages of all target columns.
+
+        """
+        target = self.train_data[c.K_TARGET]
+        columns = [column for column in target.columns if column != c.TC_TIMESTAMP]
+
+        return target.select(c.TC_TIMESTAMP,
+                             *[pl.col(column).reverse().rolling_mean(window_size=steps, min_periods=1).reverse()
+                               for column in columns])
+
 
 @forecast_model(name='sarma')
 class SARMAModel(ModelBase):
@@ -236,22 +525,37 @@ class RandomForest(ModelBase):
         """
         Prepare features and targets for fitting and fit the regressor.
 
+        Args:
+            current_ts: Current timestep when making the fitting.
+            days: Past days that are used to fit the random forest regressor.
+
+        """
+        self.fit_data(self.get_fit_data(self.train_data, current_ts=current_ts, days=days))
+
+    def get_fit_data(self, train_data, current_ts, days, **kwargs) -> list[tuple]:
+        """
+        Prepare features and targets of the given train data for fitting.
+
         The past actual (c.TC_TIMESTAMP == c.TC_TIMESTEP) feature data except c.TC_TIMESTAMP and c.TC_TIMESTEP columns
         will be taken as features. The past target data except c.TC_TIMESTAMP column will be taken as target. Both
-        target and features data will be converted to pandas.DataFrame since sklearn does not support polars yet.
+        target and features data will be converted to numpy arrays since sklearn does not support polars yet.
 
         Args:
+            train_data: train data of the plant (this model's or another plant's, see GlobalModels).
             current_ts: Current timestep when making the fitting.
             days: Past days that are used to fit the random forest regressor.
 
+        Returns:
+            data: list with one tuple of features and target.
+
         """
         # slice target for training
-        target = f.slice_dataframe_between_times(target_df=self.train_data[c.K_TARGET], reference_ts=current_ts,
+        target = f.slice_dataframe_between_times(target_df=train_data[c.K_TARGET], reference_ts=current_ts,
                                                  duration=(-days), unit='day')
 
         # slice features for training
         filter_condition = (pl.col(c.TC_TIMESTAMP) == pl.col(c.TC_TIMESTEP))    # take only actual past weather data
-        features_all = self.train_data[c.K_FEATURES].filter(filter_condition)
+        features_all = train_data[c.K_FEATURES].filter(filter_condition)
         features = f.slice_dataframe_between_times(target_df=features_all, reference_ts=current_ts, duration=(-days),
                                                    unit='day')
 
@@ -259,11 +563,11 @@ class RandomForest(ModelBase):
         target = target.drop(c.TC_TIMESTAMP)
         features = features.drop(c.TC_TIMESTAMP, c.TC_TIMESTEP)
 
-        # convert data into pandas, since sklearn does not support polars yet
-        target = target.to_pandas()
-        features = features.to_pandas()
+        return [(features.to_numpy(), target.to_numpy())]
 
-        # fitting
+    def fit_data(self, data: list[tuple], **kwargs):
+        """Fit the regressor with the data returned by get_fit_data()"""
+        (features, target), = data
         self.model.fit(X=features, y=target)
 
     def predict(self, current_ts, length_to_predict, **kwargs):
@@ -281,8 +585,32 @@ class RandomForest(ModelBase):
         Returns:
             forecast: Forecast result as Dataframe.
         """
+        # predict and convert result to polars Dataframe
+        forecast = self.predict_data(self.get_predict_data(self.train_data, current_ts=current_ts,
+                                                           length_to_predict=length_to_predict))
+        plant_id = self.train_data[c.K_TARGET].columns  # get column name for result
+        plant_id.remove(c.TC_TIMESTAMP)
+        forecast = pl.DataFrame({plant_id[0]: forecast.ravel()})
+
+        # forecasting
+        return forecast
+
+    def get_predict_data(self, train_data, current_ts, length_to_predict, **kwargs) -> np.ndarray:
+        """
+        Prepare the forecasted (take c.TC_TIMESTEP as time index) features of the given train data for prediction.
+
+        Args:
+            train_data: train data of the plant (this model's or another plant's, see GlobalModels).
+            current_ts: Current timestep when making the prediction.
+            length_to_predict: How long in the future should be covered in the resulting forecast of this model. Unit:
+            seconds.
+
+        Returns:
+            features: features as numpy array.
+
+        """
         # slice features for prediction
-        features = f.slice_dataframe_between_times(target_df=self.train_data[c.K_FEATURES], reference_ts=current_ts,
+        features = f.slice_dataframe_between_times(target_df=train_data[c.K_FEATURES], reference_ts=current_ts,
                                                    duration=0)   # get data at current ts
         # set future time steps as 'index'
         features = features.with_columns(pl.col(c.TC_TIMESTEP).alias(c.TC_TIMESTAMP))
@@ -290,17 +618,11 @@ class RandomForest(ModelBase):
                                                    duration=length_to_predict, unit='second')
         features = features.drop(c.TC_TIMESTAMP, c.TC_TIMESTEP)     # delete time columns for prediction
 
-        # convert data into pandas, since sklearn only takes pandas for now
-        features = features.to_pandas()
+        return features.to_numpy()
 
-        # predict and convert result to polars Dataframe
-        forecast = self.model.predict(X=features)
-        plant_id = self.train_data[c.K_TARGET].columns  # get column name for result
-        plant_id.remove(c.TC_TIMESTAMP)
-        forecast = pl.DataFrame({plant_id[0]: forecast.ravel()})
-
-        # forecasting
-        return forecast
+    def predict_data(self, features: np.ndarray, **kwargs) -> np.ndarray:
+        """Predict with the features returned by get_predict_data()"""
+        return self.model.predict(X=features)
 
 
 @forecast_model(name='cnn')
@@ -343,105 +665,52 @@ class CNNModel(ModelBase):
         self.cnn_model = Model(inputs=inputs, outputs=outputs)
         self.cnn_model.compile(loss='mse', optimizer='adam')
 
-    @staticmethod
-    def __prepare_train_data(window_length, X_train, y_train):
-        """
-        Prepare training data for a neural network.
-
-        This function splits the provided training data into training and validation sets and organizes them into
-        sequences with the given window length suitable for training a CNN or RNN model. For each to be predicted
-        timestep, a window is used as features. The resulting sequences and targets are converted to numpy arrays with
-        float32 data type.
-
-        Parameters:
-            window_length (int): The length of the input sequences as features.
-            X_train (pandas.DataFrame): The training input data, typically a DataFrame.
-            y_train (pandas.Series): The training target data, typically a Series.
-
-        Returns:
-            train_sequences (numpy.ndarray): Sequences of training data with shape (num_samples, window_length,
-            num_features).
-            train_targets (numpy.ndarray): Target values corresponding to the training sequences.
-            val_sequences (numpy.ndarray): Sequences of validation data with shape (num_samples, window_length,
-            num_features).
-            val_targets (numpy.ndarray): Target values corresponding to the validation sequences.
-        """
-        # split train and test data
-        X_train, X_test, y_train, y_test = train_test_split(X_train, y_train, test_size=0.2, shuffle=False)
-
-        seq_length = window_length
-        target_length = 1
-
-        train_sequences = []
-        train_targets = []
-        for i in range(seq_length, len(X_train) - target_length + 1):
-            train_sequences.append(X_train.iloc[i - seq_length:i, :])
-            train_targets.append(y_train.iloc[i:i + target_length])
-
-        val_sequences = []
-        val_targets = []
-        for i in range(seq_length, len(X_test) - target_length + 1):
-            val_sequences.append(X_test.iloc[i - seq_length:i, :])
-            val_targets.append(y_test.iloc[i:i + target_length])
+        # buffers of the input sequences
+        self.sequences = SequenceBuffer()
 
-        train_sequences = np.array([np.array(train_sequence) for train_sequence in train_sequences]).astype('float32')
-        train_targets = np.array([np.array(train_target) for train_target in train_targets]).astype('float32')
-        val_sequences = np.array([np.array(val_sequence) for val_sequence in val_sequences]).astype('float32')
-        val_targets = np.array([np.array(val_target) for val_target in val_targets]).astype('float32')
-
-        return train_sequences, train_targets, val_sequences, val_targets
-
-    @staticmethod
-    def __prepare_predict_data(window_length, X_predict):
+    def fit(self, current_ts, days, window_length, epoch, **kwargs):
         """
-        Prepare prediction data for a neural network. Similar to self.__prepare_train_data, but only for features.
-
-        Parameters:
-            window_length (int): The length of the input sequences as features.
-            X_predict (pandas.DataFrame): The input data for prediction, typically a DataFrame.
+        Prepare features and targets for fitting and fit the neural network.
 
-        Returns:
-            predict_sequences (numpy.ndarray): Sequences of input data for prediction with shape (num_samples,
-            window_length, num_features).
+        Args:
+            current_ts: Current timestep when making the fitting.
+            days: Past days that are used to fit the random forest regressor.
+            window_length: The length of the input sequences as features.
+            epoch: Number of epochs for fitting.
 
         """
-        seq_length = window_length
-        target_length = 1
-
-        predict_sequences = []
-        for i in range(seq_length, len(X_predict) - target_length + 1):
-            predict_sequences.append(X_predict.iloc[i - seq_length:i, :])
-
-        predict_sequences = np.array([np.array(predict_sequence) for predict_sequence in predict_sequences])\
-                              .astype('float32')
-
-        return predict_sequences
+        self.fit_data(self.get_fit_data(self.train_data, current_ts=current_ts, days=days,
+                                        window_length=window_length), epoch=epoch)
 
-    def fit(self, current_ts, days, window_length, epoch, **kwargs):
+    def get_fit_data(self, train_data, current_ts, days, window_length, **kwargs) -> list[tuple]:
         """
-        Prepare features and targets for fitting and fit the neural network.
+        Prepare features and targets of the given train data for fitting.
 
         The past actual (c.TC_TIMESTAMP == c.TC_TIMESTEP) feature data except c.TC_TIMESTAMP and c.TC_TIMESTEP columns
         will be taken as features. The past target data except c.TC_TIMESTAMP column will be taken as target. Both
         target and features data will be converted to sequences with the given window length in form of numpy arrays
         (since keras does not support polars yet), each features' sequence matches one target timestep. The length of
-        the taken features data from self.train_data[c.K_FEATURES] is "window_length" longer than the taken target, the
-        actual feature sequences for fitting returned from self.__prepare_train_data is as long as the returned target
-        for fitting.
+        the taken features data from train_data[c.K_FEATURES] is "window_length" longer than the taken target, the
+        actual feature sequences for fitting returned from self.sequences.get_train_data is as long as the returned
+        target for fitting.
 
         Args:
+            train_data: train data of the plant (this model's or another plant's, see GlobalModels).
             current_ts: Current timestep when making the fitting.
             days: Past days that are used to fit the random forest regressor.
             window_length: The length of the input sequences as features.
-            epoch: Number of epochs for fitting.
+
+        Returns:
+            data: list with tuples of features and targets for training and validation (the arrays are buffers that
+            are overwritten by the next call).
 
         """
         # slice target for training
-        target = f.slice_dataframe_between_times(target_df=self.train_data[c.K_TARGET], reference_ts=current_ts,
+        target = f.slice_dataframe_between_times(target_df=train_data[c.K_TARGET], reference_ts=current_ts,
                                                  duration=(-days), unit='day')
         # slice features for training
         filter_condition = (pl.col(c.TC_TIMESTAMP) == pl.col(c.TC_TIMESTEP))  # take only actual past weather data
-        features_all = self.train_data[c.K_FEATURES].filter(filter_condition)
+        features_all = train_data[c.K_FEATURES].filter(filter_condition)
         features = f.slice_dataframe_between_times(target_df=features_all, reference_ts=current_ts, duration=(-days),
                                                    unit='day')
 
@@ -449,15 +718,15 @@ class CNNModel(ModelBase):
         target = target.drop(c.TC_TIMESTAMP)
         features = features.drop(c.TC_TIMESTAMP, c.TC_TIMESTEP)
 
-        # convert data into pandas, since sklearn only takes pandas for now
-        target = target.to_pandas()
-        features = features.to_pandas()
-
         # convert data dimension to 3d
-        train_sequences, train_targets, val_sequences, val_targets = self.__prepare_train_data(window_length, features,
-                                                                                               target)
+        train_sequences, train_targets, val_sequences, val_targets = self.sequences.get_train_data(window_length,
+                                                                                                   features, target)
 
-        # fitting
+        return [(train_sequences, train_targets), (val_sequences, val_targets)]
+
+    def fit_data(self, data: list[tuple], epoch, **kwargs):
+        """Fit the neural network with the data returned by get_fit_data()"""
+        (train_sequences, train_targets), (val_sequences, val_targets) = data
         self.cnn_model.fit(train_sequences, train_targets, epochs=epoch, validation_data=(val_sequences, val_targets))
 
     def predict(self, current_ts, length_to_predict, window_length, **kwargs):
@@ -477,12 +746,38 @@ class CNNModel(ModelBase):
         Returns:
             forecast: Forecast result as Dataframe.
 
+        """
+        # predict and convert result to polars Dataframe
+        forecast = self.predict_data(self.get_predict_data(self.train_data, current_ts=current_ts,
+                                                           length_to_predict=length_to_predict,
+                                                           window_length=window_length))
+        plant_id = self.train_data[c.K_TARGET].columns  # get column name for result
+        plant_id.remove(c.TC_TIMESTAMP)
+        forecast = pl.DataFrame({plant_id[0]: forecast.ravel()})
+
+        return forecast
+
+    def get_predict_data(self, train_data, current_ts, length_to_predict, window_length, **kwargs) -> np.ndarray:
+        """
+        Prepare the forecasted (take c.TC_TIMESTEP as time index) features of the given train data as sequences for
+        prediction.
+
+        Args:
+            train_data: train data of the plant (this model's or another plant's, see GlobalModels).
+            current_ts: Current timestep when making the prediction.
+            length_to_predict: How long in the future should be covered in the resulting forecast of this model. Unit:
+            seconds.
+            window_length: The length of the input sequences as features.
+
+        Returns:
+            predict_sequences: sequences for prediction (a buffer that is overwritten by the next call).
+
         """
         # calculate train data resolution first
-        resolution = f.calculate_time_resolution(self.train_data[c.K_TARGET])
+        resolution = f.calculate_time_resolution(train_data[c.K_TARGET])
 
         # slice features for prediction
-        features = f.slice_dataframe_between_times(target_df=self.train_data[c.K_FEATURES], reference_ts=current_ts,
+        features = f.slice_dataframe_between_times(target_df=train_data[c.K_FEATURES], reference_ts=current_ts,
                                                    duration=0)  # get data at current ts
 
         # set future time steps as 'index'
@@ -491,19 +786,12 @@ class CNNModel(ModelBase):
                                                    duration=length_to_predict + resolution * window_length)
         features = features.drop(c.TC_TIMESTAMP, c.TC_TIMESTEP)  # delete time columns for prediction
 
-        # convert data into pandas, since sklearn only takes pandas for now
-        features = features.to_pandas()
-
         # convert features to 3d array
-        predict_sequences = self.__prepare_predict_data(window_length, features)
+        return self.sequences.get_sequences('predict', self.sequences.to_array(features), window_length)
 
-        # predict and convert result to polars Dataframe
-        forecast = self.rnn_model.predict(predict_sequences)
-        plant_id = self.train_data[c.K_TARGET].columns  # get column name for result
-        plant_id.remove(c.TC_TIMESTAMP)
-        forecast = pl.DataFrame({plant_id[0]: forecast.ravel()})
-
-        return forecast
+    def predict_data(self, predict_sequences: np.ndarray, **kwargs) -> np.ndarray:
+        """Predict with the sequences returned by get_predict_data()"""
+        return self.cnn_model.predict(predict_sequences).ravel()
 
 
 @forecast_model(name='rnn')
@@ -546,105 +834,52 @@ class RNNModel(ModelBase):
         self.rnn_model = Model(inputs=inputs, outputs=outputs)
         self.rnn_model.compile(loss='mse', optimizer='adam')
 
-    @staticmethod
-    def __prepare_train_data(window_length, X_train, y_train):
-        """
-        Prepare training data for a neural network.
-
-        This function splits the provided training data into training and validation sets and organizes them into
-        sequences with the given window length suitable for training a CNN or RNN model. For each to be predicted
-        timestep, a window is used as features. The resulting sequences and targets are converted to numpy arrays with
-        float32 data type.
+        # buffers of the input sequences
+        self.sequences = SequenceBuffer()
 
-        Parameters:
-            window_length (int): The length of the input sequences as features.
-            X_train (pandas.DataFrame): The training input data, typically a DataFrame.
-            y_train (pandas.Series): The training target data, typically a Series.
-
-        Returns:
-            train_sequences (numpy.ndarray): Sequences of training data with shape (num_samples, window_length,
-            num_features).
-            train_targets (numpy.ndarray): Target values corresponding to the training sequences.
-            val_sequences (numpy.ndarray): Sequences of validation data with shape (num_samples, window_length,
-            num_features).
-            val_targets (numpy.ndarray): Target values corresponding to the validation sequences.
-        """
-        # split train and test data
-        X_train, X_test, y_train, y_test = train_test_split(X_train, y_train, test_size=0.2, shuffle=False)
-
-        seq_length = window_length
-        target_length = 1
-
-        train_sequences = []
-        train_targets = []
-        for i in range(seq_length, len(X_train) - target_length + 1):
-            train_sequences.append(X_train.iloc[i - seq_length:i, :])
-            train_targets.append(y_train.iloc[i:i + target_length])
-
-        val_sequences = []
-        val_targets = []
-        for i in range(seq_length, len(X_test) - target_length + 1):
-            val_sequences.append(X_test.iloc[i - seq_length:i, :])
-            val_targets.append(y_test.iloc[i:i + target_length])
-
-        train_sequences = np.array([np.array(train_sequence) for train_sequence in train_sequences]).astype('float32')
-        train_targets = np.array([np.array(train_target) for train_target in train_targets]).astype('float32')
-        val_sequences = np.array([np.array(val_sequence) for val_sequence in val_sequences]).astype('float32')
-        val_targets = np.array([np.array(val_target) for val_target in val_targets]).astype('float32')
-
-        return train_sequences, train_targets, val_sequences, val_targets
-
-    @staticmethod
-    def __prepare_predict_data(window_length, X_predict):
+    def fit(self, current_ts, days, window_length, epoch, **kwargs):
         """
-        Prepare prediction data for a neural network. Similar to self.__prepare_train_data, but only for features.
-
-        Parameters:
-            window_length (int): The length of the input sequences as features.
-            X_predict (pandas.DataFrame): The input data for prediction, typically a DataFrame.
+        Prepare features and targets for fitting and fit the neural network.
 
-        Returns:
-            predict_sequences (numpy.ndarray): Sequences of input data for prediction with shape (num_samples,
-            window_length, num_features).
+        Args:
+            current_ts: Current timestep when making the fitting.
+            days: Past days that are used to fit the random forest regressor.
+            window_length: The length of the input sequences as features.
+            epoch: Number of epochs for fitting.
 
         """
-        seq_length = window_length
-        target_length = 1
-
-        predict_sequences = []
-        for i in range(seq_length, len(X_predict) - target_length + 1):
-            predict_sequences.append(X_predict.iloc[i - seq_length:i, :])
+        self.fit_data(self.get_fit_data(self.train_data, current_ts=current_ts, days=days,
+                                        window_length=window_length), epoch=epoch)
 
-        predict_sequences = np.array([np.array(predict_sequence) for predict_sequence in predict_sequences])\
-                              .astype('float32')
-
-        return predict_sequences
-
-    def fit(self, current_ts, days, window_length, epoch, **kwargs):
+    def get_fit_data(self, train_data, current_ts, days, window_length, **kwargs) -> list[tuple]:
         """
-        Prepare features and targets for fitting and fit the neural network.
+        Prepare features and targets of the given train data for fitting.
 
         The past actual (c.TC_TIMESTAMP == c.TC_TIMESTEP) feature data except c.TC_TIMESTAMP and c.TC_TIMESTEP columns
         will be taken as features. The past target data except c.TC_TIMESTAMP column will be taken as target. Both
         target and features data will be converted to sequences with the given window length in form of numpy arrays
         (since keras does not support polars yet), each features' sequence matches one target timestep. The length of
-        the taken features data from self.train_data[c.K_FEATURES] is "window_length" longer than the taken target, the
-        actual feature sequences for fitting returned from self.__prepare_train_data is as long as the returned target
-        for fitting.
+        the taken features data from train_data[c.K_FEATURES] is "window_length" longer than the taken target, the
+        actual feature sequences for fitting returned from self.sequences.get_train_data is as long as the returned
+        target for fitting.
 
         Args:
+            train_data: train data of the plant (this model's or another plant's, see GlobalModels).
             current_ts: Current timestep when making the fitting.
             days: Past days that are used to fit the random forest regressor.
             window_length: The length of the input sequences as features.
-            epoch: Number of epochs for fitting.
+
+        Returns:
+            data: list with tuples of features and targets for training and validation (the arrays are buffers that
+            are overwritten by the next call).
 
         """
         # slice target for training
-        target = f.slice_dataframe_between_times(target_df=self.train_data[c.K_TARGET], reference_ts=current_ts,
+        target = f.slice_dataframe_between_times(target_df=train_data[c.K_TARGET], reference_ts=current_ts,
                                                  duration=(-days), unit='day')
         # slice features for training
         filter_condition = (pl.col(c.TC_TIMESTAMP) == pl.col(c.TC_TIMESTEP))  # take only actual past weather data
-        features_all = self.train_data[c.K_FEATURES].filter(filter_condition)
+        features_all = train_data[c.K_FEATURES].filter(filter_condition)
         features = f.slice_dataframe_between_times(target_df=features_all, reference_ts=current_ts, duration=(-days),
                                                    unit='day')
 
@@ -652,15 +887,15 @@ class RNNModel(ModelBase):
         target = target.drop(c.TC_TIMESTAMP)
         features = features.drop(c.TC_TIMESTAMP, c.TC_TIMESTEP)
 
-        # convert data into pandas, since sklearn only takes pandas for now
-        target = target.to_pandas()
-        features = features.to_pandas()
-
         # convert data dimension to 3d
-        train_sequences, train_targets, val_sequences, val_targets = self.__prepare_train_data(window_length, features,
-                                                                                               target)
+        train_sequences, train_targets, val_sequences, val_targets = self.sequences.get_train_data(window_length,
+                                                                                                   features, target)
 
-        # fitting
+        return [(train_sequences, train_targets), (val_sequences, val_targets)]
+
+    def fit_data(self, data: list[tuple], epoch, **kwargs):
+        """Fit the neural network with the data returned by get_fit_data()"""
+        (train_sequences, train_targets), (val_sequences, val_targets) = data
         self.rnn_model.fit(train_sequences, train_targets, epochs=epoch, validation_data=(val_sequences, val_targets))
 
     def predict(self, current_ts, length_to_predict, window_length, **kwargs):
@@ -680,12 +915,38 @@ class RNNModel(ModelBase):
         Returns:
             forecast: Forecast result as Dataframe.
 
+        """
+        # predict and convert result to polars Dataframe
+        forecast = self.predict_data(self.get_predict_data(self.train_data, current_ts=current_ts,
+                                                           length_to_predict=length_to_predict,
+                                                           window_length=window_length))
+        plant_id = self.train_data[c.K_TARGET].columns  # get column name for result
+        plant_id.remove(c.TC_TIMESTAMP)
+        forecast = pl.DataFrame({plant_id[0]: forecast.ravel()})
+
+        return forecast
+
+    def get_predict_data(self, train_data, current_ts, length_to_predict, window_length, **kwargs) -> np.ndarray:
+        """
+        Prepare the forecasted (take c.TC_TIMESTEP as time index) features of the given train data as sequences for
+        prediction.
+
+        Args:
+            train_data: train data of the plant (this model's or another plant's, see GlobalModels).
+            current_ts: Current timestep when making the prediction.
+            length_to_predict: How long in the future should be covered in the resulting forecast of this model. Unit:
+            seconds.
+            window_length: The length of the input sequences as features.
+
+        Returns:
+            predict_sequences: sequences for prediction (a buffer that is overwritten by the next call).
+
         """
         # calculate train data resolution first
-        resolution = f.calculate_time_resolution(self.train_data[c.K_TARGET])
+        resolution = f.calculate_time_resolution(train_data[c.K_TARGET])
 
         # slice features for prediction
-        features = f.slice_dataframe_between_times(target_df=self.train_data[c.K_FEATURES], reference_ts=current_ts,
+        features = f.slice_dataframe_between_times(target_df=train_data[c.K_FEATURES], reference_ts=current_ts,
                                                    duration=0)  # get data at current ts
 
         # set future time steps as 'index'
@@ -694,19 +955,12 @@ class RNNModel(ModelBase):
                                                    duration=length_to_predict + resolution * window_length)
         features = features.drop(c.TC_TIMESTAMP, c.TC_TIMESTEP)  # delete time columns for prediction
 
-        # convert data into pandas, since sklearn only takes pandas for now
-        features = features.to_pandas()
-
         # convert features to 3d array
-        predict_sequences = self.__prepare_predict_data(window_length, features)
+        return self.sequences.get_sequences('predict', self.sequences.to_array(features), window_length)
 
-        # predict and convert result to polars Dataframe
-        forecast = self.rnn_model.predict(predict_sequences)
-        plant_id = self.train_data[c.K_TARGET].columns    # get column name for result
-        plant_id.remove(c.TC_TIMESTAMP)
-        forecast = pl.DataFrame({plant_id[0]: forecast.ravel()})
-
-        return forecast
+    def predict_data(self, predict_sequences: np.ndarray, **kwargs) -> np.ndarray:
+        """Predict with the sequences returned by get_predict_data()"""
+        return self.rnn_model.predict(predict_sequences).ravel()
 
 
 @forecast_model(name='arima')
@@ -786,6 +1040,53 @@ class WeatherModel(ModelBase):
             temperature_model_parameters=temperature_model_parameters
         )
 
+        # get weather data, solar position and location (shared by all pv plants)
+        weather, location = WEATHER_INPUTS.get(self.train_data[c.K_FEATURES],
+                                               (c.P_PV, self.__get_location_key(), current_ts, length_to_predict),
+                                               lambda: self.__prepare_pv_inputs(current_ts, length_to_predict))
+        weather = weather.copy()
+
+        # create calculation model for the given pv system and location
+        mc = pvlib.modelchain.ModelChain(system, location)
+
+        # calculate model under given weather data and get output ac power from it
+        mc.run_model(weather)
+        power = mc.results.ac
+
+        # calculate nominal power
+        nominal_power = module['Impo'] * module['Vmpo']
+
+        # set time index to origin timestamp
+        power.index = weather[c.TC_TIMESTAMP]
+        power.index.name = c.TC_TIMESTAMP
+
+        # rename and round data column
+        power.rename(c.ET_ELECTRICITY, inplace=True)
+        power = power.to_frame()
+
+        # calculate and round power
+        power = power / nominal_power * plant['sizing']['power']
+        power = power.round().astype(int)
+
+        # replace all negative values
+        power[power < 0] = 0
+
+        # get column name
+        plant_column = self.train_data[c.K_TARGET].columns
+        plant_column.remove(c.TC_TIMESTAMP)
+        column_name = plant_column[0]
+
+        return pl.DataFrame(power).rename({'power': column_name})
+
+    def __prepare_pv_inputs(self, current_ts, length_to_predict):
+        """
+        Prepare the weather data with dni and the location with the solar position for the pv model.
+
+        Returns:
+            weather: weather data in pvlib format with utc time index.
+            location: pvlib Location object with the solar position of the weather data.
+
+        """
         # get location data
         location = self.train_data['general_config']['location']
         latitude = location['latitude']
@@ -833,74 +1134,31 @@ class WeatherModel(ModelBase):
         # calculate dni with solar position
         weather.loc[:, c.TC_DNI] = (weather[c.TC_GHI] - weather[c.TC_DHI]) / np.cos(solpos['zenith'])
 
-        # get location data and create corresponding pvlib Location object
-        location = Location(
+        # get location data and create corresponding pvlib Location object (the model chain uses the same solar
+        # position, since it is calculated with the same times, temperature and pressure)
+        location = SolarPositionLocation(
+            solpos,
             latitude,
             longitude,
             name=name,
             altitude=altitude
         )
 
-        # create calculation model for the given pv system and location
-        mc = pvlib.modelchain.ModelChain(system, location)
-
-        # calculate model under given weather data and get output ac power from it
-        mc.run_model(weather)
-        power = mc.results.ac
+        return weather, location
 
-        # calculate nominal power
-        nominal_power = module['Impo'] * module['Vmpo']
-
-        # set time index to origin timestamp
-        power.index = weather[c.TC_TIMESTAMP]
-        power.index.name = c.TC_TIMESTAMP
-
-        # rename and round data column
-        power.rename(c.ET_ELECTRICITY, inplace=True)
-        power = power.to_frame()
-
-        # calculate and round power
-        power = power / nominal_power * plant['sizing']['power']
-        power = power.round().astype(int)
-
-        # replace all negative values
-        power[power < 0] = 0
-
-        # get column name
-        plant_column = self.train_data[c.K_TARGET].columns
-        plant_column.remove(c.TC_TIMESTAMP)
-        column_name = plant_column[0]
-
-        return pl.DataFrame(power).rename({'power': column_name})
+    def __get_location_key(self) -> tuple:
+        """Get the location of the plant as key for the shared weather inputs"""
+        location = self.train_data['general_config']['location']
+        return location['latitude'], location['longitude'], location['altitude'], location[c.TC_NAME]
 
     def __wind_model(self, current_ts, length_to_predict):
         # get spec file
         specs = self.train_data['specs']
 
-        # get forecasted weather data
-        weather = f.slice_dataframe_between_times(target_df=self.train_data[c.K_FEATURES], reference_ts=current_ts,
-                                                  duration=0)
-        weather = weather.with_columns(pl.col(c.TC_TIMESTEP).alias(c.TC_TIMESTAMP))
-        weather = f.slice_dataframe_between_times(target_df=weather, reference_ts=current_ts,
-                                                  duration=length_to_predict)
-        weather = weather.to_pandas()
-
-        # convert time data to datetime
-        time = pd.DatetimeIndex(pd.to_datetime(weather[c.TC_TIMESTAMP], unit='s', utc=True))
-        weather.index = time
-        weather.index.name = None
-
-        # delete unnecessary columns and rename
-        weather = weather[[c.TC_TIMESTAMP, c.TC_TEMPERATURE, c.TC_TEMPERATURE_FEELS_LIKE, c.TC_PRESSURE, c.TC_HUMIDITY,
-                           c.TC_WIND_SPEED, c.TC_WIND_DIRECTION]]
-        weather.rename(columns={c.TC_TEMPERATURE: 'temperature'}, inplace=True)
-
-        if 'roughness_length' not in weather.columns:
-            weather['roughness_length'] = 0.15
-
-        # generate height level hard-coded
-        weather.columns = pd.MultiIndex.from_tuples(tuple(zip(weather.columns, [2, 2, 2, 2, 2, 2, 2, 10, 10, 2])),
-                                                    names=('', 'height'))
+        # get forecasted weather data (shared by all wind plants)
+        weather = WEATHER_INPUTS.get(self.train_data[c.K_FEATURES], (c.P_WIND, current_ts, length_to_predict),
+                                     lambda: self.__prepare_wind_inputs(current_ts, length_to_predict))
+        weather = weather.copy()
 
         # get nominal power
         nominal_power = specs['nominal_power']
@@ -947,6 +1205,41 @@ class WeatherModel(ModelBase):
 
         return pl.DataFrame(power).rename({'power': column_name})
 
+    def __prepare_wind_inputs(self, current_ts, length_to_predict):
+        """
+        Prepare the weather data for the wind model.
+
+        Returns:
+            weather: weather data in windpowerlib format with utc time index and height levels.
+
+        """
+        # get forecasted weather data
+        weather = f.slice_dataframe_between_times(target_df=self.train_data[c.K_FEATURES], reference_ts=current_ts,
+                                                  duration=0)
+        weather = weather.with_columns(pl.col(c.TC_TIMESTEP).alias(c.TC_TIMESTAMP))
+        weather = f.slice_dataframe_between_times(target_df=weather, reference_ts=current_ts,
+                                                  duration=length_to_predict)
+        weather = weather.to_pandas()
+
+        # convert time data to datetime
+        time = pd.DatetimeIndex(pd.to_datetime(weather[c.TC_TIMESTAMP], unit='s', utc=True))
+        weather.index = time
+        weather.index.name = None
+
+        # delete unnecessary columns and rename
+        weather = weather[[c.TC_TIMESTAMP, c.TC_TEMPERATURE, c.TC_TEMPERATURE_FEELS_LIKE, c.TC_PRESSURE, c.TC_HUMIDITY,
+                           c.TC_WIND_SPEED, c.TC_WIND_DIRECTION]]
+        weather.rename(columns={c.TC_TEMPERATURE: 'temperature'}, inplace=True)
+
+        if 'roughness_length' not in weather.columns:
+            weather['roughness_length'] = 0.15
+
+        # generate height level hard-coded
+        weather.columns = pd.MultiIndex.from_tuples(tuple(zip(weather.columns, [2, 2, 2, 2, 2, 2, 2, 10, 10, 2])),
+                                                    names=('', 'height'))
+
+        return weather
+
     def __hp_model(self, current_ts, length_to_predict):
 
         raise NotImplementedError('HP model cannot forecast using weather yet.')
@@ -1104,9 +1397,9 @@ class ArrivalModel(ModelBase):
 
         """
         # get availability at current timestep
-        current_availability = f.calculate_timedelta(target_df=self.train_data[c.K_TARGET], reference_ts=current_ts)\
-                                .filter(pl.col('timedelta') == 0).select(self.ev_id + '_availability')\
-                                .item()
+        current_availability = f.slice_dataframe_between_times(target_df=self.train_data[c.K_TARGET],
+                                                               reference_ts=current_ts, duration=0)\
+                                .select(self.ev_id + '_availability').item()
 
         # first, get perfect forecast
         forecast = f.slice_dataframe_between_times(target_df=self.train_data[c.K_TARGET], reference_ts=current_ts,
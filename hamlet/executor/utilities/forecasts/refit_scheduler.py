@@ -0,0 +1,103 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+class RefitScheduler:
+    """
+    Scheduler that fits the next version of forecast models in background threads.
+
+    Instead of refitting a model within the agent step at the refit timestamp, the forecaster schedules the fit of a
+    new model version a while before the refit timestamp. The new version is fitted with the data up to the refit
+    timestamp, as it would be at the refit timestamp itself. At the refit timestamp, the forecaster collects the new
+    version and replaces the old one with it. If the fit is not finished yet, the forecaster either waits for it or
+    keeps using the old version for a limited time (staleness).
+
+    The pending fits are kept per process and are not pickled with the forecasters. If an agent is executed in another
+    process at the refit timestamp, the model is fitted synchronously as before. The fits only create and fit the new
+    model version in the background. Everything else (e.g. recording the fit in the forecast metrics) is done by the
+    forecaster when it collects the result.
+
+    Attributes:
+        max_workers: maximum number of threads that fit models (set by the forecasters, see update_max_workers()).
+        executor: thread pool that fits the models (created on first use).
+        pending: scheduled fits in the format {key: (refit timestamp, future)}.
+
+    """
+    MAX_WORKERS = 2
+
+    def __init__(self, max_workers: int = MAX_WORKERS):
+        self.max_workers = max_workers
+        self.executor = None
+        self.pending = {}
+
+    def update_max_workers(self, max_workers: int):
+        """Updates the number of threads (only possible as long as the threads have not been started)"""
+        if self.executor is None and max_workers > 0:
+            self.max_workers = max_workers
+
+    def schedule(self, key: tuple, refit_ts, fit: Callable):
+        """
+        Schedule the fit of the next model version unless a fit of the model is already scheduled.
+
+        Args:
+            key: key of the model, e.g. agent id and plant id.
+            refit_ts: timestamp at which the new version replaces the old one.
+            fit: function that creates and fits the new model version and returns the result (e.g. the model).
+
+        """
+        # a pending version needs to be collected first
+        if key in self.pending:
+            return
+
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='refit')
+        self.pending[key] = (refit_ts, self.executor.submit(fit))
+
+    def get_refit_ts(self, key: tuple):
+        """Get the refit timestamp of the scheduled fit of the model (None if no fit is scheduled)"""
+        scheduled_ts, _ = self.pending.get(key, (None, None))
+        return scheduled_ts
+
+    def collect(self, key: tuple, wait: bool):
+        """
+        Collect the result of the scheduled fit.
+
+        Args:
+            key: key of the model.
+            wait: whether to wait for the fit if it is not finished yet.
+
+        Returns:
+            result: the result of the fit function (None if no fit is scheduled or it is not finished yet).
+
+        """
+        _, future = self.pending.get(key, (None, None))
+        if future is None or not (wait or future.done()):
+            return None
+
+        del self.pending[key]
+        return future.result()     # errors of the fit are raised here
+
+    def cancel(self, key: tuple):
+        """Cancel the scheduled fit of the model (e.g. because its train data changed)"""
+        _, future = self.pending.pop(key, (None, None))
+        if future is not None:
+            future.cancel()
+
+    def clear(self):
+        """Cancel all scheduled fits and shut down the threads"""
+        for _, future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+# fits scheduled by all forecasters of this process
+REFIT_SCHEDULER = RefitScheduler()
@@ -6,13 +6,19 @@ __email__ = "markus.doepfert@tum.de"
 
 import os
 import pickle
+
+import polars as pl
+
 import hamlet.constants as c
 from hamlet import functions as f
 from hamlet.executor.agents.agent import Agent
 from hamlet.executor.utilities.database.agent_db import AgentDB
 from hamlet.executor.utilities.database.market_db import MarketDB
+from hamlet.executor.utilities.database.result_sink import ResultSink
+from hamlet.executor.utilities.forecasts.forecast_metrics import ForecastMetrics
 from hamlet.executor.utilities.forecasts.forecaster import Forecaster
 from hamlet.executor.utilities.tasks_execution.process_pool import ProcessPool
+from hamlet.executor.utilities.tasks_execution.shared_memory import attach_frame, release_frames
 
 
 # Define the function to be executed in parallel
@@ -30,6 +36,24 @@ def task(agent_data):
     return agent_db
 
 
+# Define the function to be executed in parallel if the data is transferred via shared memory
+def task_shared_memory(agent_data):
+    # Prepare agent data
+    agent_type, agent_id, region_tasks, region_path, data = agent_data
+    # Detach the shared memory blocks of previous tasks that are not needed anymore
+    release_frames(keep=get_shared_memory_names(data))
+    agent_db = init_agentdb_from_shared_memory(agent_type, agent_id, region_path, data)
+    market_db = get_markets_from_shared_memory(region_path, data['markets'])
+    add_forecaster_from_shared_memory(agent_db, market_db, data)
+    # Initialize and execute the agent instance
+    checkpoint = agent_db.create_checkpoint()
+    agent = Agent(agent_type=agent_type, data=agent_db, timetable=region_tasks, market=market_db,
+                  grid_commands=data['grid_commands'])
+    agent_db = agent.execute()
+    # Only return the changed data
+    return agent_db.get_changes(checkpoint, window=get_update_window(region_tasks))
+
+
 def init_agentdb(agent_type, agent_id, region_path):
     """Initializes agent database"""
     agent_path = os.path.join(region_path, 'agents', agent_type, agent_id)
@@ -66,6 +90,10 @@ def add_forecaster(agent_db, market_db, market_type, region_path):
     #  we need to load it here correctly
     with open(os.path.join(agent_db.agent_save, 'forecaster_train.pickle'), 'rb') as handle:
         forecaster.train_data = pickle.load(handle)
+    # Continue the metrics of the previous tasks
+    metrics_path = os.path.join(agent_db.agent_save, ForecastMetrics.FILE)
+    if os.path.exists(metrics_path):
+        forecaster.metrics = ForecastMetrics.from_frame(ResultSink.read(metrics_path))
 
     agent_db.forecaster = forecaster  # register
 
@@ -82,6 +110,63 @@ def load_general(path):
     return general
 
 
+def init_agentdb_from_shared_memory(agent_type, agent_id, region_path, data):
+    """Initializes agent database with the tables attached from shared memory"""
+    agent_path = os.path.join(region_path, 'agents', agent_type, agent_id)
+    agent_db = AgentDB(path=agent_path,
+                       agent_type=agent_type,
+                       agent_id=agent_id)
+    agent_db.agent_save = agent_path
+    agent_db.account = data[c.K_ACCOUNT]
+    agent_db.plants = data[c.K_PLANTS]
+    agent_db.specs = data['specs']
+    for table, handle in data['tables'].items():
+        setattr(agent_db, table, attach_frame(handle))
+    return agent_db
+
+
+def get_markets_from_shared_memory(region_path, markets):
+    """Gets market databases with the tables attached from shared memory"""
+    market_db = {}
+    for market_type, market_names in markets.items():
+        market_db[market_type] = {}
+        for market_name, handles in market_names.items():
+            market = MarketDB(market_type=market_type,
+                              name=market_name,
+                              market_path=os.path.join(region_path, 'markets', market_type, market_name),
+                              retailer_path=os.path.join(region_path, 'retailers', market_type, market_name))
+            for table, handle in handles.items():
+                setattr(market, table, attach_frame(handle))
+            market_db[market_type][market_name] = market
+    return market_db
+
+
+def add_forecaster_from_shared_memory(agent_db, market_db, data):
+    """Adds agent forecaster with the train data attached from shared memory to the agent database"""
+    general = {key: attach_frame(handle) for key, handle in data['general'].items() if key != c.K_GENERAL}
+    general[c.K_GENERAL] = data['general'][c.K_GENERAL]
+    markets = {market_name: market for market_names in market_db.values()
+               for market_name, market in market_names.items()}
+    forecaster = Forecaster(agentDB=agent_db, marketsDB=markets, general=general)
+    forecaster.init_forecaster()
+    # Replace the train data with the current one of the main process
+    for key, handles in data['forecaster'].items():
+        for data_type, handle in handles.items():
+            forecaster.update_forecaster(id=key, dataframe=attach_frame(handle), target=data_type == c.K_TARGET)
+
+    agent_db.forecaster = forecaster  # register
+
+
+def get_shared_memory_names(data):
+    """Gets the names of all shared memory blocks used by the task"""
+    handles = list(data['tables'].values())
+    handles += [handle for key, handle in data['general'].items() if key != c.K_GENERAL]
+    handles += [handle for market_names in data['markets'].values() for tables in market_names.values()
+                for handle in tables.values()]
+    handles += [handle for tables in data['forecaster'].values() for handle in tables.values()]
+    return {name for name, _ in handles}
+
+
 def get_grid_restriction_commands(region_path):
     """Load grid restriction commands."""
     grid_restriction_commands = {}
@@ -95,13 +180,23 @@ def get_grid_restriction_commands(region_path):
     return grid_restriction_commands
 
 
+def get_update_window(region_tasks):
+    """Gets the first and last timestamp of the rows in the time tables of the agents that can change in this
+    timestamp (the controllers update the row of the next timestep)"""
+    timestamp = region_tasks.select(pl.first(c.TC_TIMESTAMP)).item()
+    timesteps = region_tasks.select(pl.col(c.TC_TIMESTEP).unique().sort()).to_series()
+    delta = timesteps[1] - timesteps[0] if len(timesteps) > 1 else timesteps[0] - timestamp
+
+    return timestamp, max(timesteps[-1], timestamp + delta)
+
+
 class AgentPool(ProcessPool):
     """
     A class to manage the agents multiprocessing pool
 
     Attributes:
         num_workers (int): the number of processes to spawn
-        task: method to execute in parallel
+        task: method to execute in parallel (depends on whether the data is transferred via shared memory)
     """
-    def __init__(self, num_workers: int):
-        super().__init__(num_workers, task)
+    def __init__(self, num_workers: int, shared_memory: bool = False):
+        super().__init__(num_workers, task_shared_memory if shared_memory else task)
@@ -10,7 +10,11 @@ import polars as pl
 
 import hamlet.constants as c
 from hamlet.executor.agents.agent import Agent
+from hamlet.executor.utilities.controller.fbc.mpc.poi.mpc_batch import MpcBatch
+from hamlet.executor.utilities.database.agent_db import AgentDB
 from hamlet.executor.utilities.tasks_execution.agent_pool import AgentPool
+from hamlet.executor.utilities.tasks_execution.shared_memory import SharedFrameStore
+from hamlet.executor.utilities.tasks_execution.sticky_agent_pool import AgentShard, StickyAgentPool
 from hamlet.executor.utilities.tasks_execution.task_executioner import TaskExecutioner
 
 
@@ -21,51 +25,261 @@ class AgentTaskExecutioner(TaskExecutioner):
     Attributes:
         database (Database): database instance
         num_workers (int): number of workers
-        pool (AgentPool): agents pool instance if multiprocessing is enabled, None otherwise
+        sticky (bool): if True, the agents are kept resident in the worker processes for the whole simulation
+        transport (str): how the data is transferred to the AgentPool workers ('files' or 'shared_memory')
+        shared_store (SharedFrameStore): store of the dataframes in shared memory if transport is 'shared_memory'
+        pool (AgentPool | StickyAgentPool): agents pool instance if multiprocessing is enabled, None otherwise
+        local_shard (AgentShard): agents of the fast-forward mode if multiprocessing is disabled
+        batch_mpc (bool): if True, the poi mpc controllers of the agents of a region that are executed in one process
+            are solved as one problem and their rule-based fbc controllers are computed together (see MpcBatch)
         results_path (str): results path
     """
-    def __init__(self, database, num_workers):
+    TRANSPORTS = ('files', 'shared_memory')
+
+    def __init__(self, database, num_workers, sticky: bool = False, transport: str = 'files',
+                 batch_mpc: bool = False):
         super().__init__(database, num_workers)
+        if transport not in self.TRANSPORTS:
+            raise ValueError(f'Transport {transport} not available. Available transports: {self.TRANSPORTS}')
+        self.sticky = sticky
+        self.transport = transport
+        self.shared_store = SharedFrameStore() if transport == 'shared_memory' else None
+        self.local_shard = None
+        self.batch_mpc = batch_mpc
         # Setup up the tasks_execution pool for parallelization
         if self.num_workers > 1:
-            self.pool = AgentPool(self.num_workers)
+            if self.sticky:
+                self.pool = StickyAgentPool(self.num_workers)
+            else:
+                self.pool = AgentPool(self.num_workers, shared_memory=self.shared_store is not None)
+
+    def execute(self, tasks):
+        """Executes input tasks"""
+        # Use the default execution if the agents are not resident in the workers
+        if not self.sticky or self.num_workers == 1 or self.pool is None:
+            return super().execute(tasks)
+
+        self.register_sticky_region(tasks)
+
+        # Execute the agents in the workers
+        deltas = self.pool.execute(self.prepare_sticky_tasks(tasks))
+
+        # Update agents data in database
+        region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
+        self.database.post_agent_deltas_to_region(region=region_name, deltas=deltas)
+
+    def execute_regions(self, tasks_list):
+        """Executes the input tasks of several regions together (the regions are independent)"""
+        # Use the default execution if the agents are not resident in the workers
+        if not self.sticky or self.num_workers == 1 or self.pool is None:
+            return super().execute_regions(tasks_list)
+
+        for tasks in tasks_list:
+            self.register_sticky_region(tasks)
+
+        # Execute the agents of all regions in the workers
+        deltas = self.pool.execute_many([self.prepare_sticky_tasks(tasks) for tasks in tasks_list])
+
+        # Update agents data in database
+        for tasks, region_deltas in zip(tasks_list, deltas):
+            region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
+            self.database.post_agent_deltas_to_region(region=region_name, deltas=region_deltas)
+
+    def execute_block(self, timestamps: list):
+        """
+        Executes the agents of all regions through a block of timestamps (fast-forward mode).
+
+        The markets are cleared by the agents themselves as they only trade with the retailer (clearing method 'none').
+        The market results are afterward posted for each timestamp of the block.
+
+        Args:
+            timestamps: list of the tasks of each timestamp of the block.
+        """
+        if self.pool is not None and not self.sticky:
+            raise ValueError('The fast-forward mode requires sticky workers.')
+
+        # Split the tasks of each timestamp by region
+        regions = {}
+        for timestamp in timestamps:
+            for region_tasks in timestamp.partition_by(c.TC_REGION):
+                region_name = str(region_tasks.select(pl.first(c.TC_REGION)).item())
+                regions.setdefault(region_name, []).append(region_tasks)
+
+        task_args_list = [self.prepare_block_tasks(region_name, tasks_list)
+                          for region_name, tasks_list in regions.items()]
+
+        # Execute the agents in the workers or in the main process if multiprocessing is disabled
+        if self.num_workers == 1 or self.pool is None:
+            results = []
+            for task_args in task_args_list:
+                self.register_local_region(task_args['region'])
+                results.append(self.local_shard.execute_block(**task_args))
+        else:
+            for tasks_list in regions.values():
+                self.register_sticky_region(tasks_list[0])
+            results = self.pool.execute_blocks(task_args_list)
+
+        # Update agents and markets data in database
+        for task_args, (deltas, markets) in zip(task_args_list, results):
+            region_name = task_args['region']
+            self.database.post_agent_deltas_to_region(region=region_name, deltas=deltas)
+            for tasks, markets_of_timestamp in zip(task_args['tasks_list'], markets):
+                timestamp = tasks.select(pl.first(c.TC_TIMESTAMP)).item()
+                self.database.post_markets_to_region(region=region_name, markets=markets_of_timestamp,
+                                                     timestamp=timestamp, path_results=self.results_path)
+
+    def prepare_block_tasks(self, region_name, tasks_list):
+        """Prepares the data of a block of timestamps for the resident agents"""
+        return {'region': region_name,
+                'tasks_list': tasks_list,
+                'market_transactions': self.get_market_transactions(region_name),
+                'local_market_prices': self.database.get_local_market_prices(region=region_name),
+                'results_path': self.results_path,
+                'batch_mpc': self.batch_mpc}
+
+    def register_local_region(self, region_name):
+        """Registers the agents of the region in the local shard if not done yet (fast-forward without workers)"""
+        if self.local_shard is None:
+            self.local_shard = AgentShard()
+        if region_name not in self.local_shard.agents:
+            # The local market prices are applied by the shard from now on
+            self.database.set_remote_forecasters(True)
+            agents = self.database.get_agent_data(region=region_name)
+            self.local_shard.register(region=region_name,
+                                      agents=[agent_db for agents_of_type in agents.values()
+                                              for agent_db in agents_of_type.values()],
+                                      markets=self.database.get_market_data(region=region_name))
+
+    def register_sticky_region(self, tasks):
+        """Transfers the agents of the region to the sticky workers if not done yet"""
+        region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
+        if not self.pool.is_registered(region_name):
+            # The forecasters are updated in the workers from now on
+            self.database.set_remote_forecasters(True)
+            self.pool.register(region=region_name, agents=self.database.get_agent_data(region=region_name),
+                               markets=self.database.get_market_data(region=region_name))
 
     def prepare_para_tasks(self, tasks):
         """Prepares tasks for parallel execution"""
+        if self.shared_store is not None:
+            return self.prepare_shared_memory_tasks(tasks)
         region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
         agents_data = self.database.get_agent_data(region=region_name)
         all_type_agents = [(agent_type, agent_id, tasks, self.results_path) for agent_type, agents in
                            agents_data.items() for agent_id in agents]
         return all_type_agents
 
+    def prepare_shared_memory_tasks(self, tasks):
+        """Prepares tasks for parallel execution with the data placed in shared memory"""
+        region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
+        store = self.shared_store
+
+        # General data (only written once as it does not change)
+        general = self.database.get_general_data()
+        general_data = {key: store.put(('general', key), general[key])
+                        for key in (c.K_WEATHER, c.K_RETAILER, c.K_TASKS)}
+        general_data[c.K_GENERAL] = general[c.K_GENERAL]
+
+        # Market data
+        markets_data = {}
+        for market_type, markets in self.database.get_market_data(region=region_name).items():
+            markets_data[market_type] = {}
+            for market_name, market_db in markets.items():
+                slot = (region_name, market_type, market_name)
+                markets_data[market_type][market_name] = {
+                    'retailer': store.put(slot + ('retailer',), market_db.retailer),
+                    'market_transactions': store.put(slot + ('market_transactions',), market_db.market_transactions)}
+
+        grid_commands = self.get_grid_commands()
+
+        # Agent data (tables are only written again if they changed)
+        all_type_agents = []
+        for agent_type, agents in self.database.get_agent_data(region=region_name).items():
+            for agent_id, agent_db in agents.items():
+                slot = (region_name, agent_id)
+                data = {c.K_ACCOUNT: agent_db.account,
+                        c.K_PLANTS: agent_db.plants,
+                        'specs': agent_db.specs,
+                        'tables': {table: store.put(slot + (table,), getattr(agent_db, table))
+                                   for table in AgentDB.TABLES},
+                        'forecaster': {key: {data_type: store.put(slot + (key, data_type), train_data[data_type])
+                                             for data_type in (c.K_TARGET, c.K_FEATURES)
+                                             if isinstance(train_data.get(data_type), pl.DataFrame)}
+                                       for key, train_data in agent_db.forecaster.train_data.items()},
+                        'general': general_data,
+                        'markets': markets_data,
+                        'grid_commands': grid_commands}
+                all_type_agents.append((agent_type, agent_id, tasks, self.results_path, data))
+
+        return all_type_agents
+
+    def save_database_for_workers(self):
+        """Saves the database to file to allow loading inside each process (not needed with shared memory)"""
+        if self.shared_store is None:
+            super().save_database_for_workers()
+
+    def prepare_sticky_tasks(self, tasks):
+        """Prepares the data of the timestamp that is sent to the resident agents in the workers"""
+        region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
+
+        return {'region': region_name,
+                'tasks': tasks,
+                'market_transactions': self.get_market_transactions(region_name),
+                'grid_commands': self.get_grid_commands(),
+                'local_market_prices': self.database.get_local_market_prices(region=region_name),
+                'results_path': self.results_path,
+                'iteration': self.iteration,
+                'batch_mpc': self.batch_mpc}
+
+    def get_market_transactions(self, region_name):
+        """Gets the market transactions of all markets of the region (the only market data the agents need to get
+        from the main process as the other tables do not change there)"""
+        return {market_type: {market_name: market_db.market_transactions for market_name, market_db in markets.items()}
+                for market_type, markets in self.database.get_market_data(region=region_name).items()}
+
     def execute_serial(self, tasks):
         """Executes all agent tasks for all agents sequentially"""
         region_name = str(tasks.select(c.TC_REGION).sample(n=1).item())
         # Get the data of the agents that are part of the tasklist
         agents = self.database.get_agent_data(region=region_name)
 
-        results = []
+        instances = []
 
         # Get the data of the markets that are part of the tasklist
         markets = self.database.get_market_data(region=region_name)
 
         # Get grid restriction commands
-        grid_commands = {}
-        for grid_type, grid in self.database.get_grid_data().items():
-            grid_commands[grid_type] = grid.restriction_commands
+        grid_commands = self.get_grid_commands()
 
-        # Iterate over the agents and execute them sequentially
+        # Iterate over the agents and create an instance of the Agent class for each
         for agent_type, agent in agents.items():
             for agent_id, agent_db in agent.items():
                 # Update save path for agent
                 agent_db.agent_save = os.path.join(self.results_path, 'agents', agent_type, agent_id)
-                # Create an instance of the Agent class and execute its tasks
-                results.append(Agent(agent_type=agent_type, data=agent_db, timetable=tasks, market=markets,
-                                     grid_commands=grid_commands).execute())
-        return results
+                instances.append(Agent(agent_type=agent_type, data=agent_db, timetable=tasks, market=markets,
+                                       grid_commands=grid_commands))
+
+        # Execute the tasks of the agents sequentially (with the mpc controllers solved together if batched)
+        return Agent.execute_all(instances, batch=MpcBatch(region_name) if self.batch_mpc else None)
+
+    def get_grid_commands(self):
+        """Gets the grid restriction commands of all grids"""
+        grid_commands = {}
+        for grid_type, grid in self.database.get_grid_data().items():
+            grid_commands[grid_type] = grid.restriction_commands
+        return grid_commands
 
     def postprocess_results(self, tasks, results):
         """Post-processes the results of all agent tasks"""
         region_name = tasks.select(pl.first(c.TC_REGION)).item()
-        # Update agents data in database
-        self.database.post_agents_to_region(region=region_name, agents=results)
+        # Update agents data in database (the shared memory tasks only return the changes of the agents as dicts)
+        if results and isinstance(results[0], dict):
+            self.database.post_agent_deltas_to_region(region=region_name, deltas=results)
+        else:
+            self.database.post_agents_to_region(region=region_name, agents=results)
+
+    def close_pool(self):
+        """Closes pool and releases the shared memory"""
+        super().close_pool()
+        if self.shared_store is not None:
+            self.shared_store.close()
@@ -7,7 +7,9 @@ __email__ = "markus.doepfert@tum.de"
 import polars as pl
 
 import hamlet.constants as c
+from hamlet.executor.markets.electricity import ElectricityMarket
 from hamlet.executor.markets.market import Market
+from hamlet.executor.utilities.tasks_execution.market_pool import MarketPool
 from hamlet.executor.utilities.tasks_execution.task_executioner import TaskExecutioner
 
 
@@ -18,27 +20,67 @@ class MarketTaskExecutioner(TaskExecutioner):
     Attributes:
         database (Database): database instance
         num_workers (int): number of workers
-        pool (MarketsPool): None since multiprocessing is currently disabled for markets.
+        pool (MarketPool): markets pool instance if multiprocessing is enabled, None otherwise
         results_path (str): results path
     """
     def __init__(self, database, num_workers):
         super().__init__(database, num_workers)
+        # Setup up the tasks_execution pool for parallelization
+        if self.num_workers > 1:
+            self.pool = MarketPool(self.num_workers)
 
     def prepare_para_tasks(self, tasks):
-        """Prepares parallel tasks"""
+        """Prepares parallel tasks
+
+        Each (region, market type, market name, timestep) row is cleared independently. Electricity markets therefore
+        only get the slice of the market, the bids and offers and the grid fees of the row instead of the database.
+        """
         markets_list = []
         for task in tasks.iter_rows(named=True):
             market = self.database.get_market_data(region=task[c.TC_REGION],
                                                    market_type=task[c.TC_MARKET],
                                                    market_name=task[c.TC_NAME])
-            markets_list.append(Market(data=market, tasks=task, database=self.database))
+            if task[c.TC_MARKET] != c.MT_ELECTRICITY:
+                markets_list.append(Market(data=market, tasks=task, database=self.database))
+                continue
+
+            market_slice = market.get_slice(task[c.TC_TIMESTEP])
+            bids_offers = self.database.get_bids_offers(region=task[c.TC_REGION],
+                                                        market_type=task[c.TC_MARKET],
+                                                        market_name=task[c.TC_NAME],
+                                                        timestep=task[c.TC_TIMESTEP])
+            markets_list.append(Market(data=market_slice, tasks=task, database=None, bids_offers=bids_offers,
+                                       grid_fees=self.get_grid_fees(task, market_slice, bids_offers)))
         return markets_list
 
+    def get_grid_fees(self, task, market_slice, bids_offers):
+        """Gets the grid fees of all agents that can be part of the settlement of the task"""
+        # Grid fees are only needed for the settlement
+        if c.MA_SETTLE not in task[c.TC_ACTIONS]:
+            return {}
+
+        # Agents that have bids and offers or transactions in the timestep (retailers are not agents of the region)
+        agent_ids = set(bids_offers.get_column(c.TC_ID_AGENT).unique().to_list())
+        agent_ids.update(market_slice.market_transactions.get_column(c.TC_ID_AGENT).unique().to_list())
+        region_agents = {agent_id for agents in self.database.get_agent_data(region=task[c.TC_REGION]).values()
+                         for agent_id in agents}
+
+        return ElectricityMarket.get_grid_fees(database=self.database, tasks=task, market_name=market_slice.market_name,
+                                               agent_ids=agent_ids & region_agents)
+
+    def save_database_for_workers(self):
+        """The markets get all data with their tasks, therefore the database does not need to be saved"""
+        pass
+
     def execute_serial(self, tasks):
         """Executes serial tasks"""
         results = []
-        # Reuse parallel function to prepare tasks
-        markets = self.prepare_para_tasks(tasks)
+        markets = []
+        for task in tasks.iter_rows(named=True):
+            market = self.database.get_market_data(region=task[c.TC_REGION],
+                                                   market_type=task[c.TC_MARKET],
+                                                   market_name=task[c.TC_NAME])
+            markets.append(Market(data=market, tasks=task, database=self.database))
         for market in markets:
             results.append(market.execute())
         return results
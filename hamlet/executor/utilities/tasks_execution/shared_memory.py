@@ -0,0 +1,121 @@
+__author__ = "HodaHamdy"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+from multiprocessing import shared_memory
+
+import polars as pl
+import pyarrow as pa
+
+# Shared memory blocks attached in this (worker) process in the format {name: SharedMemory}
+_attached = {}
+
+
+def write_frame(df: pl.DataFrame) -> tuple[shared_memory.SharedMemory, tuple]:
+    """
+    Writes the dataframe as Arrow IPC stream into a new shared memory block.
+
+    Returns:
+        block (SharedMemory): the shared memory block (needs to be kept and unlinked by the caller)
+        handle (tuple): name and size of the block to attach it in other processes
+    """
+    table = df.to_arrow()
+
+    # Compute the size of the stream first to write it directly into the block
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    size = sink.size()
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(block.buf)), table.schema) as writer:
+        writer.write_table(table)
+
+    return block, (block.name, size)
+
+
+def attach_frame(handle: tuple) -> pl.DataFrame:
+    """
+    Attaches the dataframe of the given handle without copying its data (if the data types allow it).
+
+    The shared memory block stays attached until release_frames() is called.
+    """
+    name, size = handle
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    buffer = pa.py_buffer(_attached[name].buf)[:size]
+
+    return pl.from_arrow(pa.ipc.open_stream(buffer).read_all(), rechunk=False)
+
+
+def release_frames(keep: set = None):
+    """Detaches all shared memory blocks that are not in keep (blocks that are still in use stay attached)"""
+    keep = keep or set()
+    for name in list(_attached):
+        if name in keep:
+            continue
+        try:
+            _attached[name].close()
+            del _attached[name]
+        except BufferError:
+            # Data of the block is still referenced and can only be released later
+            pass
+
+
+class SharedFrameStore:
+    """
+    A class to place dataframes into shared memory for the worker processes.
+
+    Each dataframe is stored in a slot (e.g. the meters of an agent). A dataframe is only written again if the slot
+    contains a different dataframe than before. Since polars dataframes are not changed in place, unchanged data is
+    thus only written once. The same dataframe in several slots is stored only once.
+
+    Attributes:
+        blocks (dict): shared memory blocks in the format {id(df): [df, block, handle, number of slots]}
+        slots (dict): id of the dataframe of each slot in the format {slot: id(df)}
+    """
+    def __init__(self):
+        self.blocks = {}
+        self.slots = {}
+
+    def put(self, slot, df: pl.DataFrame) -> tuple:
+        """Places the dataframe in the given slot and returns its handle"""
+        key = id(df)
+
+        # Nothing to do if the slot already contains the dataframe
+        if self.slots.get(slot) == key:
+            return self.blocks[key][2]
+
+        # Release the previous dataframe of the slot
+        self.__release(slot)
+
+        # Write the dataframe if it is not yet in shared memory
+        if key not in self.blocks:
+            block, handle = write_frame(df)
+            self.blocks[key] = [df, block, handle, 0]
+        self.blocks[key][3] += 1
+        self.slots[slot] = key
+
+        return self.blocks[key][2]
+
+    def close(self):
+        """Releases all shared memory blocks"""
+        for _, block, _, _ in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+        self.slots = {}
+
+    def __release(self, slot):
+        """Releases the dataframe of the slot and unlinks its block if it is not used by any other slot"""
+        key = self.slots.pop(slot, None)
+        if key is None:
+            return
+
+        self.blocks[key][3] -= 1
+        if self.blocks[key][3] == 0:
+            _, block, _, _ = self.blocks.pop(key)
+            block.close()
+            block.unlink()
@@ -0,0 +1,404 @@
+__author__ = "HodaHamdy"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import os
+import traceback
+from copy import copy
+from multiprocessing import get_context
+
+import polars as pl
+
+import hamlet.constants as c
+from hamlet.executor.agents.agent import Agent
+from hamlet.executor.markets.electricity import ElectricityMarket
+from hamlet.executor.markets.market import Market
+from hamlet.executor.utilities.controller.fbc.mpc.poi.mpc_batch import MpcBatch
+from hamlet.executor.utilities.database.market_db import MarketDB
+from hamlet.executor.utilities.database.region_db import RegionDB
+from hamlet.executor.utilities.tasks_execution.agent_pool import get_update_window
+from hamlet.executor.utilities.tasks_execution.process_pool import ProcessPool
+
+
+class AgentShard:
+    """
+    A class holding the agents that are resident in one worker process of the sticky pool.
+
+    The agents (including their forecasters) are sent to the worker once and are kept in memory for the whole
+    simulation. In each timestamp the worker only receives the information that changed outside the worker (market
+    transactions, grid commands, local market prices) and returns the tables that were changed by the agents.
+
+    Attributes:
+        agents (dict): agents of each region in the format {region: {agent_type: {agent_id: AgentDB}}}
+        markets (dict): markets of each region in the format {region: {market_type: {market_name: MarketDB}}}
+        snapshots (dict): state of the agents at the beginning of the current timestamp for each region
+    """
+    def __init__(self):
+        self.agents = {}
+        self.markets = {}
+        self.snapshots = {}
+
+    def register(self, region: str, agents: list, markets: dict):
+        """Registers the given agents and markets of the region"""
+        region_agents = self.agents.setdefault(region, {})
+        for agent_db in agents:
+            region_agents.setdefault(agent_db.agent_type, {})[agent_db.agent_id] = agent_db
+        self.markets[region] = markets
+
+        # The global forecast models of the region only fit and predict the plants of the resident agents
+        agent_ids = {agent_id for agents_of_type in region_agents.values() for agent_id in agents_of_type}
+        global_models = {id(agent_db.forecaster.global_models): agent_db.forecaster.global_models
+                         for agents_of_type in region_agents.values() for agent_db in agents_of_type.values()
+                         if agent_db.forecaster is not None and agent_db.forecaster.global_models is not None}
+        for models in global_models.values():
+            models.retain(agent_ids)
+
+    def execute(self, region: str, tasks: pl.DataFrame, market_transactions: dict, grid_commands: dict,
+                local_market_prices: dict, results_path: str, iteration: int = 1, batch_mpc: bool = False) -> list:
+        """Executes all agents of the region that are resident in this shard and returns their changes (with
+        batch_mpc, the poi mpc controllers of the agents are solved as one problem)"""
+        agents = self.agents.get(region, {})
+
+        # Update the market transactions with the current ones of the main process
+        markets = self.markets[region]
+        for market_type, market_names in market_transactions.items():
+            for market_name, transactions in market_names.items():
+                markets[market_type][market_name].market_transactions = transactions
+
+        # Apply the local market prices of the last market clearing
+        if local_market_prices:
+            RegionDB.apply_local_market_prices(agents=agents, market_prices=local_market_prices)
+
+        # Store the state of the agents for the first iteration or restore it if the timestamp is repeated
+        if iteration <= 1:
+            self.snapshots[region] = self.__take_snapshot(agents)
+        else:
+            self.__restore_snapshot(agents, self.snapshots[region])
+
+        # Get the window of rows in time-based tables that can change in this timestamp
+        window = get_update_window(tasks)
+
+        entries, instances = [], []
+        for agent_type, agents_of_type in agents.items():
+            for agent_id, agent_db in agents_of_type.items():
+                # Get references to all data before the execution to find out what has changed
+                entries.append((agents_of_type, agent_id, agent_db.create_checkpoint()))
+
+                # Update save path for agent
+                agent_db.agent_save = os.path.join(results_path, 'agents', agent_type, agent_id)
+
+                # Create an instance of the Agent class
+                instances.append(Agent(agent_type=agent_type, data=agent_db, timetable=tasks, market=markets,
+                                       grid_commands=grid_commands))
+
+        # Execute the tasks of the agents
+        results = Agent.execute_all(instances, batch=MpcBatch(region) if batch_mpc else None)
+
+        deltas = []
+        for (agents_of_type, agent_id, checkpoint), agent_db in zip(entries, results):
+            agents_of_type[agent_id] = agent_db
+            deltas.append(agent_db.get_changes(checkpoint, window=window))
+
+        return deltas
+
+    def execute_block(self, region: str, tasks_list: list, market_transactions: dict, local_market_prices: dict,
+                      results_path: str, batch_mpc: bool = False) -> tuple[list, list]:
+        """
+        Executes all agents of the region that are resident in this shard through a block of timestamps.
+
+        This is only possible if no market clears between the agents (clearing method 'none') and no grid is
+        calculated. Each agent then only trades with the retailer so that its bids and offers can be cleared right after
+        its execution without the other agents.
+
+        Returns:
+            deltas (list): changes of the agents during the whole block
+            markets (list): combined market results of the agents for each timestamp of the block
+        """
+        agents = self.agents.get(region, {})
+
+        # Local copies of the markets that collect the transactions of the agents during the block
+        markets = {}
+        for market_type, market_names in self.markets[region].items():
+            markets[market_type] = {}
+            for market_name, market_db in market_names.items():
+                markets[market_type][market_name] = copy(market_db)
+                markets[market_type][market_name].market_transactions = market_transactions[market_type][market_name]
+
+        # Apply the local market prices of the last market clearing
+        if local_market_prices:
+            RegionDB.apply_local_market_prices(agents=agents, market_prices=local_market_prices)
+
+        # Get references to all data before the block to find out what has changed
+        checkpoints = self.__take_snapshot(agents)
+
+        # Get the window of rows in time-based tables that can change in this block
+        windows = [get_update_window(tasks) for tasks in tasks_list]
+        window = (windows[0][0], max(end for _, end in windows))
+
+        market_results = []
+        for tasks in tasks_list:
+            entries, instances = [], []
+            for agent_type, agents_of_type in agents.items():
+                for agent_id, agent_db in agents_of_type.items():
+                    # Update save path for agent
+                    agent_db.agent_save = os.path.join(results_path, 'agents', agent_type, agent_id)
+
+                    # Create an instance of the Agent class (there are no grid commands)
+                    entries.append((agents_of_type, agent_id))
+                    instances.append(Agent(agent_type=agent_type, data=agent_db, timetable=tasks, market=markets,
+                                           grid_commands={}))
+
+            # Execute the tasks of the agents
+            results = []
+            for (agents_of_type, agent_id), agent_db in zip(
+                    entries, Agent.execute_all(instances, batch=MpcBatch(region) if batch_mpc else None)):
+                agents_of_type[agent_id] = agent_db
+
+                # Clear the bids and offers of the agent with the retailer
+                results.extend(self.__clear_markets(agent_db=agent_db, tasks=tasks, markets=markets))
+
+            # Combine the results per market and add the transactions for the next timestamps
+            results = self.__combine_markets(results)
+            for market_db in results:
+                local_market = markets[market_db.market_type][market_db.market_name]
+                local_market.market_transactions = pl.concat([local_market.market_transactions,
+                                                              market_db.market_transactions], how='vertical')
+            market_results.append(results)
+
+        deltas = [agent_db.get_changes(checkpoints[agent_id], window=window)
+                  for agents_of_type in agents.values() for agent_id, agent_db in agents_of_type.items()]
+
+        return deltas, market_results
+
+    @staticmethod
+    def __clear_markets(agent_db, tasks: pl.DataFrame, markets: dict) -> list:
+        """Clears the bids and offers of the agent for all market tasks of the timestamp"""
+        # Create all markets first as the market tasks of a timestamp all start from the same data
+        markets_list = []
+        for task in tasks.iter_rows(named=True):
+            market_slice = markets[task[c.TC_MARKET]][task[c.TC_NAME]].get_slice(task[c.TC_TIMESTEP])
+            market_slice.market_transactions = (market_slice.market_transactions
+                                                .filter(pl.col(c.TC_ID_AGENT) == agent_db.agent_id))
+            bids_offers = agent_db.bids_offers.filter((pl.col(c.TC_MARKET) == task[c.TC_MARKET])
+                                                      & (pl.col(c.TC_NAME) == task[c.TC_NAME])
+                                                      & (pl.col(c.TC_TIMESTEP) == task[c.TC_TIMESTEP]))
+            # Grid fees are only needed for the settlement
+            grid_fees = {}
+            if c.MA_SETTLE in task[c.TC_ACTIONS]:
+                grid_fees[agent_db.agent_id] = ElectricityMarket.get_agent_grid_fees(
+                    agent_db=agent_db, tasks=task, market_name=market_slice.market_name)
+            markets_list.append(Market(data=market_slice, tasks=task, database=None, bids_offers=bids_offers,
+                                       grid_fees=grid_fees))
+
+        return [market.execute() for market in markets_list]
+
+    @staticmethod
+    def __combine_markets(results: list) -> list:
+        """Combines the market results of the agents into one result per market"""
+        combined = {}
+        for market_db in results:
+            key = (market_db.market_type, market_db.market_name)
+            if key not in combined:
+                combined[key] = market_db
+                continue
+            for table in MarketDB.RESULT_TABLES:
+                setattr(combined[key], table, pl.concat([getattr(combined[key], table), getattr(market_db, table)],
+                                                        how='diagonal'))
+
+        return list(combined.values())
+
+    @staticmethod
+    def __take_snapshot(agents: dict) -> dict:
+        """Creates checkpoints of all agents (only references, no data is copied)"""
+        return {agent_id: agent_db.create_checkpoint()
+                for agents_of_type in agents.values() for agent_id, agent_db in agents_of_type.items()}
+
+    @staticmethod
+    def __restore_snapshot(agents: dict, snapshot: dict):
+        """Restores all agents from the given checkpoints"""
+        for agents_of_type in agents.values():
+            for agent_id, agent_db in agents_of_type.items():
+                agent_db.restore_checkpoint(snapshot[agent_id])
+
+
+def worker(connection):
+    """Runs the loop of a sticky worker process until it receives the command to close
+
+    Each result is sent back as ('ok', result). If a command fails, the traceback is sent back as ('error', traceback)
+    instead so that the main process can raise it. The worker keeps running to be able to receive the command to close.
+    """
+    shard = AgentShard()
+
+    while True:
+        command, kwargs = connection.recv()
+
+        if command == 'close':
+            break
+
+        try:
+            if command == 'register':
+                result = shard.register(**kwargs)
+            elif command == 'execute':
+                result = shard.execute(**kwargs)
+            elif command == 'execute_many':
+                result = [shard.execute(**task_kwargs) for task_kwargs in kwargs]
+            elif command == 'execute_blocks':
+                result = [shard.execute_block(**task_kwargs) for task_kwargs in kwargs]
+            else:
+                raise ValueError(f'Unknown command of the sticky worker: {command}')
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+        else:
+            connection.send(('ok', result))
+
+    connection.close()
+
+
+class StickyAgentPool(ProcessPool):
+    """
+    A class to manage a pool of persistent worker processes with a fixed assignment of agents
+
+    Contrary to the AgentPool, each worker keeps its agents (and their forecasters) in memory for the whole simulation.
+    The agents are only transferred once when the region is registered. Afterward, only the changes of each timestamp
+    are exchanged between the main process and the workers.
+
+    Attributes:
+        num_workers (int): the number of processes to spawn
+        processes (list): the worker processes
+        connections (list): the main process ends of the pipes to the workers
+        shards (dict): ids of the agents of each region assigned to each worker in the format {region: [[ids]]}
+    """
+    def __init__(self, num_workers: int):
+        super().__init__(num_workers, worker)
+        self.processes = []
+        self.connections = []
+        self.shards = {}
+
+    def update_num_workers(self, num_workers: int):
+        """Updates the number of processes (only possible as long as the workers have not been started)"""
+        if not self.processes:
+            self.num_workers = num_workers
+
+    def is_registered(self, region: str) -> bool:
+        """Checks if the agents of the region are already resident in the workers"""
+        return region in self.shards
+
+    def register(self, region: str, agents: dict, markets: dict):
+        """Distributes the agents of the region to the workers"""
+        # Start the workers if not already started
+        if not self.processes:
+            self.__start()
+
+        # Assign the agents to the workers (round-robin)
+        shards = [[] for _ in range(self.num_workers)]
+        idx = 0
+        for agents_of_type in agents.values():
+            for agent_db in agents_of_type.values():
+                shards[idx % self.num_workers].append(agent_db)
+                idx += 1
+
+        # Send the agents to the workers
+        for connection, shard in zip(self.connections, shards):
+            connection.send(('register', {'region': region, 'agents': shard, 'markets': markets}))
+        self.__receive(self.connections)
+
+        self.shards[region] = [[agent_db.agent_id for agent_db in shard] for shard in shards]
+
+    def execute(self, task_args: dict) -> list:
+        """Executes the agents of the region in all workers and returns the changes of the agents"""
+        region = task_args['region']
+
+        # Only send the tasks to the workers that contain agents of the region
+        connections = [connection for connection, shard in zip(self.connections, self.shards[region]) if shard]
+        for connection in connections:
+            connection.send(('execute', task_args))
+
+        results = []
+        for deltas in self.__receive(connections):
+            results.extend(deltas)
+
+        return results
+
+    def execute_many(self, task_args_list: list) -> list:
+        """Executes the agents of several regions in all workers and returns the changes of the agents per region"""
+        # Send the tasks of all regions at once so that each worker can process its regions without waiting
+        connections = []
+        for idx, connection in enumerate(self.connections):
+            worker_task_args = [task_args for task_args in task_args_list if self.shards[task_args['region']][idx]]
+            if worker_task_args:
+                connection.send(('execute_many', worker_task_args))
+                connections.append((connection, worker_task_args))
+
+        results = {task_args['region']: [] for task_args in task_args_list}
+        worker_results = self.__receive([connection for connection, _ in connections])
+        for (_, worker_task_args), results_of_worker in zip(connections, worker_results):
+            for task_args, deltas in zip(worker_task_args, results_of_worker):
+                results[task_args['region']].extend(deltas)
+
+        return [results[task_args['region']] for task_args in task_args_list]
+
+    def execute_blocks(self, task_args_list: list) -> list:
+        """Executes the agents of several regions through a block of timestamps in all workers
+
+        Returns:
+            list: tuple of the changes of the agents and the market results of each timestamp for each region
+        """
+        connections = []
+        for idx, connection in enumerate(self.connections):
+            worker_task_args = [task_args for task_args in task_args_list if self.shards[task_args['region']][idx]]
+            if worker_task_args:
+                connection.send(('execute_blocks', worker_task_args))
+                connections.append((connection, worker_task_args))
+
+        results = {task_args['region']: ([], [[] for _ in task_args['tasks_list']]) for task_args in task_args_list}
+        worker_results = self.__receive([connection for connection, _ in connections])
+        for (_, worker_task_args), results_of_worker in zip(connections, worker_results):
+            for task_args, (deltas, markets) in zip(worker_task_args, results_of_worker):
+                region_deltas, region_markets = results[task_args['region']]
+                region_deltas.extend(deltas)
+                for markets_of_timestamp, worker_markets in zip(region_markets, markets):
+                    markets_of_timestamp.extend(worker_markets)
+
+        return [results[task_args['region']] for task_args in task_args_list]
+
+    def close(self):
+        """Closes the workers"""
+        for connection in self.connections:
+            connection.send(('close', None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.connections = []
+        self.shards = {}
+
+    @staticmethod
+    def __receive(connections: list) -> list:
+        """Receives the results of the given workers and raises the error of the first worker that failed
+
+        The results of all workers are received before raising so that the pipes stay in sync.
+        """
+        results, errors = [], []
+        for connection in connections:
+            status, result = connection.recv()
+            if status == 'error':
+                errors.append(result)
+            results.append(result)
+
+        if errors:
+            raise RuntimeError(f'A sticky worker failed:\n{errors[0]}')
+
+        return results
+
+    def __start(self):
+        """Starts the worker processes"""
+        context = get_context("spawn")
+        for _ in range(self.num_workers):
+            parent_connection, child_connection = context.Pipe()
+            process = context.Process(target=self.task, args=(child_connection,), daemon=True)
+            process.start()
+            child_connection.close()
+            self.processes.append(process)
+            self.connections.append(parent_connection)
@@ -19,6 +19,7 @@ class TaskExecutioner:
         num_workers (int): number of workers
         pool: None. Needs to be initialized by child classes if multiprocessing is enabled
         results_path (str): results path
+        iteration (int): number of the current iteration of the timestamp (repeated if the grid is not ok)
     """
     MIN_GB_AVAILABLE = 35
 
@@ -29,6 +30,7 @@ class TaskExecutioner:
             self.num_workers = max(1, mp.cpu_count() - 1)  # physical processors
         self.pool = None
         self.results_path = None
+        self.iteration = 1
 
     def execute(self, tasks):
         """Executes input tasks"""
@@ -39,7 +41,7 @@ class TaskExecutioner:
             # Prepare parallel tasks
             para_tasks = self.prepare_para_tasks(tasks)
             # Save database to file to allow loading inside each process
-            self.database.save_database(os.path.dirname(self.results_path), save_restriction_commands_only=True)
+            self.save_database_for_workers()
             # Update workers according to number of required parallel tasks
             self.update_num_workers(len(para_tasks))
             # Also update the pool's workers
@@ -49,6 +51,35 @@ class TaskExecutioner:
         # Postprocess results of tasks execution
         self.postprocess_results(tasks, results)
 
+    def execute_regions(self, tasks_list):
+        """Executes the input tasks of several regions together in one pool (the regions are independent)"""
+        # Execute the regions one after another if multiprocessing is disabled
+        if self.num_workers == 1 or self.pool is None:
+            for tasks in tasks_list:
+                self.execute(tasks)
+            return
+
+        # Prepare parallel tasks of all regions
+        para_tasks = [self.prepare_para_tasks(tasks) for tasks in tasks_list]
+        all_para_tasks = [task for region_para_tasks in para_tasks for task in region_para_tasks]
+        # Save database to file to allow loading inside each process
+        self.save_database_for_workers()
+        # Update workers according to number of required parallel tasks
+        self.update_num_workers(len(all_para_tasks))
+        # Also update the pool's workers
+        self.pool.update_num_workers(self.num_workers)
+        # Execute multiprocessing pool
+        results = self.pool.execute(all_para_tasks)
+        # Postprocess results of tasks execution for each region (the pool keeps the order of the tasks)
+        start = 0
+        for tasks, region_para_tasks in zip(tasks_list, para_tasks):
+            self.postprocess_results(tasks, results[start:start + len(region_para_tasks)])
+            start += len(region_para_tasks)
+
+    def save_database_for_workers(self):
+        """Saves the database to file to allow loading inside each process"""
+        self.database.save_database(os.path.dirname(self.results_path), save_restriction_commands_only=True)
+
     def enough_memory(self):
         available_gigabytes = psutil.virtual_memory().available / (1024.0 ** 3)
         return available_gigabytes >= self.MIN_GB_AVAILABLE
@@ -77,3 +108,7 @@ class TaskExecutioner:
     def set_results_path(self, results_path):
         """Set results path"""
         self.results_path = results_path
+
+    def set_iteration(self, iteration):
+        """Set iteration of the current timestamp"""
+        self.iteration = iteration
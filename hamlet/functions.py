@@ -11,6 +11,7 @@ import random
 import shutil
 import string
 import time
+from datetime import timedelta
 
 import pandas as pd
 import polars as pl
@@ -312,9 +313,6 @@ def slice_dataframe_between_times(target_df, reference_ts, duration: int, unit='
         sliced_df: sliced dataframe or lazyframe between reference ts and duration.
     """
 
-    # add timedelta as a column
-    target_df = calculate_timedelta(target_df=target_df, reference_ts=reference_ts, by=by)
-
     # convert duration to second
     converter = {'second': 1,
                  'minute': c.MINUTES_TO_SECONDS,
@@ -322,6 +320,24 @@ def slice_dataframe_between_times(target_df, reference_ts, duration: int, unit='
                  'day': c.DAYS_TO_SECONDS}      # factors to multiply when converting the corresponding unit to second
     duration = duration * converter[unit]
 
+    # slice sorted dataframes by binary search without touching the other rows
+    time_index = get_sorted_time_index(target_df, by=by)
+    if time_index is not None:
+        reference = _cast_to_time_index(reference_ts, time_index)
+        if duration > 0:    # [reference, reference + duration)
+            start = time_index.search_sorted(reference, side='left')
+            end = time_index.search_sorted(reference + timedelta(seconds=duration), side='left')
+        elif duration < 0:  # (reference + duration, reference]
+            start = time_index.search_sorted(reference + timedelta(seconds=duration), side='right')
+            end = time_index.search_sorted(reference, side='right')
+        else:   # reference
+            start = time_index.search_sorted(reference, side='left')
+            end = time_index.search_sorted(reference, side='right')
+        return target_df.slice(start, max(end - start, 0))
+
+    # add timedelta as a column
+    target_df = calculate_timedelta(target_df=target_df, reference_ts=reference_ts, by=by)
+
     if duration > 0:    # slice data in the future, reference (current) timestep will not be included
         filter_conditions = ((pl.col('timedelta') + pl.duration(seconds=duration) > 0) &
                              (pl.col('timedelta') <= 0))
@@ -337,6 +353,79 @@ def slice_dataframe_between_times(target_df, reference_ts, duration: int, unit='
     return sliced_df
 
 
+def slice_dataframe_window(target_df, start, end, by=c.TC_TIMESTAMP):
+    """
+    Slice the given pl data/lazyframe to the rows between start and end (both included).
+
+    Dataframes that are sorted by the time column are sliced by binary search.
+
+    Args:
+        target_df: dataframe or lazyframe to be sliced.
+        start: first time step of the window in datetime format.
+        end: last time step of the window in datetime format.
+        by: column name of a time column to be sliced (usually c.TC_TIMESTAMP or c.TC_TIMESTEP).
+
+    Returns:
+        sliced_df: sliced dataframe or lazyframe between start and end.
+    """
+    time_index = get_sorted_time_index(target_df, by=by)
+    if time_index is None:
+        return target_df.filter(pl.col(by).is_between(start, end))
+
+    first = time_index.search_sorted(_cast_to_time_index(start, time_index), side='left')
+    last = time_index.search_sorted(_cast_to_time_index(end, time_index), side='right')
+    return target_df.slice(first, max(last - first, 0))
+
+
+def get_sorted_time_index(target_df, by=c.TC_TIMESTAMP) -> pl.Series | None:
+    """
+    Get the time column of the given dataframe if it can be used for binary search.
+
+    This is the case if the dataframe is eager, and the column has no null values and is sorted in ascending order.
+    The check is skipped if the column is flagged as sorted (see set_sorted_time_index()).
+
+    Args:
+        target_df: dataframe or lazyframe.
+        by: column name of the time column.
+
+    Returns:
+        time_index: time column or None if the dataframe needs to be filtered instead.
+    """
+    if not isinstance(target_df, pl.DataFrame) or by not in target_df.columns:
+        return None
+
+    time_index = target_df.get_column(by)
+    if time_index.null_count() or not (time_index.flags['SORTED_ASC'] or time_index.is_sorted()):
+        return None
+
+    return time_index
+
+
+def set_sorted_time_index(target_df, by=c.TC_TIMESTAMP):
+    """
+    Flag the time column of the given dataframe as sorted if it is sorted in ascending order.
+
+    The flag is kept by slices and selections of the dataframe so that later slicing does not check the order again.
+
+    Args:
+        target_df: dataframe or lazyframe.
+        by: column name of the time column.
+
+    Returns:
+        target_df: same as the input target_df with the time column flagged as sorted if possible.
+    """
+    time_index = get_sorted_time_index(target_df, by=by)
+    if time_index is None or time_index.flags['SORTED_ASC']:
+        return target_df
+
+    return target_df.with_columns(pl.col(by).set_sorted())
+
+
+def _cast_to_time_index(reference_ts, time_index: pl.Series):
+    """Cast the reference time to the data type of the time index (same as the cast in calculate_timedelta())"""
+    return pl.select(pl.lit(reference_ts).cast(time_index.dtype)).item()
+
+
 def gen_ids(n: int = 1, length: int = 15, prefix: str = '', suffix: str = '', only_integers: bool = False) \
         -> list[str] | str:
     """
@@ -0,0 +1,48 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import polars as pl
+import pytest
+
+from hamlet.executor.utilities.forecasts.forecast_metrics import ForecastMetrics
+
+
+def test_record_forecast_without_actual():
+    metrics = ForecastMetrics()
+
+    metrics.record_forecast('pv_1', 'naive', 0.5, pl.DataFrame({'power': [1.0, 2.0]}))
+
+    row = metrics.to_frame().row(0, named=True)
+    assert (row['forecasts'], row['forecast_time'], row['rows'], row['errors']) == (1, 0.5, 2, 0)
+    assert row['mae'] is None and row['rmse'] is None and row['moving_mae'] is None
+
+
+def test_record_forecast_with_actual():
+    metrics = ForecastMetrics()
+    actual = pl.DataFrame({'power': [1.0, 2.0, 3.0]})
+
+    metrics.record_forecast('pv_1', 'naive', 0.5, pl.DataFrame({'power': [2.0, 4.0]}), actual)
+    metrics.record_forecast('pv_1', 'naive', 0.5, pl.DataFrame({'power': [1.0, 2.0]}), actual)
+
+    row = metrics.to_frame().row(0, named=True)
+    assert row['errors'] == 4
+    assert row['mae'] == pytest.approx(3 / 4)
+    assert row['rmse'] == pytest.approx((5 / 4) ** 0.5)
+    # the first forecast initializes the moving error
+    assert row['moving_mae'] == pytest.approx((1 - ForecastMetrics.ALPHA) * 1.5)
+
+
+def test_changes_and_restore():
+    metrics = ForecastMetrics()
+    metrics.record_fit('pv_1', 'rfr', 1.0)
+    snapshot = metrics.snapshot()
+
+    metrics.record_fit('pv_1', 'rfr', 2.0)
+    metrics.record_fit('pv_2', 'rfr', 1.0)
+
+    assert set(metrics.get_changes(snapshot)) == {'pv_1', 'pv_2'}
+    metrics.restore(snapshot)
+    assert metrics.entries['pv_1']['fits'] == 1 and 'pv_2' not in metrics.entries
@@ -0,0 +1,67 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+from datetime import datetime, timedelta
+
+import polars as pl
+import pytest
+
+import hamlet.constants as c
+from hamlet import functions as f
+
+
+def slice_filter(target_df, reference_ts, duration):
+    """Reference of slice_dataframe_between_times(): the previous filter on the timedelta (duration in seconds)"""
+    target_df = f.calculate_timedelta(target_df=target_df, reference_ts=reference_ts)
+
+    if duration > 0:
+        filter_conditions = ((pl.col('timedelta') + pl.duration(seconds=duration) > 0) & (pl.col('timedelta') <= 0))
+    elif duration < 0:
+        filter_conditions = ((pl.col('timedelta') + pl.duration(seconds=duration) < 0) & (pl.col('timedelta') >= 0))
+    else:
+        filter_conditions = pl.col('timedelta') == 0
+
+    return target_df.filter(filter_conditions).drop('timedelta')
+
+
+@pytest.fixture(params=[None, 'UTC'])
+def target(request):
+    # 15-minute data with a repeated timestamp (e.g. the weather with several forecasts per timestamp)
+    timestamps = pl.datetime_range(datetime(2021, 1, 1), datetime(2021, 1, 3), interval='15m', eager=True,
+                                   time_zone=request.param)
+    timestamps = pl.concat([timestamps[:50], timestamps[49:]])
+    return pl.DataFrame({c.TC_TIMESTAMP: timestamps, 'value': range(len(timestamps))})
+
+
+@pytest.mark.parametrize('duration', [0, 1, 900, 3600, 86_400, -1, -900, -3600, -86_400])
+@pytest.mark.parametrize('offset', [-3600, 0, 450, 900 * 49, 86_400, 2 * 86_400, 3 * 86_400])
+def test_slice_matches_filter(target, duration, offset):
+    reference_ts = datetime(2021, 1, 1) + timedelta(seconds=offset)
+
+    result = f.slice_dataframe_between_times(target_df=f.set_sorted_time_index(target), reference_ts=reference_ts,
+                                             duration=duration, unit='second')
+
+    assert result.equals(slice_filter(target, reference_ts, duration))
+
+
+def test_slice_units(target):
+    reference_ts = datetime(2021, 1, 1, 6)
+
+    result = f.slice_dataframe_between_times(target_df=target, reference_ts=reference_ts, duration=2, unit='hour')
+
+    assert result.equals(slice_filter(target, reference_ts, 7200))
+
+
+def test_slice_lazy_and_unsorted(target):
+    reference_ts = datetime(2021, 1, 1, 6)
+    expected = slice_filter(target, reference_ts, 3600)
+
+    lazy = f.slice_dataframe_between_times(target_df=target.lazy(), reference_ts=reference_ts, duration=3600)
+    unsorted = f.slice_dataframe_between_times(target_df=target.reverse(), reference_ts=reference_ts, duration=3600)
+
+    assert isinstance(lazy, pl.LazyFrame)
+    assert lazy.collect().equals(expected)
+    assert unsorted.sort(c.TC_TIMESTAMP, 'value').equals(expected)
@@ -0,0 +1,83 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+import hamlet.constants as c
+from hamlet.executor.utilities.forecasts.global_models import GlobalModels
+
+START = datetime(2021, 1, 1)
+
+
+class PastModel:
+    """Model that is fitted on the target before the current timestamp and predicts the mean of the scaled target"""
+
+    def __init__(self, train_data):
+        self.mean = None
+        self.fitted = []
+
+    def get_fit_data(self, train_data, current_ts, **kwargs):
+        target = train_data[c.K_TARGET].filter(pl.col(c.TC_TIMESTAMP) < current_ts).drop(c.TC_TIMESTAMP)
+        return [(np.zeros((target.height, 1), dtype=np.float32), target.to_numpy())]
+
+    def fit_data(self, data, **kwargs):
+        self.fitted.append(data)
+        self.mean = float(np.mean(data[0][1]))
+
+    def get_predict_data(self, train_data, current_ts, length_to_predict, **kwargs):
+        return np.zeros((2, 1), dtype=np.float32)
+
+    def predict_data(self, features, **kwargs):
+        return np.full(len(features), self.mean)
+
+
+def get_train_data(values: list) -> dict:
+    timestamps = [START + timedelta(hours=hour) for hour in range(len(values))]
+    return {c.K_TARGET: pl.DataFrame({c.TC_TIMESTAMP: timestamps, 'power': values}),
+            c.K_FEATURES: pl.DataFrame({c.TC_TIMESTAMP: timestamps})}
+
+
+@pytest.fixture
+def global_models():
+    global_models = GlobalModels()
+    # the peaks in the future (100 and 1000) must not be used for the scaling
+    global_models.register('pv', ('agent_1', 'pv_1'), get_train_data([1.0, 2.0, 100.0]))
+    global_models.register('pv', ('agent_2', 'pv_2'), get_train_data([4.0, 4.0, 1000.0]))
+    return global_models
+
+
+def get_forecast(global_models, member, current_ts, refit=False):
+    return global_models.get_forecast('pv', member, current_ts, refit=refit, create=PastModel, config={},
+                                      length_to_predict=7200)
+
+
+def test_scales_from_train_data(global_models):
+    current_ts = START + timedelta(hours=2)
+
+    forecast = get_forecast(global_models, ('agent_1', 'pv_1'), current_ts)
+
+    assert global_models.scales['pv'] == ({('agent_1', 'pv_1'): 2.0, ('agent_2', 'pv_2'): 4.0},
+                                          {('agent_1', 'pv_1'): 0.5, ('agent_2', 'pv_2'): 1.0})
+    # mean of the scaled targets [0.5, 1, 1, 1] times the peak of the plant
+    np.testing.assert_allclose(forecast.get_column('power').to_numpy(), [1.75, 1.75])
+    fitted_scales = global_models.models['pv'].fitted[0][0][0][:, -1]
+    np.testing.assert_allclose(fitted_scales, [0.5, 0.5, 1.0, 1.0])
+
+
+def test_scales_kept_until_refit(global_models):
+    get_forecast(global_models, ('agent_1', 'pv_1'), START + timedelta(hours=2))
+    scales = global_models.scales['pv']
+
+    # the predictions of later timestamps reuse the scales of the fit
+    get_forecast(global_models, ('agent_2', 'pv_2'), START + timedelta(hours=3))
+    assert global_models.scales['pv'] is scales
+
+    get_forecast(global_models, ('agent_2', 'pv_2'), START + timedelta(hours=3), refit=True)
+    assert global_models.scales['pv'][0] == {('agent_1', 'pv_1'): 100.0, ('agent_2', 'pv_2'): 1000.0}
@@ -0,0 +1,49 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import polars as pl
+
+from hamlet.executor.utilities.forecasts.model_cache import ModelCache
+
+
+def create_cache(max_entries: int = 2) -> ModelCache:
+    cache = ModelCache(max_entries=max_entries)
+    for key in ('a', 'b', 'c'):
+        cache.get_model(key, pl.DataFrame({'power': [1.0, 2.0]}), create=lambda: object())
+    return cache
+
+
+def test_least_recently_used_dropped():
+    cache = create_cache()
+
+    assert list(cache.entries) == ['b', 'c']
+    assert cache.target_nbytes == 2 * pl.DataFrame({'power': [1.0, 2.0]}).estimated_size()
+
+
+def test_fit_and_forecast_shared_while_cached():
+    cache = create_cache()
+    calls = []
+
+    for _ in range(2):
+        cache.fit('c', 1, fit=lambda: calls.append('fit'))
+        forecast = cache.get_forecast('c', 1, predict=lambda: calls.append('predict') or 'forecast')
+
+    assert forecast == 'forecast'
+    assert calls == ['fit', 'predict']
+
+
+def test_dropped_models_are_not_cached_again():
+    cache = create_cache()
+    calls = []
+
+    # the forecasters that still use the dropped model fit and predict it without caching
+    for _ in range(2):
+        cache.fit('a', 1, fit=lambda: calls.append('fit'))
+        cache.get_forecast('a', 1, predict=lambda: calls.append('predict'))
+
+    assert calls == ['fit', 'predict'] * 2
+    assert 'a' not in cache.entries
+    assert cache.peek('a') is None
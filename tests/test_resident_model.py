@@ -0,0 +1,105 @@
+__author__ = "HodaHamdy"
+__credits__ = "MarkusDoepfert"
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+from unittest import mock
+
+import pytest
+
+poi = pytest.importorskip('pyoptinterface')
+
+from hamlet.executor.utilities.controller.fbc.mpc.poi.resident_model import ResidentModel  # noqa: E402
+
+
+def create_model() -> tuple[ResidentModel, mock.MagicMock]:
+    """Create a resident model around a mock of the solver model that numbers the variables"""
+    solver_model = mock.MagicMock()
+    solver_model.add_variable.side_effect = lambda name, lb, ub, domain: poi.VariableIndex(
+        solver_model.add_variable.call_count - 1)
+    return ResidentModel(solver_model), solver_model
+
+
+def get_calls(method: mock.MagicMock) -> list:
+    """Get the arguments of the calls with the variable indices as integers"""
+    return [tuple(arg.index if isinstance(arg, poi.VariableIndex) else arg for arg in call.args)
+            for call in method.call_args_list]
+
+
+@pytest.fixture
+def model():
+    model, solver_model = create_model()
+    x = model.add_variable(name='x', lb=0.0, ub=10.0)
+    y = model.add_variable(name='y', lb=0.0, ub=10.0)
+    constraint = model.add_linear_constraint(x + 2 * y, poi.ConstraintSense.LessEqual, 5.0, name='c')
+    solver_model.reset_mock(return_value=False, side_effect=False)
+    model.updating = True
+    return model, solver_model, constraint
+
+
+def test_build_adds_to_model():
+    model, solver_model = create_model()
+
+    x = model.add_variable(name='x', lb=0.0, ub=1.0)
+    model.add_linear_constraint(x + 1.0, poi.ConstraintSense.LessEqual, 3.0, name='c')
+
+    assert solver_model.add_variable.call_count == 1
+    assert solver_model.add_linear_constraint.call_count == 1
+    # the constant of the expression is kept as part of the right-hand side
+    assert model.constraints['c'][2] == 2.0
+
+
+def test_update_only_changed_bounds(model):
+    model, solver_model, _ = model
+
+    x = model.add_variable(name='x', lb=0.0, ub=10.0)
+    y = model.add_variable(name='y', lb=0.0, ub=8.0)
+
+    assert (x.index, y.index) == (0, 1)
+    solver_model.add_variable.assert_not_called()
+    assert get_calls(solver_model.set_variable_attribute) == [(1, poi.VariableAttribute.UpperBound, 8.0)]
+    assert model.variables['y'][1:] == [0.0, 8.0]
+
+
+def test_update_only_changed_coefficients_and_rhs(model):
+    model, solver_model, constraint = model
+    x = model.add_variable(name='x', lb=0.0, ub=10.0)
+    y = model.add_variable(name='y', lb=0.0, ub=10.0)
+
+    # the coefficient of y and the constant (moved to the right-hand side) changed
+    assert model.add_linear_constraint(x + 3 * y + 1.0, poi.ConstraintSense.LessEqual, 5.0, name='c') is constraint
+
+    solver_model.add_linear_constraint.assert_not_called()
+    assert get_calls(solver_model.set_normalized_coefficient) == [(constraint, 1, 3.0)]
+    assert get_calls(solver_model.set_normalized_rhs) == [(constraint, 4.0)]
+
+
+def test_update_removed_variable(model):
+    model, solver_model, constraint = model
+    x = model.add_variable(name='x', lb=0.0, ub=10.0)
+
+    # variables that are no longer part of the constraint get a coefficient of zero
+    model.add_linear_constraint(poi.ExprBuilder(x), poi.ConstraintSense.LessEqual, 5.0, name='c')
+
+    assert get_calls(solver_model.set_normalized_coefficient) == [(constraint, 1, 0.0)]
+    solver_model.set_normalized_rhs.assert_not_called()
+
+
+def test_update_unknown_name(model):
+    model, _, _ = model
+
+    with pytest.raises(ValueError):
+        model.add_variable(name='z', lb=0.0, ub=1.0)
+
+
+def test_set_start_values_shifted(model):
+    model, solver_model, _ = model
+    variables = {'x': [poi.VariableIndex(0), poi.VariableIndex(1), poi.VariableIndex(2)]}
+    model.solution = {'x': [1.0, 2.0, 3.0], 'missing': [1.0]}
+
+    model.set_start_values(variables)
+
+    assert get_calls(solver_model.set_variable_attribute) == [(0, poi.VariableAttribute.PrimalStart, 2.0),
+                                                               (1, poi.VariableAttribute.PrimalStart, 3.0),
+                                                               (2, poi.VariableAttribute.PrimalStart, 3.0)]
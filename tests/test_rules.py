@@ -0,0 +1,75 @@
+__author__ = "MarkusDoepfert"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "MarkusDoepfert"
+__email__ = "markus.doepfert@tum.de"
+
+import numpy as np
+import pytest
+
+from hamlet.executor.utilities.controller.rules import allocate, absorb
+
+
+def allocate_loop(amount, capacity, groups):
+    """Reference of allocate(): fill the rows of each group one after another"""
+    allocation = np.zeros(np.shape(capacity))
+    remaining = np.array(amount, dtype=float)
+    for row, group in enumerate(groups):
+        share = np.clip(np.minimum(capacity[row], remaining[group]), 0, None)
+        allocation[row] = share
+        remaining[group] = remaining[group] - share
+    return allocation
+
+
+def test_allocate_fills_rows_in_order():
+    groups = np.array([0, 0, 0, 1, 1])
+    capacity = np.array([2.0, 3.0, 4.0, 1.0, 5.0])
+    amount = np.array([4.0, 10.0])
+
+    np.testing.assert_allclose(allocate(amount, capacity, groups), [2.0, 2.0, 0.0, 1.0, 5.0])
+
+
+def test_allocate_with_infinite_capacity():
+    groups = np.array([0, 0, 1])
+    capacity = np.array([np.inf, 3.0, np.inf])
+    amount = np.array([5.0, 2.0])
+
+    np.testing.assert_allclose(allocate(amount, capacity, groups), [5.0, 0.0, 2.0])
+
+
+def test_allocate_without_rows():
+    assert allocate(np.array([1.0]), np.zeros((0, 3)), np.array([], dtype=int)).shape == (0, 3)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_allocate_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    num_groups, num_timesteps = 6, 8
+    groups = np.sort(rng.integers(0, num_groups, size=20))
+    capacity = rng.uniform(0, 5, size=(len(groups), num_timesteps))
+    amount = rng.uniform(0, 15, size=(num_groups, num_timesteps))
+
+    np.testing.assert_allclose(allocate(amount, capacity, groups), allocate_loop(amount, capacity, groups),
+                               atol=1e-9)
+
+
+def test_absorb_surplus_and_deficit():
+    groups = np.array([0, 0, 1, 1])
+    values = np.array([3.0, 2.0, 0.0, 1.0])
+    lower = np.array([0.0, 1.0, -1.0, 0.0])
+    upper = np.array([4.0, 5.0, 2.0, 4.0])
+
+    # group 0 has a surplus of 4 (decrease), group 1 a deficit of 3 (increase)
+    new_values = absorb(np.array([4.0, -3.0]), values, lower, upper, groups)
+
+    np.testing.assert_allclose(new_values, [0.0, 1.0, 2.0, 2.0])
+
+
+def test_absorb_stays_within_bounds():
+    groups = np.array([0, 0])
+    values = np.array([1.0, 1.0])
+    lower = np.array([0.0, 0.5])
+    upper = np.array([2.0, 1.5])
+
+    np.testing.assert_allclose(absorb(np.array([10.0]), values, lower, upper, groups), lower)
+    np.testing.assert_allclose(absorb(np.array([-10.0]), values, lower, upper, groups), upper)
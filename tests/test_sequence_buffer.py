@@ -0,0 +1,73 @@
+__author__ = "jiahechu"
+__credits__ = ""
+__license__ = ""
+__maintainer__ = "jiahechu"
+__email__ = "jiahe.chu@tum.de"
+
+import math
+
+import numpy as np
+import polars as pl
+import pytest
+
+from hamlet.executor.utilities.forecasts.models import SequenceBuffer
+
+
+def prepare_train_data_loop(window_length, features, target):
+    """Reference of SequenceBuffer.get_train_data(): the previous loop over pandas slices"""
+    features, target = features.to_pandas(), target.to_pandas()
+
+    # same split as train_test_split(test_size=0.2, shuffle=False)
+    split = len(features) - math.ceil(0.2 * len(features))
+    x_train, x_test, y_train, y_test = features[:split], features[split:], target[:split], target[split:]
+
+    train_sequences, train_targets, val_sequences, val_targets = [], [], [], []
+    for i in range(window_length, len(x_train)):
+        train_sequences.append(x_train.iloc[i - window_length:i, :])
+        train_targets.append(y_train.iloc[i:i + 1])
+    for i in range(window_length, len(x_test)):
+        val_sequences.append(x_test.iloc[i - window_length:i, :])
+        val_targets.append(y_test.iloc[i:i + 1])
+
+    return tuple(np.array([np.array(data) for data in datas]).astype('float32')
+                 for datas in (train_sequences, train_targets, val_sequences, val_targets))
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    features = pl.DataFrame({f'feature_{i}': rng.normal(size=200) for i in range(3)})
+    target = pl.DataFrame({'target': rng.normal(size=200)})
+    return features, target
+
+
+@pytest.mark.parametrize('window_length', [1, 4, 24])
+def test_get_train_data_matches_loop(data, window_length):
+    features, target = data
+
+    result = SequenceBuffer().get_train_data(window_length, features, target)
+    expected = prepare_train_data_loop(window_length, features, target)
+
+    for array, expected_array in zip(result, expected):
+        assert array.dtype == np.float32
+        np.testing.assert_array_equal(array, expected_array)
+
+
+def test_get_sequences_reuses_buffer(data):
+    features, _ = data
+    buffer = SequenceBuffer()
+    array = SequenceBuffer.to_array(features)
+
+    first = buffer.get_sequences('predict', array, 4)
+    second = buffer.get_sequences('predict', array[::-1].copy(), 4)
+
+    assert first is second
+    np.testing.assert_array_equal(second[0], array[::-1][:4])
+
+
+def test_get_sequences_shorter_than_window(data):
+    features, _ = data
+
+    sequences = SequenceBuffer().get_sequences('predict', SequenceBuffer.to_array(features.head(3)), 4)
+
+    assert sequences.shape == (0, 4, 3)